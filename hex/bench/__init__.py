@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks
+
+| Measures what hex adds on top of running a command with subprocess: the cost
+| of execute() and launch(), of the runloggers, and of starting the command
+| line.  Each benchmark adds named measurements to a results dictionary, and
+| runBenchmarks() wraps them with the hex and Python versions, so that the JSON
+| from one version can be compared with another's using compareResults().
+|
+| Timings are in seconds.  A measurement of repeated calls has count, total,
+| mean, median, p95, min and max; throughput measurements also have rate,
+| the operations per second.
+
+@date      : 2026-10-18 23:12:40
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import time
+import shutil
+import socket
+import platform
+import tempfile
+import logging
+import importlib
+from datetime import datetime
+from hex import __version__, UserException
+
+logger = logging.getLogger("hex")
+
+# Benchmark name -> (module in hex.bench, function).  Each function takes the
+# work directory, the results dictionary, and the options of runBenchmarks()
+BENCHMARKS = {
+    "execute"       : ("execution","benchExecute"),
+    "launch"        : ("execution","benchLaunch"),
+    "runlogger"     : ("runlogging","benchDefaultRunLogger"),
+    "sqlrunlogger"  : ("runlogging","benchSQLRunLogger"),
+    "startup"       : ("startup","benchStartup"),
+}
+BENCHMARK_ORDER = ["execute","launch","runlogger","sqlrunlogger","startup"]
+
+DEFAULT_COUNT = 50
+DEFAULT_SIZES = [1000,10000]
+
+# A change in a statistic of more than this fraction is reported by compareResults()
+DEFAULT_THRESHOLD = 0.1
+
+
+def summarize(durations):
+    """
+    Statistics of a list of durations
+    """
+    durations = sorted(durations)
+    if not durations:
+        return {"count" : 0}
+    total = sum(durations)
+    middle = len(durations) // 2
+    median = durations[middle] if len(durations) % 2 else (durations[middle - 1] + durations[middle]) / 2.0
+    return {
+        "count"     : len(durations),
+        "total"     : total,
+        "mean"      : total / len(durations),
+        "median"    : median,
+        "p95"       : durations[min(len(durations) - 1,int(len(durations) * 0.95))],
+        "min"       : durations[0],
+        "max"       : durations[-1],
+    }
+
+
+def timeCalls(func,count,*args):
+    """
+    Call func count times and return the statistics of how long each call took
+    """
+    durations = []
+    for i in range(count):
+        start = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+def timeThroughput(func,items):
+    """
+    Call func on each item and return the total time and the rate per second
+    """
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    total = time.perf_counter() - start
+    return {"count" : len(items), "total" : total, "rate" : len(items) / total if total > 0 else None}
+
+
+def getOverhead(measured,baseline):
+    """
+    Difference in the mean and median times of two measurements
+    """
+    return {statistic : measured[statistic] - baseline[statistic] for statistic in ["mean","median"]}
+
+
+def runBenchmarks(names=None,count=DEFAULT_COUNT,sizes=None,workdir=None):
+    """
+    Run the named benchmarks (default: all) and return the results.
+
+    count is the number of runs for each execute() and launch() measurement and
+    the number of CLI starts.  sizes are the numbers of runs saved to a fresh
+    runlogger for each runlogger measurement.  Everything is written under a
+    temporary directory in workdir, which is removed afterwards.
+    """
+    names = names or BENCHMARK_ORDER
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise UserException("Unknown benchmarks %s.  Available: %s" % (", ".join(unknown),", ".join(BENCHMARK_ORDER)))
+    options = {"count" : count, "sizes" : sizes or DEFAULT_SIZES}
+
+    report = {
+        "version"   : __version__,
+        "python"    : platform.python_version(),
+        "platform"  : platform.platform(),
+        "hostname"  : socket.gethostname().split(".",1)[0],
+        "cpus"      : os.cpu_count(),
+        "time"      : datetime.now().isoformat(),
+        "options"   : options,
+        "results"   : {},
+    }
+    tmpdir = tempfile.mkdtemp(prefix="hexbench",dir=workdir)
+    try:
+        for name in names:
+            modulename, funcname = BENCHMARKS[name]
+            module = importlib.import_module("%s.%s" % (__name__,modulename))
+            logger.info("Running %s benchmark" % name)
+            benchdir = os.path.join(tmpdir,name)
+            os.makedirs(benchdir)
+            getattr(module,funcname)(benchdir,report["results"],**options)
+    finally:
+        shutil.rmtree(tmpdir,ignore_errors=True)
+    return report
+
+
+def compareResults(baseline,report,threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two reports from runBenchmarks().  Returns (name, statistic, baseline
+    value, new value, change) for the medians, totals and rates of measurements in
+    both that changed by more than threshold, as a fraction of the baseline value.
+    """
+    changes = []
+    for name, measurement in sorted(report["results"].items()):
+        old = baseline.get("results",{}).get(name)
+        if not isinstance(old,dict) or not isinstance(measurement,dict):
+            continue
+        for statistic in ["median","total","rate"]:
+            oldvalue, newvalue = old.get(statistic), measurement.get(statistic)
+            if not oldvalue or newvalue is None:
+                continue
+            change = (newvalue - oldvalue) / float(oldvalue)
+            if abs(change) > threshold:
+                changes.append((name,statistic,oldvalue,newvalue,change))
+    return changes
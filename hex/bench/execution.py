@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""
+Execution benchmarks
+
+| Times BashSystem.execute() and launch() against running the same command with
+| subprocess, for a command that does nothing and for one that writes
+| OUTPUT_BYTES of output.  The overhead measurements are the differences in
+| the mean and median time per run.
+
+@date      : 2026-10-18 23:12:40
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import time
+import subprocess
+from hex import UserException
+from hex.bench import DEFAULT_COUNT, getOverhead, summarize, timeCalls
+from hex.events import EventBus
+from hex.runlog import DefaultRunLogger
+from hex.system.bashsystem import BashSystem
+
+NOOP_COMMAND = "true"
+
+# Output written by each run of the output heavy command
+OUTPUT_BYTES = 1024 * 1024
+OUTPUT_COMMAND = "yes hex | head -c %d" % OUTPUT_BYTES
+
+# Seconds to wait for launched runs to finish, per run
+LAUNCH_WAIT_PER_RUN = 2.0
+
+
+class NullSink(object):
+    """
+    Output sink that throws away what it is given
+    """
+    def write(self,data):
+        pass
+
+    def close(self):
+        pass
+
+
+def getSystem(workdir):
+    """
+    A BashSystem with a runlogger of its own, and no event subscribers
+    whatever the configuration says
+    """
+    events = EventBus()
+    runlogger = DefaultRunLogger(pathname=os.path.join(workdir,"runlogs"),events=events)
+    return BashSystem(runlogger=runlogger,events=events)
+
+
+def runSubprocess(cmd,workdir):
+    """
+    Run a command with bash, writing its output to files, as execute() does
+    """
+    with open(os.path.join(workdir,"stdout"),"wb") as out, open(os.path.join(workdir,"stderr"),"wb") as err:
+        subprocess.run(["/bin/bash","-c",cmd],stdout=out,stderr=err)
+
+
+def benchExecute(workdir,results,count=DEFAULT_COUNT,**options):
+    """
+    Time execute() of no-op and output heavy commands, unmonitored and, for the
+    output heavy one, monitored to a sink that discards the output
+    """
+    system = getSystem(workdir)
+    sinks = (NullSink(),NullSink())
+    for name, cmd in [("noop",NOOP_COMMAND),("output",OUTPUT_COMMAND)]:
+        baseline = timeCalls(runSubprocess,count,cmd,workdir)
+        measured = timeCalls(lambda: system.execute(cmd,monitor=False),count)
+        results["subprocess.%s" % name] = baseline
+        results["execute.%s" % name] = measured
+        results["execute.%s.overhead" % name] = getOverhead(measured,baseline)
+
+    monitored = timeCalls(lambda: system.execute(OUTPUT_COMMAND,sinks=sinks),count)
+    results["execute.output.monitored"] = monitored
+    results["execute.output.monitored.overhead"] = getOverhead(monitored,results["subprocess.output"])
+
+
+def benchLaunch(workdir,results,count=DEFAULT_COUNT,**options):
+    """
+    Time how long launch() takes to return for no-op commands, and how long it
+    takes all of them to finish
+    """
+    system = getSystem(workdir)
+    runids = []
+    durations = []
+    start = time.perf_counter()
+    for i in range(count):
+        launchstart = time.perf_counter()
+        runids.append(system.launch(NOOP_COMMAND))
+        durations.append(time.perf_counter() - launchstart)
+    results["launch.noop"] = summarize(durations)
+
+    deadline = time.time() + LAUNCH_WAIT_PER_RUN * count
+    while True:
+        runlogs = system.runlogger.statusMany(runids)
+        if all(runlog.get("status") == "COMPLETED" for runlog in runlogs.values()) and len(runlogs) == len(runids):
+            break
+        if time.time() > deadline:
+            raise UserException("Launched benchmark runs did not finish")
+        time.sleep(0.01)
+    total = time.perf_counter() - start
+    results["launch.noop.complete"] = {"count" : count, "total" : total, "rate" : count / total}
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runlogger benchmarks
+
+| Throughput of newRunId(), save() and get() on a fresh DefaultRunLogger holding
+| each of the given numbers of runs, and of SQLRunLogger saves to a SQLite
+| database.
+
+@date      : 2026-10-18 23:12:40
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import time
+from datetime import datetime
+from hex.bench import DEFAULT_SIZES, timeThroughput
+from hex.events import EventBus
+from hex.runlog import DefaultRunLogger, RunLog
+
+
+def makeRunLog(runid):
+    now = datetime.now()
+    return RunLog(
+        runid=runid,
+        jobid=os.getpid(),
+        hostname="benchmark",
+        scriptfilepath="/path/to/script",
+        interpreter="/bin/bash",
+        starttime=now,
+        endtime=now,
+        system="hex.system.bashsystem.BashSystem",
+        cmd="true",
+        status="COMPLETED",
+        result="SUCCESS",
+    )
+
+
+def benchRunLogger(runlogger,name,size,results):
+    """
+    Time newRunId(), save() and get() of size runs
+    """
+    runids = []
+    results["%s.newrunid.%d" % (name,size)] = timeThroughput(lambda i: runids.append(runlogger.newRunId(cmd="true")),range(size))
+    results["%s.save.%d" % (name,size)] = timeThroughput(lambda runid: runlogger.save(makeRunLog(runid)),runids)
+    results["%s.get.%d" % (name,size)] = timeThroughput(runlogger.get,runids)
+
+
+def benchDefaultRunLogger(workdir,results,sizes=DEFAULT_SIZES,**options):
+    for size in sizes:
+        runlogger = DefaultRunLogger(pathname=os.path.join(workdir,"runlogs-%d" % size),events=EventBus())
+        benchRunLogger(runlogger,"defaultrunlogger",size,results)
+
+
+def benchSQLRunLogger(workdir,results,sizes=DEFAULT_SIZES,**options):
+    """
+    Time SQLRunLogger saves, written through and written behind, to a SQLite
+    database.  For write behind, flush is the time then taken to write the rows.
+    Only the smallest size is used.  Skipped if SQLAlchemy is not installed.
+    """
+    try:
+        from hex.runlog import sqlrunlogger
+    except ImportError as e:
+        results["sqlrunlogger"] = {"skipped" : str(e)}
+        return
+
+    size = min(sizes)
+    for name, writebehind in [("sqlrunlogger",False),("sqlrunlogger.writebehind",True)]:
+        pathname = os.path.join(workdir,name)
+        db = "sqlite:///%s" % os.path.join(workdir,"%s.db" % name)
+        runlogger = sqlrunlogger.SQLRunLogger(db=db,writebehind=writebehind,pathname=pathname,events=EventBus())
+        runlogger.create_db()
+        try:
+            runids = [runlogger.newRunId(cmd="true") for i in range(size)]
+            saves = timeThroughput(lambda runid: runlogger.save(makeRunLog(runid)),runids)
+            if writebehind:
+                # How long the queued rows then take to reach the database
+                start = time.perf_counter()
+                runlogger.flush()
+                saves["flush"] = time.perf_counter() - start
+            results["%s.save.%d" % (name,size)] = saves
+        finally:
+            queue = sqlrunlogger.WRITE_BEHIND_QUEUES.pop((db,runlogger.journalpath),None)
+            if queue is not None:
+                queue.close()
+            engine = sqlrunlogger.ENGINE_CACHE.pop(db,(None,None))[0]
+            if engine is not None:
+                engine.dispose()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+"""
+Command line startup benchmarks
+
+| Times starting the hex command line in a fresh interpreter, against starting
+| an interpreter that does nothing.  The command line is run with HOME set to
+| the work directory, so the user's config and runlogs are not used.
+
+@date      : 2026-10-18 23:12:40
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import sys
+import subprocess
+import hex
+from hex.bench import DEFAULT_COUNT, getOverhead, timeCalls
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(hex.__file__)))
+
+# Runs the hex command line with the arguments that follow
+RUN_HEX = "import sys; sys.argv = ['hex'] + sys.argv[1:]; from hex.cli import main; sys.exit(main())"
+
+COMMANDS = [
+    ("cli.version",["-V"]),
+    ("cli.exec.noop",["--runlogger","default","exec","true"]),
+]
+
+
+def benchStartup(workdir,results,count=DEFAULT_COUNT,**options):
+    env = dict(os.environ)
+    env["HOME"] = workdir
+    env["PYTHONPATH"] = os.pathsep.join([PACKAGE_ROOT] + [path for path in [env.get("PYTHONPATH")] if path])
+
+    def run(args):
+        subprocess.run([sys.executable] + args,env=env,cwd=workdir,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL,check=True)
+
+    baseline = timeCalls(run,count,["-c","pass"])
+    results["python.start"] = baseline
+    for name, args in COMMANDS:
+        measured = timeCalls(run,count,["-c",RUN_HEX] + args)
+        results[name] = measured
+        results["%s.overhead" % name] = getOverhead(measured,baseline)
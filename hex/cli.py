@@ -18,9 +18,19 @@ from argparse import ArgumentParser,RawDescriptionHelpFormatter
 from hex import __version__ as version
 from hex import UserException
 from hex import config
+from hex.profiling import configureProfiling
 
 SUBCOMMAND_MODULES = [
     ("exec","Execute a command directly, without argument processing","hexexec"),  # subcommand name, description, modulename
+    ("tail","Stream the stdout and stderr of a run until it finishes","hextail"),
+    ("batch","Run a file of commands, one per line, with bounded concurrency","hexbatch"),
+    ("migrate","Move run directories into a different runlog layout","hexmigrate"),
+    ("gc","Delete old runs and temporary scripts according to a retention policy","hexgc"),
+    ("serve","Run a daemon that executes commands for hex clients","hexserve"),
+    ("submit","Start a command on the hex daemon and print its runid","hexsubmit"),
+    ("status","Show the status of many runs, marking runs whose process has died as LOST","hexstatus"),
+    ("run-dag","Run a workflow of commands with dependencies from a JSON file","hexrundag"),
+    ("bench","Measure the overhead of hex execution and logging, as JSON","hexbench"),
 ]
 
 logger = logging.getLogger("hex")
@@ -50,10 +60,31 @@ def applyParameterDefToArgumentParser(parameterdef,parser):
         parameterdef["name"] = name
 
 
+def getSubcommand(argv=None):
+    '''
+    Work out which subcommand is being run without importing any of them, so
+    that only its module needs to be loaded.  Returns None if there isn't one.
+    '''
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument('--loglevel')
+    parser.add_argument('--runlogger')
+    subparsers = parser.add_subparsers(dest='SUBCOMMAND')
+    for subcommand,description,modulestr in SUBCOMMAND_MODULES:
+        subparsers.add_parser(subcommand,add_help=False)
+    try:
+        args, extras = parser.parse_known_args(argv)
+    except SystemExit:
+        return None
+    return args.SUBCOMMAND
+
+
 def initArgs():
     '''
     Setup arguments with parameterdef, check envs, parse commandline.
     Returns args as a dictionary
+
+    Only the module of the subcommand being run is imported; the others are
+    listed in the help but their options are not loaded.
     '''
 
     # Parameter defs for the main command
@@ -90,13 +121,16 @@ def initArgs():
     for parameterdef in parameterdefs:
         applyParameterDefToArgumentParser(parameterdef,parser)
 
-    # Setup the subcommands and their parameters
+    # Setup the subcommands and the parameters of the one being run
+    selected = getSubcommand()
     subparsers = parser.add_subparsers(help='hex subcommands',dest='SUBCOMMAND')
     for subcommand,description,modulestr in SUBCOMMAND_MODULES:
+        parsernew = subparsers.add_parser(subcommand, description=description, help=description)
+        if subcommand != selected:
+            continue
         modulename = 'hex.subcommand.%s' % modulestr
         module = __import__(modulename,globals(),locals(),['getParameterDefs'])
         parameterdefs = module.getParameterDefs()
-        parsernew = subparsers.add_parser(subcommand, description=description)
         for parameterdef in parameterdefs:
             applyParameterDefToArgumentParser(parameterdef,parsernew)
 
@@ -123,6 +157,9 @@ def main():
             raise UserException('--loglevel / HEX_LOGLEVEL value %s is not recognized.' % argdict['HEX_LOGLEVEL'])
         logger.setLevel(loglevel)
 
+        # Only does anything if HEX_PROFILE or the profile config value is set
+        configureProfiling()
+
         # Run the subcommand
         for subcommandstr,description,modulestr in SUBCOMMAND_MODULES:
             if argdict["SUBCOMMAND"] == subcommandstr:
@@ -29,13 +29,24 @@ class Config(object):
     ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
 
     def __init__(self):
-        self.params = self.SECTIONS
+        # config files are read the first time params are used
+        self.loaded = None
+
+    @property
+    def params(self):
+        if self.loaded is None:
+            self.load()
+        return self.loaded
+
+    def load(self):
+        params = self.SECTIONS
         # load configs from lowest to highest level overwritting with update
         for name in self.CONFIG_LEVELS:
             level = self.read_config(name)
-            for section in self.params:
+            for section in params:
                 if section in level:
-                    self.params[section].update(level[section])
+                    params[section].update(level[section])
+        self.loaded = params
 
     def read_config(self, name):
         params = {}
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Run lifecycle events
+
+| Runloggers emit an event whenever a run is saved in a new state: queued,
+| started, or finished (with how long it took and what it used).  Systems
+| emit output events with each chunk a run writes.  Subscribers to an
+| EventBus get them as they happen: in-process callbacks, a JSON lines file,
+| or a listener on a local Unix socket.
+|
+| The default bus gets subscribers from the HEX_EVENTS environment variable or
+| the events config value, a comma separated list of file:<path> and / or
+| socket:<path>.  A bus without subscribers costs next to nothing.
+
+@date      : 2026-10-18 22:40:19
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import json
+import time
+import base64
+import socket
+import logging
+import threading
+from datetime import datetime
+from hex import config, UserException
+
+QUEUED_EVENT = "queued"
+STARTED_EVENT = "started"
+OUTPUT_EVENT = "output"
+FINISHED_EVENT = "finished"
+EVENT_TYPES = [QUEUED_EVENT,STARTED_EVENT,OUTPUT_EVENT,FINISHED_EVENT]
+
+# The event emitted when a run log is saved with each status
+STATUS_EVENTS = {
+    "QUEUED"    : QUEUED_EVENT,
+    "RUNNING"   : STARTED_EVENT,
+    "COMPLETED" : FINISHED_EVENT,
+    "LOST"      : FINISHED_EVENT,
+    "CANCELLED" : FINISHED_EVENT,
+}
+
+# Seconds a socket subscriber waits on a slow listener before dropping the
+# connection, and before trying to connect again
+SOCKET_SEND_TIMEOUT = 1.0
+SOCKET_RETRY_INTERVAL = 5.0
+
+logger = logging.getLogger("hex")
+
+
+class JsonLinesSubscriber(object):
+    """
+    Appends each event to a file as a line of JSON.  Each line is a single
+    write to a file opened for appending, so several processes can share the file.
+    """
+    def __init__(self,path):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory,exist_ok=True)
+        self.fd = os.open(path,os.O_WRONLY | os.O_APPEND | os.O_CREAT,0o600)
+
+    def __call__(self,event):
+        line = (json.dumps(event) + "\n").encode("utf-8")
+        with self.lock:
+            if self.fd is not None:
+                os.write(self.fd,line)
+
+    def close(self):
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+
+class SocketSubscriber(object):
+    """
+    Sends each event as a line of JSON to a listener on a Unix domain socket.
+
+    Events are dropped, rather than holding up the run, while there is no
+    listener; the connection is retried every SOCKET_RETRY_INTERVAL seconds.
+    A forked process makes its own connection.
+    """
+    def __init__(self,path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.sock = None
+        self.pid = None
+        self.retryafter = 0
+
+    def connect(self):
+        if self.sock is not None and self.pid == os.getpid():
+            return self.sock
+        self.sock = None
+        if time.time() < self.retryafter:
+            return None
+        sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        sock.settimeout(SOCKET_SEND_TIMEOUT)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            self.retryafter = time.time() + SOCKET_RETRY_INTERVAL
+            return None
+        self.sock = sock
+        self.pid = os.getpid()
+        return sock
+
+    def __call__(self,event):
+        line = (json.dumps(event) + "\n").encode("utf-8")
+        with self.lock:
+            sock = self.connect()
+            if sock is None:
+                return
+            try:
+                sock.sendall(line)
+            except OSError:
+                sock.close()
+                self.sock = None
+                self.retryafter = time.time() + SOCKET_RETRY_INTERVAL
+
+    def close(self):
+        with self.lock:
+            if self.sock is not None and self.pid == os.getpid():
+                self.sock.close()
+            self.sock = None
+
+
+def getSubscriber(spec):
+    """
+    Make a subscriber from a spec like file:/path/to/events.jsonl or socket:/path/to/socket
+    """
+    kind, sep, path = spec.strip().partition(":")
+    if kind == "file" and path:
+        return JsonLinesSubscriber(os.path.expanduser(path))
+    if kind == "socket" and path:
+        return SocketSubscriber(os.path.expanduser(path))
+    raise UserException("Unknown event subscriber %s.  Use file:<path> or socket:<path>" % spec)
+
+
+class EventBus(object):
+    """
+    Delivers events to subscribers.
+
+    A subscriber is any callable that takes the event, a dictionary with the event
+    type, the runid, the time (seconds since the epoch), hostname and pid of the
+    process emitting it, and fields for the type of event.  Subscribers are called
+    in the emitting thread, so they should be quick; an exception from one is
+    logged and does not affect the run.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (subscriber, event types or None for all); replaced rather than changed
+        # so that emit() can read it without the lock
+        self.subscribers = ()
+        self.hostname = socket.gethostname().split(".",1)[0]
+
+    def subscribe(self,subscriber,events=None):
+        """
+        Add a subscriber for the given event types (default: all).  Returns the subscriber.
+        """
+        if events is not None:
+            events = frozenset(events)
+            unknown = events - set(EVENT_TYPES)
+            if unknown:
+                raise UserException("Unknown event types %s.  Available: %s" % (", ".join(sorted(unknown)),", ".join(EVENT_TYPES)))
+        with self.lock:
+            self.subscribers = self.subscribers + ((subscriber,events),)
+        return subscriber
+
+    def unsubscribe(self,subscriber):
+        with self.lock:
+            self.subscribers = tuple(entry for entry in self.subscribers if entry[0] != subscriber)
+
+    def wants(self,eventtype):
+        """
+        True if any subscriber takes events of this type
+        """
+        return any(events is None or eventtype in events for subscriber, events in self.subscribers)
+
+    def emit(self,eventtype,runid=None,**fields):
+        """
+        Send an event to the subscribers that want it
+        """
+        subscribers = [subscriber for subscriber, events in self.subscribers if events is None or eventtype in events]
+        if not subscribers:
+            return
+        event = {
+            "event"     : eventtype,
+            "runid"     : runid,
+            "time"      : time.time(),
+            "hostname"  : self.hostname,
+            "pid"       : os.getpid(),
+        }
+        event.update(fields)
+        for subscriber in subscribers:
+            try:
+                subscriber(event)
+            except Exception as e:
+                logger.warning("Event subscriber %s failed: %s" % (subscriber,str(e)))
+
+    def getRunLogEvent(self,runlog):
+        """
+        Return (event type, runid, fields) of the event for the status a run log
+        is being saved with, or None if there isn't one or nobody wants it.  Times
+        in the run log must still be datetimes.
+        """
+        eventtype = STATUS_EVENTS.get(runlog.get("status"))
+        if eventtype is None or not self.wants(eventtype):
+            return None
+        fields = {"status" : runlog.get("status"), "cmd" : runlog.get("cmd")}
+        if eventtype == STARTED_EVENT:
+            fields["jobid"] = runlog.get("jobid")
+        if eventtype == FINISHED_EVENT:
+            fields["result"] = runlog.get("result")
+            starttime, endtime = runlog.get("starttime"), runlog.get("endtime")
+            if isinstance(starttime,datetime) and isinstance(endtime,datetime):
+                fields["elapsed"] = (endtime - starttime).total_seconds()
+            fields["resources"] = runlog.getResourceUsage() if hasattr(runlog,"getResourceUsage") else {}
+        return eventtype, runlog.get("runid"), fields
+
+    def emitRunLog(self,runlog):
+        """
+        Emit the event for the status of a run log, if any
+        """
+        event = self.getRunLogEvent(runlog)
+        if event is not None:
+            eventtype, runid, fields = event
+            self.emit(eventtype,runid,**fields)
+
+    def close(self):
+        """
+        Remove all subscribers, closing those that can be closed
+        """
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, ()
+        for subscriber, events in subscribers:
+            if hasattr(subscriber,"close"):
+                subscriber.close()
+
+
+class EventSink(object):
+    """
+    Output sink (see hex.system.streams) that emits an output event for each
+    chunk of a run's stdout or stderr, and passes it on to sink if there is one
+    """
+    def __init__(self,bus,runid,stream,sink=None):
+        self.bus = bus
+        self.runid = runid
+        self.stream = stream
+        self.sink = sink
+
+    def write(self,data):
+        if self.sink is not None:
+            self.sink.write(data)
+        self.bus.emit(OUTPUT_EVENT,self.runid,stream=self.stream,size=len(data),data=base64.b64encode(data).decode("ascii"))
+
+    def flush(self):
+        if hasattr(self.sink,"flush"):
+            self.sink.flush()
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+
+
+DEFAULT_EVENT_BUS = None
+DEFAULT_EVENT_BUS_LOCK = threading.Lock()
+
+
+def getEventBus():
+    """
+    Return the default event bus, subscribing what HEX_EVENTS or the events
+    config value asks for the first time it is used
+    """
+    global DEFAULT_EVENT_BUS
+    with DEFAULT_EVENT_BUS_LOCK:
+        if DEFAULT_EVENT_BUS is None:
+            bus = EventBus()
+            specs = os.environ.get("HEX_EVENTS") or config.get_config(config.DEFAULT_SECTION).get("events","")
+            if isinstance(specs,str):
+                specs = specs.split(",")
+            for spec in specs:
+                if spec.strip():
+                    bus.subscribe(getSubscriber(spec))
+            DEFAULT_EVENT_BUS = bus
+        return DEFAULT_EVENT_BUS
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Profiling
+
+| Opt-in timing of the phases of a run: creating the runid, composing and
+| writing the script, starting the process, saving run logs, copying output,
+| and waiting for the process.  Each phase is a span, timed with span() or the
+| timed() decorator and added to a histogram per span name.
+|
+| The hex command switches profiling on when the HEX_PROFILE environment
+| variable or the profile config value is set, to a comma separated list of
+| outputs:
+|
+|   prometheus:<path>   histograms written as a Prometheus textfile when the process exits
+|   trace:<path>        each span appended to a JSON lines file as it ends
+|
+| Programs that use hex as a library call configureProfiling() to do the same,
+| or enableProfiling() directly.  The Prometheus textfile can be shared by
+| every hex process; see hex.profiling.profiler.
+|
+| This module only holds the hooks.  When profiling is off, span() returns a
+| shared do-nothing context manager, timed() functions make a single extra
+| check, and the profiler module is not even imported.
+
+@date      : 2026-10-18 23:44:09
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import atexit
+import logging
+import functools
+import importlib
+from hex import config, UserException
+
+logger = logging.getLogger("hex")
+
+# Names from the profiler module, which is only imported when first used
+LAZY_IMPORTS = {
+    "DEFAULT_BUCKETS"   : "profiler",
+    "PROMETHEUS_METRIC" : "profiler",
+    "Histogram"         : "profiler",
+    "Span"              : "profiler",
+    "Profiler"          : "profiler",
+    "readPrometheus"    : "profiler",
+    "addHistograms"     : "profiler",
+}
+
+
+def __getattr__(name):
+    if name in LAZY_IMPORTS:
+        module = importlib.import_module("%s.%s" % (__name__,LAZY_IMPORTS[name]))
+        return getattr(module,name)
+    raise AttributeError("module %s has no attribute %s" % (__name__,name))
+
+
+class NullSpan(object):
+    """
+    What span() returns when profiling is off
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exctype,excvalue,tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+PROFILER = None
+
+# Whether disableProfiling() has been registered to run at exit
+EXIT_REGISTERED = False
+
+
+def span(name,**attrs):
+    """
+    Context manager that times a phase when profiling is on
+    """
+    if PROFILER is None:
+        return NULL_SPAN
+    return PROFILER.span(name,**attrs)
+
+
+def timed(name):
+    """
+    Decorator that times each call of a function as a span when profiling is on
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args,**kwargs):
+            if PROFILER is None:
+                return func(*args,**kwargs)
+            with PROFILER.span(name):
+                return func(*args,**kwargs)
+        return wrapper
+    return decorator
+
+
+def getProfiler():
+    """
+    The profiler in use, or None if profiling is off
+    """
+    return PROFILER
+
+
+def enableProfiling(prometheuspath=None,tracepath=None,buckets=None):
+    """
+    Start profiling, replacing any profiler already in use.  What has been
+    collected is written out when the process exits.  Returns the Profiler.
+    """
+    global PROFILER, EXIT_REGISTERED
+    from hex.profiling.profiler import Profiler, DEFAULT_BUCKETS
+    disableProfiling()
+    PROFILER = Profiler(prometheuspath,tracepath,buckets or DEFAULT_BUCKETS)
+    if not EXIT_REGISTERED:
+        atexit.register(disableProfiling)
+        EXIT_REGISTERED = True
+    return PROFILER
+
+
+def disableProfiling():
+    """
+    Stop profiling, writing out what has been collected
+    """
+    global PROFILER
+    profiler, PROFILER = PROFILER, None
+    if profiler is not None:
+        profiler.close()
+
+
+def parseProfileSpec(specs):
+    """
+    Turn a profile setting like prometheus:/path/hex.prom,trace:/path/trace.jsonl
+    into enableProfiling() keyword arguments
+    """
+    kwargs = {}
+    if isinstance(specs,str):
+        specs = specs.split(",")
+    for spec in specs:
+        kind, sep, path = spec.strip().partition(":")
+        if kind in ("prometheus","trace") and path:
+            kwargs["%spath" % kind] = os.path.expanduser(path)
+        elif kind:
+            raise UserException("Unknown profile output %s.  Use prometheus:<path> or trace:<path>" % spec)
+    return kwargs
+
+
+def configureProfiling():
+    """
+    Turn profiling on if HEX_PROFILE or the profile config value ask for it
+    """
+    specs = os.environ.get("HEX_PROFILE") or config.get_config(config.DEFAULT_SECTION).get("profile")
+    if specs:
+        try:
+            kwargs = parseProfileSpec(specs)
+        except UserException as e:
+            logger.warning(e.user_msg)
+            return
+        if kwargs:
+            enableProfiling(**kwargs)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Profiler
+
+| Histograms of span durations, the trace file and the Prometheus textfile.
+| Only imported once profiling is switched on; see hex.profiling.
+|
+| Every hex process can share one Prometheus textfile.  On exit, a process
+| takes an flock on <path>.lock, reads the histograms already in the file, adds
+| its own counts and sums to them and replaces the file in one step, so the
+| file holds the totals over all the processes that have written it.  A span
+| whose buckets differ from the ones in the file starts again from this
+| process's counts.  Remove the file to reset the totals.
+
+@date      : 2026-10-18 23:44:09
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import re
+import json
+import fcntl
+import time
+import logging
+import threading
+
+# Upper bounds, in seconds, of the histogram buckets
+DEFAULT_BUCKETS = [0.0001,0.00025,0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0,30.0,60.0,300.0]
+
+PROMETHEUS_METRIC = "hex_span_seconds"
+
+PROMETHEUS_LINE = re.compile(r'^%s_(bucket|sum|count)\{span="([^"]*)"(?:,le="([^"]*)")?\} (\S+)$' % PROMETHEUS_METRIC)
+
+logger = logging.getLogger("hex")
+
+
+class Histogram(object):
+    """
+    Counts of durations in buckets, with their sum
+    """
+    def __init__(self,buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self,duration):
+        index = 0
+        while index < len(self.buckets) and duration > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += duration
+        self.count += 1
+
+    def getCumulativeCounts(self):
+        """
+        (upper bound, number of durations no longer than it) for each bucket, ending with +Inf
+        """
+        total = 0
+        cumulative = []
+        for bound, count in zip(self.buckets + [float("inf")],self.counts):
+            total += count
+            cumulative.append((bound,total))
+        return cumulative
+
+    def toDict(self):
+        return {
+            "count"     : self.count,
+            "sum"       : self.sum,
+            "buckets"   : [["+Inf" if bound == float("inf") else bound,count] for bound, count in self.getCumulativeCounts()],
+        }
+
+
+class Span(object):
+    """
+    Times the block it is used for and reports it to the profiler.  attrs (e.g.
+    the runid) are added to the trace record.
+    """
+    def __init__(self,profiler,name,attrs):
+        self.profiler = profiler
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.time()
+        self.perfstart = time.perf_counter()
+        return self
+
+    def __exit__(self,exctype,excvalue,tb):
+        self.profiler.record(self.name,time.perf_counter() - self.perfstart,self.start,self.attrs,exctype is not None)
+        return False
+
+
+class Profiler(object):
+    """
+    Collects span histograms for this process.  If tracepath is set, each span is
+    appended to it as a line of JSON; if prometheuspath is set, the histograms
+    are written to it by write(), which is called when the process exits.
+    """
+    def __init__(self,prometheuspath=None,tracepath=None,buckets=DEFAULT_BUCKETS):
+        self.prometheuspath = prometheuspath
+        self.tracepath = tracepath
+        self.buckets = buckets
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.tracefd = None
+        if tracepath is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(tracepath)),exist_ok=True)
+            self.tracefd = os.open(tracepath,os.O_WRONLY | os.O_APPEND | os.O_CREAT,0o600)
+
+    def span(self,name,**attrs):
+        return Span(self,name,attrs)
+
+    def record(self,name,duration,start=None,attrs=None,failed=False):
+        """
+        Add a span's duration to its histogram, and to the trace
+        """
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.buckets)
+            histogram.add(duration)
+        if self.tracefd is not None:
+            record = {"span" : name, "start" : start, "duration" : duration, "pid" : os.getpid(), "thread" : threading.get_ident()}
+            if failed:
+                record["failed"] = True
+            record.update(attrs or {})
+            os.write(self.tracefd,(json.dumps(record,default=str) + "\n").encode("utf-8"))
+
+    def getHistograms(self):
+        """
+        {span name : histogram as a dictionary}
+        """
+        with self.lock:
+            return {name : histogram.toDict() for name, histogram in self.histograms.items()}
+
+    def formatPrometheus(self,histograms=None):
+        """
+        Histograms, by default this process's, in the Prometheus text exposition format
+        """
+        if histograms is None:
+            histograms = self.getHistograms()
+        lines = [
+            "# HELP %s Time spent in each phase of hex runs" % PROMETHEUS_METRIC,
+            "# TYPE %s histogram" % PROMETHEUS_METRIC,
+        ]
+        for name in sorted(histograms):
+            histogram = histograms[name]
+            for bound, count in histogram["buckets"]:
+                le = bound if bound == "+Inf" else repr(bound)
+                lines.append('%s_bucket{span="%s",le="%s"} %d' % (PROMETHEUS_METRIC,name,le,count))
+            lines.append('%s_sum{span="%s"} %r' % (PROMETHEUS_METRIC,name,histogram["sum"]))
+            lines.append('%s_count{span="%s"} %d' % (PROMETHEUS_METRIC,name,histogram["count"]))
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """
+        Add the spans recorded since the last write to the Prometheus textfile.
+        The file is read and replaced under an flock on <path>.lock, so processes
+        writing at once do not lose each other's counts, and it is replaced in one
+        step so that a collector never reads half of it.
+        """
+        if self.prometheuspath is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.prometheuspath)),exist_ok=True)
+        with self.lock:
+            histograms, self.histograms = self.histograms, {}
+        try:
+            with open("%s.lock" % self.prometheuspath,"a") as lockfile:
+                fcntl.flock(lockfile,fcntl.LOCK_EX)
+                try:
+                    totals = readPrometheus(self.prometheuspath)
+                    for name, histogram in histograms.items():
+                        totals[name] = addHistograms(totals.get(name),histogram.toDict())
+                    tmppath = "%s.%d.tmp" % (self.prometheuspath,os.getpid())
+                    with open(tmppath,"w") as f:
+                        f.write(self.formatPrometheus(totals))
+                    os.replace(tmppath,self.prometheuspath)
+                finally:
+                    fcntl.flock(lockfile,fcntl.LOCK_UN)
+        except Exception:
+            with self.lock:
+                for name, histogram in histograms.items():
+                    self.histograms.setdefault(name,histogram)
+            raise
+
+    def close(self):
+        try:
+            self.write()
+        except OSError as e:
+            logger.warning("Unable to write profile to %s: %s" % (self.prometheuspath,str(e)))
+        if self.tracefd is not None:
+            os.close(self.tracefd)
+            self.tracefd = None
+
+
+def readPrometheus(path):
+    """
+    The histograms in a textfile written by Profiler.write(), as {span name :
+    histogram as a dictionary}.  Empty if there is no file.
+    """
+    histograms = {}
+    try:
+        f = open(path)
+    except FileNotFoundError:
+        return histograms
+    with f:
+        for line in f:
+            match = PROMETHEUS_LINE.match(line.strip())
+            if match is None:
+                continue
+            kind, name, le, value = match.groups()
+            histogram = histograms.setdefault(name,{"count" : 0, "sum" : 0.0, "buckets" : []})
+            if kind == "bucket":
+                histogram["buckets"].append([le if le == "+Inf" else float(le),int(value)])
+            elif kind == "sum":
+                histogram["sum"] = float(value)
+            else:
+                histogram["count"] = int(value)
+    return histograms
+
+
+def addHistograms(total,histogram):
+    """
+    The sum of two histogram dictionaries.  If total is missing or has different
+    buckets, histogram replaces it.
+    """
+    if total is None or [bound for bound, count in total["buckets"]] != [bound for bound, count in histogram["buckets"]]:
+        return histogram
+    return {
+        "count"     : total["count"] + histogram["count"],
+        "sum"       : total["sum"] + histogram["sum"],
+        "buckets"   : [[bound,count + other] for (bound, count), (b, other) in zip(total["buckets"],histogram["buckets"])],
+    }
+
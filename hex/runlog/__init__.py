@@ -1,13 +1,38 @@
+from .capture import *
 from .runlog import *
+from .runindex import *
+from .resultcache import *
+from .retention import *
 from .defaultrunlogger import *
-from .sqlrunlogger import *
 from hex import UserException, getClassFromName
+import importlib
+
+# Names from modules that are slow to import (sqlrunlogger needs SQLAlchemy).
+# They are only imported when one of the names is first used.
+LAZY_IMPORTS = {
+    "SQLRunLogger"      : "sqlrunlogger",
+    "SQLRunLog"         : "sqlrunlogger",
+    "getEngine"         : "sqlrunlogger",
+    "upgrade_schema"    : "sqlrunlogger",
+    "upsert_statement"  : "sqlrunlogger",
+    "ENGINE_CACHE"      : "sqlrunlogger",
+    "JOURNAL_NAME"      : "sqlrunlogger",
+}
+
+
+def __getattr__(name):
+    if name in LAZY_IMPORTS:
+        module = importlib.import_module("%s.%s" % (__name__,LAZY_IMPORTS[name]))
+        return getattr(module,name)
+    raise AttributeError("module %s has no attribute %s" % (__name__,name))
+
 
 DEFAULT_RUN_LOGGER_NAME = 'default'
 
-def getRunLogger(runlogger = None):
+def getRunLogger(runlogger = None, **kwargs):
     """
-    Return the runlogger class or default
+    Return the runlogger class or default.  Keyword arguments, e.g. pathname,
+    are passed to its constructor.
     """
     available_run_loggers = getAvailableRunLoggers()
     if runlogger in available_run_loggers.keys():
@@ -15,7 +40,7 @@ def getRunLogger(runlogger = None):
     else:
         classname = available_run_loggers[DEFAULT_RUN_LOGGER_NAME]
     run_logger_class = getClassFromName(classname)
-    return run_logger_class()
+    return run_logger_class(**kwargs)
 
 def getAvailableRunLoggers():
     """
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Output capture
+
+| Writes the stdout / stderr of a run with optional gzip or zstd compression,
+| a size cap that keeps the head and tail of the output, and rotation into
+| numbered segments.  Readers pick the decompression from the file suffix and
+| join rotated segments back together, so callers see plain text.
+| zstd needs the zstandard package.
+
+@date      : 2026-10-18 17:21:44
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import io
+import os
+import gzip
+from hex import UserException
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression name -> file suffix
+COMPRESSION_SUFFIXES = {
+    "gzip"  : ".gz",
+    "zstd"  : ".zst",
+}
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Number of rotated segments kept by default
+DEFAULT_ROTATE_COUNT = 5
+
+# Written between the head and tail of output that was over the size cap
+OMITTED_MARKER = "\n[hex: %d bytes of output omitted]\n"
+
+
+def getCompression(path):
+    """
+    Return the compression used for a file, from its suffix, or None
+    """
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+    return None
+
+
+def checkCompression(compression):
+    """
+    Raise a UserException if compression is unknown or not installed
+    """
+    if compression is None:
+        return
+    if compression not in COMPRESSION_SUFFIXES:
+        raise UserException("Unknown output compression %s.  Available: %s" % (compression,", ".join(sorted(COMPRESSION_SUFFIXES.keys()))))
+    if compression == "zstd" and zstandard is None:
+        raise UserException("zstd output compression requires the zstandard package")
+
+
+def addCompressionSuffix(path,compression):
+    """
+    Add the suffix for compression to path, unless it is already there
+    """
+    if compression is None or getCompression(path) == compression:
+        return path
+    return path + COMPRESSION_SUFFIXES[compression]
+
+
+def getRotatedPath(path,n):
+    """
+    Path of the nth most recent rotated segment of path, e.g. run-stdout.2.out.gz
+    for run-stdout.out.gz.  The number goes before the suffixes so that the
+    compression can still be told from the name.
+    """
+    dirname, filename = os.path.split(path)
+    base, dot, suffix = filename.partition(".")
+    return os.path.join(dirname,"%s.%d%s%s" % (base,n,dot,suffix))
+
+
+def getSegmentPaths(path):
+    """
+    Existing segments of a captured file, oldest first
+    """
+    rotated = []
+    n = 1
+    while os.path.exists(getRotatedPath(path,n)):
+        rotated.append(getRotatedPath(path,n))
+        n += 1
+    return list(reversed(rotated)) + ([path] if os.path.exists(path) else [])
+
+
+def openCompressed(path,mode="rb"):
+    """
+    Open a file for binary reading ("rb") or writing ("wb"), compressed according to its suffix
+    """
+    compression = getCompression(path)
+    checkCompression(compression)
+    if compression == "gzip":
+        return gzip.open(path,mode,compresslevel=GZIP_LEVEL) if mode == "wb" else gzip.open(path,mode)
+    if compression == "zstd":
+        f = open(path,mode)
+        if mode == "wb":
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(f)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f))
+    return open(path,mode)
+
+
+class SegmentReader(io.RawIOBase):
+    """
+    Reads a list of (possibly compressed) files as one stream
+    """
+    def __init__(self,paths):
+        super(SegmentReader,self).__init__()
+        self.paths = list(paths)
+        self.current = None
+
+    def readable(self):
+        return True
+
+    def readinto(self,buffer):
+        while True:
+            if self.current is None:
+                if not self.paths:
+                    return 0
+                self.current = openCompressed(self.paths.pop(0),"rb")
+            data = self.current.read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                return len(data)
+            self.current.close()
+            self.current = None
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+        super(SegmentReader,self).close()
+
+
+def openCapture(path,mode="r"):
+    """
+    Open captured output for reading, decompressing it and joining any rotated
+    segments.  mode is "r" for text or "rb" for bytes.  Returns None if there is
+    no output.
+    """
+    paths = getSegmentPaths(path)
+    if not paths:
+        return None
+    if len(paths) == 1 and getCompression(path) is None:
+        return open(path,mode)
+    reader = io.BufferedReader(SegmentReader(paths))
+    if mode == "rb":
+        return reader
+    return io.TextIOWrapper(reader)
+
+
+class CaptureWriter(object):
+    """
+    Output sink (see hex.system.streams) that writes a captured stream to path.
+
+    The compression is taken from path's suffix.  If maxbytes is set, only the
+    first and last maxbytes / 2 bytes are kept, with a note of how much was
+    omitted between them; the tail is held in memory until close().  If rotatebytes
+    is set, the file is moved aside to a numbered segment whenever it has that many
+    (uncompressed) bytes, and at most rotatecount old segments are kept.
+    """
+    def __init__(self,path,maxbytes=None,rotatebytes=None,rotatecount=DEFAULT_ROTATE_COUNT):
+        self.path = path
+        self.maxbytes = maxbytes
+        self.rotatebytes = rotatebytes
+        self.rotatecount = rotatecount
+        self.headbytes = None if maxbytes is None else maxbytes // 2
+        self.tailbytes = None if maxbytes is None else maxbytes - self.headbytes
+        self.tail = bytearray()
+        self.total = 0
+        self.headwritten = 0
+        self.segmentbytes = 0
+        # Segments left by an earlier capture to the same path would be read back as part of this one
+        n = 1
+        while os.path.exists(getRotatedPath(path,n)):
+            os.remove(getRotatedPath(path,n))
+            n += 1
+        self.f = openCompressed(path,"wb")
+
+    def write(self,data):
+        self.total += len(data)
+        if self.maxbytes is None:
+            self.writeSegment(data)
+            return
+
+        room = self.headbytes - self.headwritten
+        if room > 0:
+            self.writeSegment(data[:room])
+            self.headwritten += min(room,len(data))
+            data = data[room:]
+        if data and self.tailbytes > 0:
+            self.tail += data
+            if len(self.tail) > self.tailbytes:
+                del self.tail[:len(self.tail) - self.tailbytes]
+
+    def writeSegment(self,data):
+        while data:
+            if not self.rotatebytes:
+                self.f.write(data)
+                return
+            if self.segmentbytes >= self.rotatebytes:
+                self.rotate()
+            room = self.rotatebytes - self.segmentbytes
+            self.f.write(data[:room])
+            self.segmentbytes += min(room,len(data))
+            data = data[room:]
+
+    def rotate(self):
+        """
+        Move the current file to segment 1, shifting older segments up and
+        dropping any beyond rotatecount, and start a new file
+        """
+        self.f.close()
+        if self.rotatecount < 1:
+            os.remove(self.path)
+        else:
+            for n in range(self.rotatecount - 1,0,-1):
+                if os.path.exists(getRotatedPath(self.path,n)):
+                    os.rename(getRotatedPath(self.path,n),getRotatedPath(self.path,n + 1))
+            os.rename(self.path,getRotatedPath(self.path,1))
+        self.f = openCompressed(self.path,"wb")
+        self.segmentbytes = 0
+
+    def close(self):
+        if self.f is None:
+            return
+        if self.maxbytes is not None:
+            omitted = self.total - self.headwritten - len(self.tail)
+            if omitted > 0:
+                self.writeSegment((OMITTED_MARKER % omitted).encode())
+            self.writeSegment(bytes(self.tail))
+            self.tail = bytearray()
+        self.f.close()
+        self.f = None
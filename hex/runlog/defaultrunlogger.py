@@ -6,6 +6,8 @@ DefaultRunLogger
 
 | Stores run logs as individual json documents in a hidden home directory, ~/.hex/runlogs.
 | File names are generated via tempfile, using the first 3-5 chars of the command being run.
+| A RunIndex in the same directory catalogs the run logs so they can be queried.
+| Run directories can optionally be sharded into subdirectories derived from the runid.
 
 @date      : 2017-06-21 10:47:02
 @author    : Aaron Kitzmiller (aaron_kitzmiller@harvard.edu)
@@ -16,20 +18,70 @@ DefaultRunLogger
 """
 import os, re, logging
 import json
+import time
+import random
+import string
+import hashlib
+import shutil
 import tempfile
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from hex.runlog import RunLog
+from hex.runlog.runindex import RunIndex, getIndexPath
+from hex.runlog.retention import getTreeSize, UNKNOWN_STATUS
+from hex import config, UserException
+from hex.events import getEventBus
+from hex.profiling import timed
 
 DEFAULT_RUNLOG_PATH = os.path.expanduser("~/.hex/runlogs")
 
+# Run directory layouts.  flat puts every run directly in pathname, hash uses two
+# levels of md5 prefix (ab/cd/<runid>), and date uses the runid's yymm/dd prefix.
+RUNLOG_LAYOUTS = ["flat","hash","date"]
+
+# File in pathname that records the layout new runs are created with
+LAYOUT_MARKER_NAME = ".layout"
+
+# Shard directory names at each level of each layout.  Date layout runids
+# without a date go in an "undated" shard.
+SHARD_PATTERNS = {
+    "flat" : [],
+    "hash" : [re.compile(r"^[0-9a-f]{2}$"),re.compile(r"^[0-9a-f]{2}$")],
+    "date" : [re.compile(r"^\d{4}$"),re.compile(r"^\d{2}$")],
+}
+UNDATED_SHARD = "undated"
+
+# Run log fields that hold paths inside the run directory
+RUN_PATH_FIELDS = ["scriptfilepath","stdoutfile","stderrfile"]
+
+# Number of threads used to read run logs when rebuilding the index, and
+# to walk and delete run directories when pruning
+REBUILD_THREADS = 16
+
 logger = logging.getLogger("hex")
 
 
 class DefaultRunLogger(object):
     """
     Saves RunLogs as json documents in ~/.hex/runlogs/<runid> by default
+
+    Unless index is False, every save also updates a RunIndex so that query() can
+    find runs without reading each run log.  If pathname is on a network
+    filesystem the index is kept on local disk (see getIndexPath).  Such an
+    index is filled from the existing run logs by the first query() or
+    resourceReport() that needs it, rather than when it is created, so that
+    saving runs on a new host does not have to read every run log.
+
+    layout is one of RUNLOG_LAYOUTS.  If it is not set, the layout recorded in
+    pathname is used, then the runlog_layout config value, then flat.  A layout
+    that differs from the recorded one is an error, as the runs already there
+    could not be found; use hex migrate (setLayout and migrateLayout) to change
+    it.  Runs that are still in the flat layout are found regardless of the layout.
+
+    Saving a run log as QUEUED, RUNNING, or finished emits the matching event on
+    events (by default, the default hex.events bus).
     """
-    def __init__(self,pathname=DEFAULT_RUNLOG_PATH):
+    def __init__(self,pathname=DEFAULT_RUNLOG_PATH,index=True,layout=None,events=None):
         self.dateFormatString = "%Y-%m-%d %H:%M:%S"
         self.suffix = ".json"
         self.pathname = pathname
@@ -37,6 +89,86 @@ class DefaultRunLogger(object):
         if not os.path.exists(self.pathname):
             os.makedirs(self.pathname)
 
+        self.layout = self.resolveLayout(layout)
+        self.events = events if events is not None else getEventBus()
+
+        self.index = None
+        # Whether the index is kept apart from the run logs, and so may be missing runs
+        self.indexapart = False
+        if index:
+            indexpath = getIndexPath(self.pathname)
+            if indexpath is None:
+                logger.warning("No local directory for the index of %s, so it is not indexed" % self.pathname)
+            else:
+                self.index = RunIndex(indexpath,self.dateFormatString)
+                self.indexapart = not indexpath.startswith(os.path.join(self.pathname,""))
+
+    def resolveLayout(self,layout=None):
+        """
+        Work out the layout to use and record it in pathname if it is not flat
+        """
+        markerpath = os.path.join(self.pathname,LAYOUT_MARKER_NAME)
+        recorded = None
+        if os.path.exists(markerpath):
+            with open(markerpath,"r") as f:
+                recorded = f.read().strip()
+        if layout is None:
+            layout = recorded or config.get_config(config.DEFAULT_SECTION).get("runlog_layout","flat")
+        if layout not in RUNLOG_LAYOUTS:
+            raise UserException("Unknown runlog layout %s.  Available layouts: %s" % (layout,", ".join(RUNLOG_LAYOUTS)))
+        if recorded is not None and layout != recorded:
+            raise UserException("Run logs in %s are in the %s layout, not %s.  Use hex migrate --layout %s to move them" % (self.pathname,recorded,layout,layout))
+        if recorded is None and layout != "flat":
+            self.recordLayout(layout)
+        return layout
+
+    def recordLayout(self,layout):
+        markerpath = os.path.join(self.pathname,LAYOUT_MARKER_NAME)
+        if layout == "flat":
+            if os.path.exists(markerpath):
+                os.remove(markerpath)
+            return
+        with open(markerpath,"w") as f:
+            f.write(layout + "\n")
+
+    def setLayout(self,layout):
+        """
+        Switch pathname to a new layout, for migrateLayout.  New runs are created
+        in it straight away; existing runs are only found once they are migrated,
+        unless they are flat.
+        """
+        if layout not in RUNLOG_LAYOUTS:
+            raise UserException("Unknown runlog layout %s.  Available layouts: %s" % (layout,", ".join(RUNLOG_LAYOUTS)))
+        self.recordLayout(layout)
+        self.layout = layout
+
+    def getShard(self,runid,layout=None):
+        """
+        Return the shard subdirectory (relative to pathname) for a runid,
+        or an empty string for the flat layout.
+        """
+        layout = layout or self.layout
+        if layout == "hash":
+            digest = hashlib.md5(runid.encode("utf-8")).hexdigest()
+            return os.path.join(digest[0:2],digest[2:4])
+        if layout == "date":
+            if re.match(r"^\d{6}",runid):
+                return os.path.join(runid[0:4],runid[4:6])
+            return UNDATED_SHARD
+        return ""
+
+    def getRunDir(self,runid):
+        """
+        Return the directory for a runid.  A sharded layout falls back to the
+        flat location if the run is only found there.
+        """
+        rundir = os.path.join(self.pathname,self.getShard(runid),runid)
+        if self.layout != "flat" and not os.path.isdir(rundir):
+            flatdir = os.path.join(self.pathname,runid)
+            if os.path.isdir(flatdir):
+                return flatdir
+        return rundir
+
     def getRunPath(self,runid,resource,suffix):
         """
         Get a path name based on the resource and suffix.
@@ -44,7 +176,7 @@ class DefaultRunLogger(object):
         Resource can be something like "runlog","stdout","script", etc.
         """
         filename = "%s-%s%s" % (runid,resource,suffix)
-        return os.path.join(self.pathname,runid,filename)
+        return os.path.join(self.getRunDir(runid),filename)
 
     def getRunLogPath(self,runid):
         """
@@ -72,6 +204,7 @@ class DefaultRunLogger(object):
         """
         return self.getRunPath(runid,"stderr",suffix)
 
+    @timed("runlogger.newRunId")
     def newRunId(self,cmd=None):
         """
         Create a unique run id.  Uses tempfile to create a directory in the path.
@@ -88,12 +221,24 @@ class DefaultRunLogger(object):
         now = datetime.now()
         short_datetime = "%y%m%d%H%M%S"
         prefix = now.strftime(short_datetime) + prefix
-        tname = tempfile.mkdtemp(prefix=prefix,dir=self.pathname)
-
-        runid = os.path.split(tname)[1]
+        if self.layout == "flat":
+            tname = tempfile.mkdtemp(prefix=prefix,dir=self.pathname)
+            return os.path.split(tname)[1]
 
-        return runid
+        # The shard depends on the runid, so pick the name first, like mkdtemp does
+        chars = string.ascii_lowercase + string.digits + "_"
+        rng = random.SystemRandom()
+        while True:
+            runid = prefix + "".join(rng.choice(chars) for i in range(8))
+            sharddir = os.path.join(self.pathname,self.getShard(runid))
+            os.makedirs(sharddir,exist_ok=True)
+            try:
+                os.mkdir(os.path.join(sharddir,runid),0o700)
+                return runid
+            except FileExistsError:
+                continue
 
+    @timed("runlogger.get")
     def get(self,runid):
         """
         Reads the RunLog from a json file and returns
@@ -110,6 +255,7 @@ class DefaultRunLogger(object):
         runlog = RunLog(**runlogdata)
         return runlog
 
+    @timed("runlogger.save")
     def save(self,runlog):
         """
         Saves RunLog to a json file
@@ -118,6 +264,7 @@ class DefaultRunLogger(object):
             runid = self.newRunId(runlog.get("cmd"))
             runlog["runid"] = runid
 
+        event = self.events.getRunLogEvent(runlog)
         for key in ["starttime","endtime"]:
             if key in runlog:
                 runlog[key] = runlog[key].strftime(self.dateFormatString)
@@ -126,4 +273,227 @@ class DefaultRunLogger(object):
         with open(runlogfile,"w") as f:
             json.dump(runlog,f,indent=4)
 
+        if self.index is not None:
+            try:
+                self.index.update(runlog)
+            except Exception as e:
+                # The run log file is what matters; the index can be rebuilt
+                logger.warning("Unable to index run %s: %s" % (runlog["runid"],str(e)))
+
+        if event is not None:
+            eventtype, runid, fields = event
+            self.events.emit(eventtype,runid,**fields)
         return runlog["runid"]
+
+    def statusMany(self,runids,threads=REBUILD_THREADS):
+        """
+        Load the run logs of many runs, reading the files in parallel.  Returns
+        {runid : RunLog}; runs whose run log can't be read are left out.
+        """
+        def load(runid):
+            try:
+                return self.get(runid)
+            except Exception as e:
+                logger.debug("Unable to read run log for %s: %s" % (runid,str(e)))
+                return None
+
+        runids = list(runids)
+        if not runids:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(threads,len(runids))) as pool:
+            return dict((runid,runlog) for runid, runlog in zip(runids,pool.map(load,runids)) if runlog is not None)
+
+    def flush(self,timeout=None):
+        """
+        Wait for any buffered saves to be written.  Saves are written immediately,
+        so this returns True; subclasses that buffer override it.
+        """
+        return True
+
+    def getRunDirs(self,layout=None):
+        """
+        Return (runid, directory) for every run stored in the given layout (or
+        this logger's layout).  For sharded layouts this includes runs still in
+        the flat location.
+        """
+        layout = layout or self.layout
+        rundirs = []
+
+        def scan(path,patterns):
+            for entry in os.scandir(path):
+                if not entry.is_dir() or entry.name.startswith("."):
+                    continue
+                if patterns and patterns[0].match(entry.name):
+                    scan(entry.path,patterns[1:])
+                elif layout == "date" and path == self.pathname and entry.name == UNDATED_SHARD:
+                    scan(entry.path,[])
+                else:
+                    rundirs.append((entry.name,entry.path))
+
+        scan(self.pathname,SHARD_PATTERNS[layout])
+        return rundirs
+
+    def getRunIds(self):
+        """
+        Return the runids of all of the runs under pathname
+        """
+        return [runid for runid, rundir in self.getRunDirs()]
+
+    def migrateLayout(self,fromlayout="flat"):
+        """
+        Move runs stored in fromlayout into this logger's layout.  Paths recorded
+        in the run logs are rewritten to match, and passed to updateRunPaths.
+        Returns the number of runs moved.
+
+        Only directories with a run log are moved, and shard directories of this
+        logger's layout are left alone, so migrating again after new runs have
+        been created is safe.
+        """
+        patterns = SHARD_PATTERNS[self.layout]
+        moved = 0
+        changedlogs = []
+        for runid, rundir in self.getRunDirs(fromlayout):
+            target = os.path.join(self.pathname,self.getShard(runid),runid)
+            if os.path.abspath(rundir) == os.path.abspath(target):
+                continue
+            if os.path.dirname(os.path.abspath(rundir)) == os.path.abspath(self.pathname):
+                if (patterns and patterns[0].match(runid)) or (self.layout == "date" and runid == UNDATED_SHARD):
+                    continue
+            if not os.path.exists(os.path.join(rundir,"%s-%s%s" % (runid,"runlog",self.suffix))):
+                continue
+            os.makedirs(os.path.dirname(target),exist_ok=True)
+            os.rename(rundir,target)
+            moved += 1
+
+            runlogpath = os.path.join(target,"%s-%s%s" % (runid,"runlog",self.suffix))
+            with open(runlogpath,"r") as f:
+                runlogdata = json.load(f)
+            changed = False
+            for key in RUN_PATH_FIELDS:
+                value = runlogdata.get(key)
+                if value and value.startswith(rundir + os.sep):
+                    runlogdata[key] = target + value[len(rundir):]
+                    changed = True
+            if changed:
+                with open(runlogpath,"w") as f:
+                    json.dump(runlogdata,f,indent=4)
+                changedlogs.append(runlogdata)
+        self.updateRunPaths(changedlogs)
+        return moved
+
+    def updateRunPaths(self,runlogs):
+        """
+        Record the new paths of migrated runs.  The index does not hold paths, so
+        there is nothing to do here; subclasses that store runs elsewhere should
+        update them there.
+        """
+        pass
+
+    def query(self,status=None,since=None,until=None,hostname=None,cmdprefix=None,limit=None,parentrunid=None):
+        """
+        Find runs using the index.  Returns dictionaries of the indexed run log
+        fields (runid, status, result, hostname, cmd, starttime, endtime, jobid, system, parentrunid),
+        most recently started first.  See RunIndex.query for the criteria.
+        """
+        self.checkIndex()
+        return self.index.query(status=status,since=since,until=until,hostname=hostname,cmdprefix=cmdprefix,limit=limit,parentrunid=parentrunid)
+
+    def resourceReport(self,groupby="hostname",status=None,since=None,until=None,hostname=None,cmdprefix=None):
+        """
+        Aggregate resource usage of the matching runs from the index.  See RunIndex.resourceReport.
+        """
+        self.checkIndex()
+        return self.index.resourceReport(groupby=groupby,status=status,since=since,until=until,hostname=hostname,cmdprefix=cmdprefix)
+
+    def checkIndex(self):
+        """
+        Make sure the index can be queried, building an index kept apart from the
+        run logs the first time it is used
+        """
+        if self.index is None:
+            raise Exception("Run logs in %s are not indexed" % self.pathname)
+        if self.indexapart and not self.index.isBuilt():
+            logger.info("Indexing the run logs in %s" % self.pathname)
+            self.rebuildIndex()
+        self.indexapart = False
+
+    def getRunSummary(self,rundir):
+        """
+        Return the runid, directory, status, start time (seconds since the epoch)
+        and size of a (runid, directory) from getRunDirs.  Runs without a readable
+        run log have the UNKNOWN status and the directory's modification time.
+        """
+        runid, path = rundir
+        run = {"runid" : runid, "path" : path, "status" : UNKNOWN_STATUS, "starttime" : None}
+        try:
+            with open(os.path.join(path,"%s-%s%s" % (runid,"runlog",self.suffix)),"r") as f:
+                runlogdata = json.load(f)
+            run["status"] = runlogdata.get("status") or UNKNOWN_STATUS
+            run["starttime"] = time.mktime(datetime.strptime(runlogdata["starttime"],self.dateFormatString).timetuple())
+        except Exception:
+            pass
+        try:
+            if run["starttime"] is None:
+                run["starttime"] = os.path.getmtime(path)
+        except OSError:
+            run["starttime"] = time.time()
+        run["size"] = getTreeSize(path)
+        return run
+
+    def prune(self,policy,dryrun=False,threads=REBUILD_THREADS):
+        """
+        Delete the runs that the RetentionPolicy does not keep.  Run directories
+        are walked and deleted in parallel, and the runs are removed from the index
+        (see removeRuns).  Returns the pruned runs, as from getRunSummary with a
+        reason added, without deleting anything if dryrun is set.
+        """
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            runs = list(pool.map(self.getRunSummary,self.getRunDirs()))
+            pruned = policy.select(runs)
+            if dryrun or not pruned:
+                return pruned
+
+            def remove(run):
+                try:
+                    shutil.rmtree(run["path"])
+                    return run
+                except OSError as e:
+                    logger.warning("Unable to remove run %s: %s" % (run["runid"],str(e)))
+                    return None
+            pruned = [run for run in pool.map(remove,pruned) if run is not None]
+
+        self.removeRuns([run["runid"] for run in pruned])
+        return pruned
+
+    def removeRuns(self,runids):
+        """
+        Forget runs whose directories have been deleted.  Subclasses that store
+        runs elsewhere should remove them there too.
+        """
+        if self.index is not None and runids:
+            self.index.remove(runids)
+
+    def rebuildIndex(self,threads=REBUILD_THREADS):
+        """
+        Recreate the index from the run log files, e.g. for run logs saved before
+        indexing was added.  Run logs are read in parallel.  Returns the number of
+        runs indexed.
+        """
+        if self.index is None:
+            raise Exception("Run logs in %s are not indexed" % self.pathname)
+
+        def load(rundir):
+            runid, path = rundir
+            try:
+                with open(os.path.join(path,"%s-%s%s" % (runid,"runlog",self.suffix)),"r") as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.warning("Unable to read run log for %s: %s" % (runid,str(e)))
+                return None
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            runlogs = [runlog for runlog in pool.map(load,self.getRunDirs()) if runlog is not None]
+        self.index.clear()
+        self.index.updateMany(runlogs)
+        self.index.setBuilt()
+        return len(runlogs)
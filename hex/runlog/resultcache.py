@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ResultCache
+
+| Remembers the runs of idempotent commands so that running the same script, with
+| the same interpreter and unchanged inputs, can return the earlier run instead of
+| executing again.  Entries are kept in a hidden directory in the runlog path and
+| hold links to (or copies of) the run's stdout and stderr, so they outlive the run
+| directory.  The least recently used entries are evicted to stay within the limits.
+
+@date      : 2026-10-18 16:48:20
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+from hex import UserException
+from hex.runlog.capture import COMPRESSION_SUFFIXES, getCompression, getSegmentPaths, SegmentReader
+
+DEFAULT_CACHE_NAME = ".resultcache"
+DEFAULT_CACHE_MAX_ENTRIES = 10000
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_CACHE_RECOUNT_PUTS = 1000
+
+ENTRY_NAME = "entry.json"
+USAGE_NAME = ".usage.json"
+OUTPUT_NAMES = {"stdoutfile" : "stdout", "stderrfile" : "stderr"}
+
+logger = logging.getLogger("hex")
+
+
+def getInputSignature(path,hashinputs=False):
+    """
+    Return what identifies the current contents of an input file: its mtime
+    and size, or the sha256 of its contents if hashinputs is set.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise UserException("Cached command input %s does not exist" % path)
+    if not hashinputs:
+        return "%d:%d" % (stat.st_mtime_ns,stat.st_size)
+    digest = hashlib.sha256()
+    with open(path,"rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024),b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """
+    Cache of run results keyed by script, interpreter, and input files.
+
+    Entries are directories named by key, each with an entry.json and the run's
+    output.  An entry's mtime is its last use; put() evicts the least recently
+    used entries once there are more than maxentries or their output is larger
+    than maxbytes.
+
+    The number of entries and their size are kept in a usage file that put() and
+    invalidate() update, so a put only scans the cache when it goes over a limit.
+    The usage is recounted by that scan, and every recountputs puts in case
+    entries were added or removed behind the cache's back.
+    """
+    def __init__(self,path,maxentries=DEFAULT_CACHE_MAX_ENTRIES,maxbytes=DEFAULT_CACHE_MAX_BYTES,recountputs=DEFAULT_CACHE_RECOUNT_PUTS):
+        self.path = path
+        self.maxentries = maxentries
+        self.maxbytes = maxbytes
+        self.recountputs = recountputs
+        if not os.path.exists(self.path):
+            os.makedirs(self.path,exist_ok=True)
+
+    def getKey(self,script,interpreter,inputs=None,hashinputs=False):
+        """
+        Key for a composed script run by interpreter.  inputs are the files the
+        script reads; a change to any of them changes the key.
+        """
+        digest = hashlib.sha256()
+        digest.update(interpreter.encode("utf-8") + b"\0")
+        digest.update(script.encode("utf-8") + b"\0")
+        for path in sorted(os.path.abspath(path) for path in (inputs or [])):
+            digest.update(("%s\0%s\0" % (path,getInputSignature(path,hashinputs))).encode("utf-8"))
+        return digest.hexdigest()
+
+    def getEntryDir(self,key):
+        return os.path.join(self.path,key)
+
+    def get(self,key):
+        """
+        Return the entry for key, with stdoutfile and stderrfile pointing at the
+        cached output, or None.  A hit makes the entry the most recently used.
+        Cached output keeps the compression of the run's output files.
+        """
+        entrydir = self.getEntryDir(key)
+        entrypath = os.path.join(entrydir,ENTRY_NAME)
+        try:
+            with open(entrypath,"r") as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        for field, name in OUTPUT_NAMES.items():
+            entry[field] = os.path.join(entrydir,name + entry.get(name + "suffix",""))
+            if not os.path.exists(entry[field]):
+                logger.warning("Cached %s for %s is missing; dropping the entry" % (name,key))
+                self.invalidate(key)
+                return None
+        try:
+            os.utime(entrypath)
+        except OSError:
+            pass
+        return entry
+
+    def put(self,key,runlog):
+        """
+        Cache a completed run.  Its stdout and stderr are hard linked into the
+        entry if possible, copied if not.  Rotated output is joined into one file.
+        """
+        tmpdir = tempfile.mkdtemp(prefix=".%s." % key[0:8],dir=self.path)
+        try:
+            entry = {
+                "key"       : key,
+                "runid"     : runlog["runid"],
+                "cmd"       : runlog.get("cmd"),
+                "result"    : runlog.get("result"),
+                "created"   : time.time(),
+            }
+            size = 0
+            for field, name in OUTPUT_NAMES.items():
+                source = runlog.get(field)
+                segments = getSegmentPaths(source) if source else []
+                compression = getCompression(source) if len(segments) == 1 else None
+                suffix = COMPRESSION_SUFFIXES[compression] if compression else ""
+                entry[name + "suffix"] = suffix
+                target = os.path.join(tmpdir,name + suffix)
+                if len(segments) == 1:
+                    try:
+                        os.link(source,target)
+                    except OSError:
+                        shutil.copyfile(source,target)
+                else:
+                    with open(target,"wb") as t:
+                        if segments:
+                            with SegmentReader(segments) as f:
+                                shutil.copyfileobj(f,t)
+                size += os.path.getsize(target)
+            entry["size"] = size
+            with open(os.path.join(tmpdir,ENTRY_NAME),"w") as f:
+                json.dump(entry,f,indent=4)
+
+            replaced = self.removeEntry(key)
+            os.rename(tmpdir,self.getEntryDir(key))
+        except BaseException:
+            shutil.rmtree(tmpdir,ignore_errors=True)
+            raise
+        if replaced is None:
+            usage = self.changeUsage(1,size,puts=1)
+        else:
+            usage = self.changeUsage(0,size - replaced,puts=1)
+        if usage["entries"] > self.maxentries or usage["bytes"] > self.maxbytes or usage["puts"] % self.recountputs == 0:
+            self.evict()
+        return entry
+
+    def invalidate(self,key):
+        """
+        Remove the entry for key.  Returns True if there was one.
+        """
+        size = self.removeEntry(key)
+        if size is None:
+            return False
+        self.changeUsage(-1,-size)
+        return True
+
+    def removeEntry(self,key):
+        """
+        Remove the entry directory for key without updating the usage.  Returns
+        the size of its output, or None if there was no entry.
+        """
+        entrydir = self.getEntryDir(key)
+        if not os.path.isdir(entrydir):
+            return None
+        try:
+            with open(os.path.join(entrydir,ENTRY_NAME),"r") as f:
+                size = json.load(f).get("size",0)
+        except (IOError, OSError, ValueError):
+            size = 0
+        shutil.rmtree(entrydir,ignore_errors=True)
+        return size
+
+    def getUsage(self):
+        """
+        Return the entries, bytes, and puts counted in the usage file
+        """
+        return self.changeUsage(0,0)
+
+    def changeUsage(self,entries,size,puts=0,counted=None):
+        """
+        Add to the counts in the usage file.  The counts are taken from counted,
+        a list of entries like getEntries() returns, if it is set, or from a scan
+        of the cache if the file is new or unreadable.  The file is locked so that concurrent puts do
+        not lose updates.  Returns the new usage.
+        """
+        fd = os.open(os.path.join(self.path,USAGE_NAME),os.O_RDWR | os.O_CREAT,0o644)
+        try:
+            fcntl.flock(fd,fcntl.LOCK_EX)
+            data = b""
+            for block in iter(lambda: os.read(fd,65536),b""):
+                data += block
+            try:
+                usage = json.loads(data.decode("utf-8"))
+                usage["entries"] += entries
+                usage["bytes"] += size
+                usage["puts"] += puts
+            except (ValueError, KeyError, TypeError):
+                usage = {"puts" : puts}
+                if counted is None:
+                    counted = self.getEntries()
+            if counted is not None:
+                usage["entries"] = len(counted)
+                usage["bytes"] = sum(entrysize for key, mtime, entrysize in counted)
+            data = json.dumps(usage).encode("utf-8")
+            os.lseek(fd,0,os.SEEK_SET)
+            os.ftruncate(fd,0)
+            os.write(fd,data)
+        finally:
+            os.close(fd)
+        return usage
+
+    def clear(self):
+        """
+        Remove every entry.  Returns the number removed.
+        """
+        keys = [key for key, mtime, size in self.getEntries()]
+        for key in keys:
+            self.invalidate(key)
+        return len(keys)
+
+    def getEntries(self):
+        """
+        Return (key, last used time, size) of every entry, least recently used first
+        """
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            try:
+                mtime = os.path.getmtime(os.path.join(entry.path,ENTRY_NAME))
+                size = sum(os.path.getsize(os.path.join(entry.path,name)) for name in os.listdir(entry.path) if name != ENTRY_NAME)
+            except OSError:
+                continue
+            entries.append((entry.name,mtime,size))
+        entries.sort(key=lambda entry: entry[1])
+        return entries
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache is within its limits,
+        then recount the usage.  Returns the number removed.
+        """
+        entries = self.getEntries()
+        total = sum(size for key, mtime, size in entries)
+        removed = 0
+        for key, mtime, size in entries:
+            if len(entries) - removed <= self.maxentries and total <= self.maxbytes:
+                break
+            self.removeEntry(key)
+            total -= size
+            removed += 1
+        self.changeUsage(0,0,counted=entries[removed:])
+        return removed
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Retention
+
+| Decides which stored runs to delete.  A RetentionPolicy limits the age, number,
+| and total size of the runs that are allowed to be deleted (by default, completed
+| ones); anything beyond a limit is pruned, oldest first.
+
+@date      : 2026-10-18 18:10:37
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import os
+import time
+from datetime import timedelta
+from hex import UserException
+
+# Runs in these states may be pruned unless a policy says otherwise.  A run
+# directory without a readable run log has the status UNKNOWN.
+DEFAULT_PRUNE_STATUSES = ["COMPLETED"]
+UNKNOWN_STATUS = "UNKNOWN"
+
+# Multipliers for size strings like 500M or 2G
+SIZE_UNITS = {"" : 1, "K" : 1024, "M" : 1024 ** 2, "G" : 1024 ** 3, "T" : 1024 ** 4}
+
+
+def parseSize(value):
+    """
+    Convert a size such as 1048576, "512K", "20G" into bytes
+    """
+    if value is None or isinstance(value,int):
+        return value
+    text = str(value).strip().upper().rstrip("B")
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ""
+    try:
+        return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+    except ValueError:
+        raise UserException("Unable to understand size %s" % value)
+
+
+def getTreeSize(path):
+    """
+    Total size in bytes of the files under path
+    """
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath,filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class RetentionPolicy(object):
+    """
+    Which runs to keep.
+
+    maxage is a timedelta or a number of seconds; runs that started longer ago
+    are pruned.  Of the runs that are young enough, only the maxcount most recent
+    are kept, and only as many of those as fit in maxbytes.  Only runs whose status
+    is in statuses are ever pruned; other runs are neither pruned nor counted.
+    """
+    def __init__(self,maxage=None,maxcount=None,maxbytes=None,statuses=None):
+        if isinstance(maxage,(int,float)):
+            maxage = timedelta(seconds=maxage)
+        self.maxage = maxage
+        self.maxcount = maxcount
+        self.maxbytes = parseSize(maxbytes)
+        self.statuses = list(statuses) if statuses else list(DEFAULT_PRUNE_STATUSES)
+        if maxage is None and maxcount is None and maxbytes is None:
+            raise UserException("A retention policy needs a maximum age, count, or size")
+
+    def select(self,runs,now=None):
+        """
+        Return the runs to prune, each with a reason added.  runs are dictionaries
+        with runid, status, starttime (seconds since the epoch) and size.
+        """
+        now = time.time() if now is None else now
+        candidates = sorted([run for run in runs if run["status"] in self.statuses],key=lambda run: run["starttime"],reverse=True)
+        prune = []
+        kept = 0
+        keptbytes = 0
+        full = False
+        for run in candidates:
+            reason = None
+            if self.maxage is not None and now - run["starttime"] > self.maxage.total_seconds():
+                reason = "age"
+            elif self.maxcount is not None and kept >= self.maxcount:
+                reason = "count"
+            elif self.maxbytes is not None and (full or keptbytes + run["size"] > self.maxbytes):
+                # Once the limit is reached, older runs go too even if they are small
+                reason = "size"
+                full = True
+            if reason is None:
+                kept += 1
+                keptbytes += run["size"]
+            else:
+                run = dict(run)
+                run["reason"] = reason
+                prune.append(run)
+        return prune
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+RunIndex
+
+| An SQLite catalog of run logs kept alongside the json documents written by
+| the DefaultRunLogger, so that runs can be found by status, host, time or
+| command without reading every run log.
+|
+| SQLite locking is not reliable on network filesystems, so when the run logs
+| are on NFS, Lustre and the like the index is kept on local disk instead (see
+| getIndexPath).  It then only knows the runs that were saved on this host
+| since it was created, plus the runs that were there when it was created.
+
+@date      : 2026-10-18 13:20:05
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import os
+import hashlib
+import sqlite3
+import tempfile
+import logging
+import threading
+from datetime import datetime
+from hex.runlog.runlog import RESOURCE_FIELDS
+
+DEFAULT_INDEX_NAME = ".runindex.sqlite"
+
+# Filesystem types (from /proc/mounts) on which the index is not kept with the run logs
+NETWORK_FILESYSTEMS = ["nfs","nfs4","lustre","gpfs","cifs","smb3","smbfs","beegfs","ceph","glusterfs","fuse.glusterfs","fuse.sshfs","afs","panfs"]
+
+MOUNTS_PATH = "/proc/mounts"
+
+logger = logging.getLogger("hex")
+
+
+def getFilesystemType(path):
+    """
+    Type of the filesystem path is on, from the longest matching mount point in
+    /proc/mounts, or None if that can't be read
+    """
+    path = os.path.realpath(path)
+    fstype, longest = None, -1
+    try:
+        with open(MOUNTS_PATH,"r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mountpoint = fields[1].replace("\\040"," ")
+                if (path == mountpoint or path.startswith(mountpoint.rstrip("/") + "/")) and len(mountpoint) > longest:
+                    fstype, longest = fields[2], len(mountpoint)
+    except (IOError, OSError):
+        return None
+    return fstype
+
+
+def isNetworkFilesystem(path):
+    return getFilesystemType(path) in NETWORK_FILESYSTEMS
+
+
+def getIndexPath(pathname):
+    """
+    Where to keep the index of the run logs in pathname.  On a local filesystem
+    it is DEFAULT_INDEX_NAME in pathname.  On a network filesystem it is a file,
+    named for pathname, in the first local one of $XDG_CACHE_HOME/hex/runindex
+    and hex-<uid>/runindex in /var/tmp or the temporary directory.  None if there
+    is no local directory to use.
+    """
+    if not isNetworkFilesystem(pathname):
+        return os.path.join(pathname,DEFAULT_INDEX_NAME)
+
+    candidates = []
+    if os.environ.get("XDG_CACHE_HOME"):
+        candidates.append(os.path.join(os.environ["XDG_CACHE_HOME"],"hex","runindex"))
+    for tmpdir in ["/var/tmp",tempfile.gettempdir()]:
+        candidates.append(os.path.join(tmpdir,"hex-%d" % os.getuid(),"runindex"))
+    name = "%s.sqlite" % hashlib.sha256(os.path.realpath(pathname).encode("utf-8")).hexdigest()[0:16]
+    for directory in candidates:
+        parent = os.path.dirname(directory)
+        while not os.path.exists(parent):
+            parent = os.path.dirname(parent)
+        if isNetworkFilesystem(parent):
+            continue
+        try:
+            os.makedirs(directory,mode=0o700,exist_ok=True)
+        except OSError:
+            continue
+        return os.path.join(directory,name)
+    return None
+
+
+class RunIndex(object):
+    """
+    Index of run log fields, keyed by runid.
+
+    The index only holds copies of what is in the run log files, so it can
+    always be rebuilt from them.  That is why writes are not synced to disk,
+    which is only safe because the index is always on a local filesystem (see
+    getIndexPath).
+    """
+
+    # Run log fields copied into the index.  Columns are added to existing
+    # indexes if this list grows.
+    FIELDS = ["status","result","hostname","cmd","starttime","endtime","jobid","system","parentrunid"] + RESOURCE_FIELDS
+
+    # Fields with their own sqlite index
+    INDEXED_FIELDS = ["status","hostname","starttime","cmd","parentrunid"]
+
+    # What resourceReport can group by.  day is the date part of starttime.
+    GROUP_BY = {
+        "hostname"  : "hostname",
+        "status"    : "status",
+        "result"    : "result",
+        "system"    : "system",
+        "cmd"       : "cmd",
+        "day"       : "substr(starttime,1,10)",
+    }
+
+    # Memory is reported as a maximum, everything else as a total
+    MAX_RESOURCE_FIELDS = ["maxrss","peaktreerss"]
+
+    def __init__(self,path,dateFormatString="%Y-%m-%d %H:%M:%S"):
+        self.path = path
+        self.dateFormatString = dateFormatString
+        self.local = threading.local()
+
+    def connect(self):
+        """
+        Return this thread's connection, creating the schema if needed.
+        Connections are not shared across threads or forked processes.
+        """
+        conn = getattr(self.local,"conn",None)
+        if conn is not None and self.local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path,timeout=60)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("CREATE TABLE IF NOT EXISTS runs (runid TEXT PRIMARY KEY)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        columns = [row["name"] for row in conn.execute("PRAGMA table_info(runs)")]
+        for field in self.FIELDS:
+            if field not in columns:
+                try:
+                    conn.execute("ALTER TABLE runs ADD COLUMN %s" % field)
+                except sqlite3.OperationalError as e:
+                    # Another connection added it first
+                    if "duplicate column" not in str(e):
+                        raise
+        for field in self.INDEXED_FIELDS:
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_%s ON runs (%s)" % (field,field))
+        conn.commit()
+        self.local.conn = conn
+        self.local.pid = os.getpid()
+        return conn
+
+    def formatValue(self,value):
+        if isinstance(value,datetime):
+            return value.strftime(self.dateFormatString)
+        return value
+
+    def update(self,runlog):
+        """
+        Add or replace the index entry for a run log
+        """
+        self.updateMany([runlog])
+
+    def updateMany(self,runlogs):
+        """
+        Add or replace index entries for several run logs in one transaction
+        """
+        columns = ["runid"] + self.FIELDS
+        sql = "INSERT OR REPLACE INTO runs (%s) VALUES (%s)" % (",".join(columns),",".join(["?"] * len(columns)))
+        rows = [[self.formatValue(runlog.get(column)) for column in columns] for runlog in runlogs]
+        conn = self.connect()
+        with conn:
+            conn.executemany(sql,rows)
+
+    def remove(self,runids):
+        """
+        Remove index entries
+        """
+        conn = self.connect()
+        with conn:
+            conn.executemany("DELETE FROM runs WHERE runid = ?",[(runid,) for runid in runids])
+
+    def isBuilt(self):
+        """
+        True if setBuilt() has been called, i.e. the index has been filled from the run log files
+        """
+        return self.connect().execute("SELECT value FROM meta WHERE name = 'built'").fetchone() is not None
+
+    def setBuilt(self):
+        conn = self.connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (name,value) VALUES ('built',?)",(datetime.now().strftime(self.dateFormatString),))
+
+    def clear(self):
+        """
+        Remove all index entries
+        """
+        conn = self.connect()
+        with conn:
+            conn.execute("DELETE FROM runs")
+
+    def query(self,status=None,since=None,until=None,hostname=None,cmdprefix=None,limit=None,parentrunid=None):
+        """
+        Return index entries, as dictionaries, that match all of the given criteria,
+        most recently started first.
+
+        status may be a single status or a list.  since and until bound the starttime
+        and may be datetimes or strings in the run log date format.  parentrunid
+        finds the runs that are part of another, e.g. the steps of a workflow.
+        """
+        where, params = self.getWhereClause(status,since,until,hostname,cmdprefix,parentrunid)
+        sql = "SELECT * FROM runs" + where + " ORDER BY starttime DESC"
+        if limit is not None:
+            sql += " LIMIT %d" % int(limit)
+
+        return [dict(row) for row in self.connect().execute(sql,params)]
+
+    def resourceReport(self,groupby="hostname",status=None,since=None,until=None,hostname=None,cmdprefix=None):
+        """
+        Aggregate the resource usage of the matching runs, grouped by one of
+        GROUP_BY.  Each row has the group value, the number of runs, the total
+        of each CPU / IO / context switch field, and the maximum of each memory field.
+        """
+        if groupby not in self.GROUP_BY:
+            raise Exception("Cannot group runs by %s.  Use one of %s" % (groupby,", ".join(sorted(self.GROUP_BY.keys()))))
+        columns = ["%s AS %s" % (self.GROUP_BY[groupby],groupby),"COUNT(*) AS runs"]
+        for field in RESOURCE_FIELDS:
+            function = "MAX" if field in self.MAX_RESOURCE_FIELDS else "SUM"
+            columns.append("%s(%s) AS %s" % (function,field,field))
+        where, params = self.getWhereClause(status,since,until,hostname,cmdprefix)
+        sql = "SELECT %s FROM runs%s GROUP BY 1 ORDER BY 1" % (", ".join(columns),where)
+        return [dict(row) for row in self.connect().execute(sql,params)]
+
+    def getWhereClause(self,status=None,since=None,until=None,hostname=None,cmdprefix=None,parentrunid=None):
+        """
+        Build the WHERE clause and parameters for the query criteria
+        """
+        clauses = []
+        params = []
+        if status is not None:
+            statuses = [status] if isinstance(status,str) else list(status)
+            clauses.append("status IN (%s)" % ",".join(["?"] * len(statuses)))
+            params.extend(statuses)
+        if since is not None:
+            clauses.append("starttime >= ?")
+            params.append(self.formatValue(since))
+        if until is not None:
+            clauses.append("starttime < ?")
+            params.append(self.formatValue(until))
+        if hostname is not None:
+            clauses.append("hostname = ?")
+            params.append(hostname)
+        if cmdprefix is not None:
+            # A range rather than LIKE so that the cmd index can be used
+            clauses.append("cmd >= ? AND cmd < ?")
+            params.extend([cmdprefix,cmdprefix + u"\U0010ffff"])
+        if parentrunid is not None:
+            clauses.append("parentrunid = ?")
+            params.append(parentrunid)
+
+        if not clauses:
+            return "", params
+        return " WHERE " + " AND ".join(clauses), params
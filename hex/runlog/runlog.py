@@ -12,6 +12,11 @@ RunLog - a record of a command line execution
 
 """
 import os
+from hex.runlog.capture import openCapture
+
+# Optional fields describing what a run consumed.  CPU times are in seconds,
+# maxrss and peaktreerss in KB, and the rest are counts.
+RESOURCE_FIELDS = ["usercpu","syscpu","maxrss","peaktreerss","inblock","oublock","nvcsw","nivcsw"]
 
 
 class RunLog(dict):
@@ -27,25 +32,31 @@ class RunLog(dict):
         for k,v in kwargs.items():
             self[k] = v
 
+    def getResourceUsage(self):
+        """
+        Return a dictionary of the resource fields that were recorded for the run
+        """
+        return dict((key,self[key]) for key in RESOURCE_FIELDS if self.get(key) is not None)
+
     def getStdOutHandle(self):
         """
-        Get a file handle for stdout
+        Get a file handle for stdout.  Compressed or rotated output is
+        decompressed and joined transparently.
         """
-        if "stdoutfile" not in self or self["stdoutfile"] == "" or not os.path.exists(self["stdoutfile"]):
+        if "stdoutfile" not in self or self["stdoutfile"] == "":
             return None
 
-        f = open(self["stdoutfile"],"r")
-        return f
+        return openCapture(self["stdoutfile"],"r")
 
     def getStdErrHandle(self):
         """
-        Get a file handle for stderr
+        Get a file handle for stderr.  Compressed or rotated output is
+        decompressed and joined transparently.
         """
-        if "stderrfile" not in self or self["stderrfile"] == "" or not os.path.exists(self["stderrfile"]):
+        if "stderrfile" not in self or self["stderrfile"] == "":
             return None
 
-        f = open(self["stderrfile"],"r")
-        return f
+        return openCapture(self["stderrfile"],"r")
 
     def getScriptHandle(self):
         """
@@ -5,6 +5,11 @@
 SQL RunLogger
 
 | Uses SQLAlchemy to read and write RunLogs to a database
+| Engines (and their connection pools) are created once per database URL and
+| shared by every SQLRunLogger in the process.
+| There is one row per runid; saves update it in place.
+| In write-behind mode, rows are written by a background thread and journaled
+| to a file while the database is unavailable.
 
 @date      : 2017-06-23 16:03:57
 @author    : Meghan Porter-Mahoney (mportermahoney@g.harvard.edu)
@@ -13,68 +18,449 @@ SQL RunLogger
 @license   : GPLv2
 
 """
-
-from hex.runlog.defaultrunlogger import DefaultRunLogger
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, DateTime
-from sqlalchemy.orm import sessionmaker
+import os
+import logging
+import threading
+from datetime import datetime
+from hex.runlog.defaultrunlogger import DefaultRunLogger, REBUILD_THREADS, RUN_PATH_FIELDS
+from hex.profiling import span
+from hex.runlog.writebehind import WriteBehindQueue
+from hex.runlog.runindex import RunIndex
+from hex.runlog.runlog import RunLog, RESOURCE_FIELDS
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import Column, Integer, String, DateTime, Float, Index, func
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import StaticPool
+try:
+    from sqlalchemy.orm import declarative_base
+except ImportError:
+    from sqlalchemy.ext.declarative import declarative_base
 from hex import config
 
+logger = logging.getLogger("hex")
+
+# Connection pool settings, which can be overridden in the DB config section
+DEFAULT_POOL_PARAMS = {
+    'pool_size'     : 5,
+    'max_overflow'  : 10,
+    'pool_recycle'  : 3600,
+    'pool_pre_ping' : True,
+}
+
+# Engines and scoped session factories, keyed by database URL
+ENGINE_CACHE = {}
+ENGINE_CACHE_LOCK = threading.Lock()
+
+# Write-behind queues, keyed by database URL and journal path
+WRITE_BEHIND_QUEUES = {}
+
+# Name of the write-behind journal in the runlog path
+JOURNAL_NAME = '.sqljournal.jsonl'
+
+# A journaled row is not replayed over a row that has already reached one of these
+FINAL_STATUSES = ('COMPLETED', 'LOST', 'CANCELLED')
+
+# Statements that change a column's type, by dialect.  SQLite columns take any type.
+ALTER_COLUMN_TYPE = {
+    'mysql'         : 'ALTER TABLE %s MODIFY %s %s',
+    'postgresql'    : 'ALTER TABLE %s ALTER COLUMN %s TYPE %s',
+}
+
+# Number of runids deleted per statement when runs are pruned
+PRUNE_BATCH_SIZE = 500
+
+
+def getPoolParams(db):
+    """
+    Pool keyword arguments for create_engine.  SQLite has no server to pool connections to,
+    and an in-memory database must be shared by a single connection.
+    """
+    if db.startswith('sqlite'):
+        if ':memory:' in db or db.rstrip('/') == 'sqlite:':
+            return {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+        return {}
+    db_params = config.get_config('DB')
+    params = {}
+    for key, default in DEFAULT_POOL_PARAMS.items():
+        value = db_params.get(key, default)
+        if isinstance(default, bool):
+            value = str(value).lower() in ('1', 'true', 'yes')
+        else:
+            value = int(value)
+        params[key] = value
+    return params
+
+
+def getEngine(db):
+    """
+    Return the cached engine and scoped session factory for a database URL,
+    creating them (and the schema) the first time the URL is used.
+    """
+    with ENGINE_CACHE_LOCK:
+        if db not in ENGINE_CACHE:
+            engine = create_engine(db, **getPoolParams(db))
+            Base.metadata.create_all(engine)
+            upgrade_schema(engine)
+            ENGINE_CACHE[db] = (engine, scoped_session(sessionmaker(bind=engine)))
+        return ENGINE_CACHE[db]
+
+
+def upgrade_schema(engine):
+    """
+    Add any columns and indexes missing from a runlog table created by an older version.
+    Before the unique runid index can be added, the duplicate rows that older
+    versions inserted for each save are removed, keeping the latest.  An integer
+    jobid column, from before Slurm job ids were stored, is changed to a string.
+    """
+    table = SQLRunLog.__table__
+    existingcolumns = inspect(engine).get_columns(table.name)
+    columns = set(column['name'] for column in existingcolumns)
+    for column in existingcolumns:
+        if column['name'] == 'jobid' and isinstance(column['type'], Integer) and engine.dialect.name in ALTER_COLUMN_TYPE:
+            logger.info('Changing the runlog jobid column to a string')
+            with engine.begin() as conn:
+                conn.execute(text(ALTER_COLUMN_TYPE[engine.dialect.name] % (
+                    table.name, 'jobid', table.c.jobid.type.compile(dialect=engine.dialect))))
+    for column in table.columns:
+        if column.name in columns:
+            continue
+        logger.info('Adding column %s to the runlog table' % column.name)
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE %s ADD COLUMN %s %s' % (
+                table.name, column.name, column.type.compile(dialect=engine.dialect))))
+
+    existing = set(index['name'] for index in inspect(engine).get_indexes(table.name))
+    for index in sorted(table.indexes, key=lambda index: not index.unique):
+        if index.name in existing:
+            continue
+        if index.unique:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    'DELETE FROM runlog WHERE runid IS NOT NULL AND id NOT IN '
+                    '(SELECT id FROM (SELECT MAX(id) AS id FROM runlog WHERE runid IS NOT NULL GROUP BY runid) AS latest)'
+                ))
+        logger.info('Adding index %s to the runlog table' % index.name)
+        index.create(engine)
+
+
+def upsert_statement(dialect, row):
+    """
+    Return an insert-or-update statement for the row on dialects that have one,
+    otherwise None
+    """
+    table = SQLRunLog.__table__
+    updates = [column for column in row if column != 'runid']
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(**row)
+        return stmt.on_conflict_do_update(
+            index_elements=['runid'],
+            set_=dict((column, stmt.excluded[column]) for column in updates),
+        )
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(**row)
+        return stmt.on_duplicate_key_update(
+            **dict((column, stmt.inserted[column]) for column in updates)
+        )
+    return None
+
+
+def resetEnginesAfterFork():
+    """
+    A forked child must not use the parent's pooled connections.  Drop them (without
+    closing the parent's sockets) and any session inherited from the forking thread.
+    """
+    for engine, Session in ENGINE_CACHE.values():
+        Session.registry.clear()
+        try:
+            engine.dispose(close=False)
+        except TypeError:
+            engine.dispose()
+    # Rows queued in the parent are written by the parent
+    WRITE_BEHIND_QUEUES.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=resetEnginesAfterFork)
+
+
 class SQLRunLogger(DefaultRunLogger):
 
     """
     Saves RunLogs to sql db in addition to default behavior
+
+    If writebehind is True (or the DB config has writebehind set), saves only
+    queue the row and return; see WriteBehindQueue.
     """
-    def __init__(self, db = 'default'):
-        super(SQLRunLogger, self).__init__()
+    def __init__(self, db = 'default', writebehind = None, **kwargs):
+        super(SQLRunLogger, self).__init__(**kwargs)
         self.set_db(db)
+        if writebehind is None:
+            writebehind = str(config.get_config('DB').get('writebehind', False)).lower() in ('1', 'true', 'yes')
+        self.writebehind = writebehind
+        self.journalpath = os.path.join(self.pathname, JOURNAL_NAME)
 
-def set_db(self, db):
-    db_params = config.get_config('DB')
-    default = 'mysql://{user}:{password}@{server}/{database}'.format(**db_params)
-    if db == 'default':
-        self.db = default
-    elif db == 'test': # use sqlite for testing
-        self.db = 'sqlite:///:memory:'
-    else:
-        self.db = db
+    def set_db(self, db):
+        db_params = {'user': '', 'password': '', 'server': 'localhost', 'database': 'hex'}
+        db_params.update(config.get_config('DB'))
+        default = 'mysql://{user}:{password}@{server}/{database}'.format(**db_params)
+        if db == 'default':
+            self.db = default
+        elif db == 'test': # use sqlite for testing
+            self.db = 'sqlite:///:memory:'
+        else:
+            self.db = db
+
+    @property
+    def engine(self):
+        return getEngine(self.db)[0]
+
+    @property
+    def session(self):
+        """
+        This thread's session.  Sessions hand their connection back to the pool
+        after each commit, so the connection is reused by the next save.
+        """
+        return getEngine(self.db)[1]()
+
+    def to_row(self, runlog):
+        """
+        Convert a runlog into SQLRunLog column values.  DefaultRunLogger.save
+        stores dates as strings, so they are converted back.
+        """
+        row = {}
+        for column in SQLRunLog.__table__.columns.keys():
+            if column == 'id' or column not in runlog:
+                continue
+            value = runlog[column]
+            if column in ('starttime', 'endtime') and isinstance(value, str):
+                value = datetime.strptime(value, self.dateFormatString)
+            row[column] = value
+        return row
 
     def save(self, runlog):
         # save command to file with default
         ret = super(SQLRunLogger, self).save(runlog)
         # log to db
+        if self.writebehind:
+            with span('runlogger.sql.enqueue'):
+                self.write_behind_queue.put(self.to_row(runlog))
+            return ret
         try:
-            self.session = self.create_db()
-            runlog = SQLRunLog(**runlog)
-            self.session.add(runlog)
-            self.session.commit()
+            with span('runlogger.sql.write'):
+                self.write_rows([self.to_row(runlog)])
         except Exception as e:
             print('Error logging to db, default logging to file only: ' + str(e))
         return ret
 
+    def write_rows(self, rows):
+        """
+        Upsert rows in a single transaction
+        """
+        session = self.session
+        try:
+            for row in rows:
+                self.upsert(session, row)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+    def fresh_rows(self, rows):
+        """
+        Drop journaled rows that would overwrite a row that has since been completed,
+        e.g. a RUNNING row journaled by a process that lost its database connection.
+        """
+        runids = [row['runid'] for row in rows]
+        session = self.session
+        try:
+            final = set(runid for runid, in session.query(SQLRunLog.runid)
+                        .filter(SQLRunLog.runid.in_(runids))
+                        .filter(SQLRunLog.status.in_(FINAL_STATUSES)))
+        finally:
+            session.close()
+        return [row for row in rows if row['runid'] not in final or row.get('status') in FINAL_STATUSES]
+
+    @property
+    def write_behind_queue(self):
+        """
+        The write-behind queue shared by loggers with this database and journal
+        """
+        key = (self.db, self.journalpath)
+        with ENGINE_CACHE_LOCK:
+            if key not in WRITE_BEHIND_QUEUES:
+                WRITE_BEHIND_QUEUES[key] = WriteBehindQueue(self.write_rows, self.journalpath, replayfilter=self.fresh_rows)
+            return WRITE_BEHIND_QUEUES[key]
+
+    def flush(self, timeout=None):
+        """
+        Wait for queued rows to be written (or journaled).  Returns False on timeout.
+        """
+        if not self.writebehind:
+            return True
+        return self.write_behind_queue.flush(timeout)
+
+    def replay_journal(self):
+        """
+        Write any journaled rows to the database now.  Returns the number of rows replayed.
+        """
+        return self.write_behind_queue.replayJournal()
+
+    def upsert(self, session, row):
+        """
+        Insert the row, or update the existing row for its runid
+        """
+        stmt = upsert_statement(self.engine.dialect.name, row)
+        if stmt is not None:
+            session.execute(stmt)
+            return
+        existing = session.query(SQLRunLog).filter_by(runid = row['runid']).first()
+        if existing is None:
+            session.add(SQLRunLog(**row))
+        else:
+            for column, value in row.items():
+                setattr(existing, column, value)
+
+    def removeRuns(self, runids):
+        """
+        Remove pruned runs from the database as well as the index
+        """
+        super(SQLRunLogger, self).removeRuns(runids)
+        if not runids:
+            return
+        if self.writebehind:
+            self.flush()
+        session = self.session
+        try:
+            for start in range(0, len(runids), PRUNE_BATCH_SIZE):
+                batch = runids[start:start + PRUNE_BATCH_SIZE]
+                session.query(SQLRunLog).filter(SQLRunLog.runid.in_(batch)).delete(synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.warning('Unable to remove %d pruned runs from the db: %s' % (len(runids), str(e)))
+        finally:
+            session.close()
+
+    def updateRunPaths(self, runlogs):
+        """
+        Record the new paths of migrated runs in the database as well
+        """
+        super(SQLRunLogger, self).updateRunPaths(runlogs)
+        if not runlogs:
+            return
+        if self.writebehind:
+            self.flush()
+        columns = [column for column in RUN_PATH_FIELDS if column in SQLRunLog.__table__.columns.keys()]
+        session = self.session
+        try:
+            for runlog in runlogs:
+                values = dict((column, runlog[column]) for column in columns if column in runlog)
+                if values:
+                    session.query(SQLRunLog).filter_by(runid = runlog['runid']).update(values, synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.warning('Unable to update the paths of %d migrated runs in the db: %s' % (len(runlogs), str(e)))
+        finally:
+            session.close()
+
+    def statusMany(self, runids, threads=REBUILD_THREADS):
+        """
+        Load the run logs of many runs from the database, a batch of runids per
+        query.  Runs that are not in the database are read from their files.
+        Returns {runid : RunLog}.
+        """
+        runids = list(runids)
+        if self.writebehind:
+            self.flush()
+        runlogs = {}
+        session = self.session
+        try:
+            for start in range(0, len(runids), PRUNE_BATCH_SIZE):
+                batch = runids[start:start + PRUNE_BATCH_SIZE]
+                for row in session.query(SQLRunLog).filter(SQLRunLog.runid.in_(batch)):
+                    values = dict((column, getattr(row, column)) for column in SQLRunLog.__table__.columns.keys() if column != 'id')
+                    runlogs[row.runid] = RunLog(**values)
+        except Exception as e:
+            logger.warning('Unable to read runs from the db, reading run log files: %s' % str(e))
+        finally:
+            session.close()
+        missing = [runid for runid in runids if runid not in runlogs]
+        if missing:
+            runlogs.update(super(SQLRunLogger, self).statusMany(missing, threads))
+        return runlogs
+
+    def resourceReport(self, groupby='hostname', status=None, since=None, until=None, hostname=None, cmdprefix=None):
+        """
+        Aggregate resource usage of the matching runs in the database, like
+        DefaultRunLogger.resourceReport but across every host logging to it.
+        """
+        if groupby == 'day':
+            group = func.substr(func.cast(SQLRunLog.starttime, String), 1, 10)
+        elif groupby in RunIndex.GROUP_BY:
+            group = getattr(SQLRunLog, groupby)
+        else:
+            raise Exception('Cannot group runs by %s.  Use one of %s' % (groupby, ', '.join(sorted(RunIndex.GROUP_BY.keys()))))
+        columns = [group.label(groupby), func.count(SQLRunLog.id).label('runs')]
+        for field in RESOURCE_FIELDS:
+            aggregate = func.max if field in RunIndex.MAX_RESOURCE_FIELDS else func.sum
+            columns.append(aggregate(getattr(SQLRunLog, field)).label(field))
+
+        session = self.session
+        try:
+            query = session.query(*columns)
+            if status is not None:
+                query = query.filter(SQLRunLog.status.in_([status] if isinstance(status, str) else list(status)))
+            if since is not None:
+                query = query.filter(SQLRunLog.starttime >= since)
+            if until is not None:
+                query = query.filter(SQLRunLog.starttime < until)
+            if hostname is not None:
+                query = query.filter(SQLRunLog.hostname == hostname)
+            if cmdprefix is not None:
+                query = query.filter(SQLRunLog.cmd.startswith(cmdprefix, autoescape=True))
+            return [dict(row._mapping) for row in query.group_by(group).order_by(group)]
+        finally:
+            session.close()
+
     def create_db(self):
-        # sqllite in memory will not remember rows between runs
-        # TODO: use mysql
-        self.engine = create_engine(self.db)
-        Base.metadata.create_all(self.engine)
-        Session = sessionmaker(bind=self.engine)
-        return Session()
+        """
+        Return a session on the (cached) engine.  Kept for compatibility; the
+        engine and schema are only created the first time.
+        """
+        return self.session
 
     def get_row(self, runid):
         row_dict = {}
         if runid:
-            row = (self.session.query(SQLRunLog)
-                    .filter_by(runid = runid).first())
-            if row:
-                row_dict = row.__dict__
-                # remove non column, sqlalchemy object returns
-                row_dict.pop('_sa_instance_state', None)
+            session = self.session
+            try:
+                row = (session.query(SQLRunLog)
+                        .filter_by(runid = runid).first())
+                if row:
+                    row_dict = dict(row.__dict__)
+                    # remove non column, sqlalchemy object returns
+                    row_dict.pop('_sa_instance_state', None)
+            finally:
+                # end the read transaction and return the connection to the pool
+                session.close()
         return row_dict
 
 Base = declarative_base()
 class SQLRunLog(Base):
     __tablename__ = 'runlog'
+    __table_args__ = (
+        Index('ix_runlog_status', 'status'),
+        Index('ix_runlog_starttime', 'starttime'),
+        Index('ix_runlog_hostname', 'hostname'),
+        # recent failures
+        Index('ix_runlog_result_starttime', 'result', 'starttime'),
+    )
 
     id = Column(Integer, primary_key=True)
     status = Column(String(255))
@@ -83,10 +469,20 @@ class SQLRunLog(Base):
     stderrfile = Column(String(255))
     hostname = Column(String(100))
     system = Column(String(100))
-    jobid = Column(Integer)
+    jobid = Column(String(100))
     scriptfilepath = Column(String(255))
-    runid = Column(String(100))
+    runid = Column(String(100), nullable=False, unique=True, index=True)
+    parentrunid = Column(String(100), index=True)
     starttime = Column(DateTime)
     endtime = Column(DateTime)
     interpreter = Column(String(100))
     stdoutfile = Column(String(255))
+    # resource usage, see hex.runlog.RESOURCE_FIELDS
+    usercpu = Column(Float)
+    syscpu = Column(Float)
+    maxrss = Column(Integer)
+    peaktreerss = Column(Integer)
+    inblock = Column(Integer)
+    oublock = Column(Integer)
+    nvcsw = Column(Integer)
+    nivcsw = Column(Integer)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+WriteBehindQueue
+
+| Takes rows to be written to a slow or unreliable store (e.g. the SQL database)
+| off the caller's path.  Rows are queued in memory and written in batches by a
+| background thread.  When the store is down, or the queue is full, rows are
+| appended to a journal file that is replayed once the store is back.
+
+@date      : 2026-10-18 15:02:36
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import os
+import glob
+import json
+import time
+import fcntl
+import queue
+import atexit
+import logging
+import tempfile
+import threading
+from datetime import datetime
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 500
+
+# Seconds to wait before trying the store again after a failure
+DEFAULT_RETRY_INTERVAL = 30
+
+# Seconds that pending rows are given to be written when the process exits
+EXIT_FLUSH_TIMEOUT = 5
+
+logger = logging.getLogger("hex")
+
+
+def encodeValue(value):
+    if isinstance(value,datetime):
+        return {"__datetime__" : value.strftime("%Y-%m-%d %H:%M:%S.%f")}
+    raise TypeError("%s is not JSON serializable" % repr(value))
+
+
+def decodeValue(obj):
+    if "__datetime__" in obj:
+        return datetime.strptime(obj["__datetime__"],"%Y-%m-%d %H:%M:%S.%f")
+    return obj
+
+
+class WriteBehindQueue(object):
+    """
+    Bounded queue of rows drained by a background thread.
+
+    writer is called with a list of rows and should write them in one transaction,
+    raising if it can't.  replayfilter, if set, is called with journaled rows before
+    they are replayed and returns the ones that should still be written.
+    """
+    def __init__(self,writer,journalpath,maxsize=DEFAULT_QUEUE_SIZE,batchsize=DEFAULT_BATCH_SIZE,retryinterval=DEFAULT_RETRY_INTERVAL,replayfilter=None):
+        self.writer = writer
+        self.journalpath = journalpath
+        self.batchsize = batchsize
+        self.retryinterval = retryinterval
+        self.replayfilter = replayfilter
+        self.queue = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.downuntil = None
+        atexit.register(self.close,EXIT_FLUSH_TIMEOUT)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run,name="hex-write-behind")
+                self.thread.daemon = True
+                self.thread.start()
+
+    def put(self,row):
+        """
+        Queue a row.  Never blocks; if the queue is full the row goes to the journal.
+        """
+        self.start()
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.journal([row])
+
+    def flush(self,timeout=None):
+        """
+        Wait until everything queued so far has been written (or journaled).
+        Returns False if that didn't happen within timeout seconds.
+        """
+        if self.thread is None or not self.thread.is_alive():
+            return self.queue.empty()
+        done = threading.Event()
+        try:
+            self.queue.put(done,timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self,timeout=None):
+        """
+        Flush, then journal anything that still has not been written
+        """
+        if self.flush(timeout):
+            return
+        rows = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item,threading.Event):
+                item.set()
+            else:
+                rows.append(item)
+        self.journal(rows)
+
+    def run(self):
+        while True:
+            try:
+                # Wake up now and then to replay the journal even if nothing new is saved
+                item = self.queue.get(timeout=self.retryinterval if self.hasJournal() else None)
+            except queue.Empty:
+                self.writeBatch([])
+                continue
+
+            rows = []
+            waiters = []
+            while True:
+                if isinstance(item,threading.Event):
+                    waiters.append(item)
+                else:
+                    rows.append(item)
+                if len(rows) >= self.batchsize:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            self.writeBatch(rows)
+            for waiter in waiters:
+                waiter.set()
+
+    def writeBatch(self,rows):
+        """
+        Write the rows, after anything in the journal so that order is kept.
+        Rows are journaled if the store is (or has recently been) down.
+        """
+        if self.downuntil is not None and time.time() < self.downuntil:
+            self.journal(rows)
+            return
+        try:
+            self.replayJournal()
+            if rows:
+                self.writer(rows)
+            self.downuntil = None
+        except Exception as e:
+            logger.warning("Unable to write %d rows, journaling to %s: %s" % (len(rows),self.journalpath,str(e)))
+            self.downuntil = time.time() + self.retryinterval
+            self.journal(rows)
+
+    def hasJournal(self):
+        return os.path.exists(self.journalpath)
+
+    def isJournal(self,fd):
+        """
+        True if fd is still open on the file at journalpath, i.e. it has not been
+        renamed away for a replay
+        """
+        try:
+            return os.fstat(fd).st_ino == os.stat(self.journalpath).st_ino
+        except FileNotFoundError:
+            return False
+
+    def journal(self,rows):
+        """
+        Append rows to the journal file.  The file is locked while it is written,
+        and reopened if a replay renamed it away while waiting for the lock.
+        """
+        if not rows:
+            return
+        while True:
+            with open(self.journalpath,"a") as f:
+                fcntl.flock(f,fcntl.LOCK_EX)
+                try:
+                    if not self.isJournal(f.fileno()):
+                        continue
+                    for row in rows:
+                        f.write(json.dumps(row,default=encodeValue) + "\n")
+                    f.flush()
+                    return
+                finally:
+                    fcntl.flock(f,fcntl.LOCK_UN)
+
+    def readJournal(self,path):
+        rows = []
+        with open(path,"r") as f:
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line,object_hook=decodeValue))
+        return rows
+
+    def recoverAbandonedReplays(self):
+        """
+        Put back rows from replays whose process died part way through
+        """
+        for path in glob.glob(self.journalpath + ".replay.*"):
+            try:
+                pid = int(path[len(self.journalpath + ".replay."):].split(".",1)[0])
+                os.kill(pid,0)
+                continue
+            except ProcessLookupError:
+                pass
+            except (ValueError, PermissionError):
+                continue
+            self.journal(self.readJournal(path))
+            os.remove(path)
+
+    def replayJournal(self):
+        """
+        Write the journaled rows to the store.  Rows that can't be written are
+        put back in the journal and the error is raised.  Returns the number of rows written.
+        """
+        self.recoverAbandonedReplays()
+        try:
+            journalfd = os.open(self.journalpath,os.O_RDONLY)
+        except FileNotFoundError:
+            return 0
+        try:
+            # Rename under the journal's lock so that a journal() call that has the
+            # file open finishes writing first, or reopens it once the lock is free
+            fcntl.flock(journalfd,fcntl.LOCK_EX)
+            if not self.isJournal(journalfd):
+                # Another replay got there first
+                return 0
+            # Unique to this replay, as the background thread and replay_journal()
+            # may both be replaying in the same process
+            fd, replaying = tempfile.mkstemp(prefix="%s.replay.%d." % (os.path.basename(self.journalpath),os.getpid()),dir=os.path.dirname(os.path.abspath(self.journalpath)))
+            os.close(fd)
+            os.rename(self.journalpath,replaying)
+        except FileNotFoundError:
+            # The journal's directory has gone
+            return 0
+        finally:
+            os.close(journalfd)
+
+        rows = self.readJournal(replaying)
+        written = 0
+        try:
+            while written < len(rows):
+                batch = rows[written:written + self.batchsize]
+                if self.replayfilter is not None:
+                    batch = self.replayfilter(batch)
+                if batch:
+                    self.writer(batch)
+                written += min(self.batchsize,len(rows) - written)
+        except Exception:
+            self.journal(rows[written:])
+            raise
+        finally:
+            os.remove(replaying)
+        if written:
+            logger.info("Replayed %d journaled rows from %s" % (written,self.journalpath))
+        return written
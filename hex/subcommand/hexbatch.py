@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+batch subcommand
+
+Runs a list of commands, one per line, from a file or stdin with a bounded
+number running at once.  Prints the runid and result of each command in
+the order they were given.  With --shared-script the commands share one
+script, which each job runs with its index, instead of a script per command.
+If that script does not parse, because one of the commands has a syntax error,
+each command gets its own script as usual.
+
+@date      : 2026-10-18 11:05:51
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import sys
+import logging
+from hex import UserException
+from hex.system import getAvailableSystems,getSystem,waitFor
+from hex.runlog import getRunLogger
+
+logger = logging.getLogger("hex")
+AVAILABLE_SYSTEMS = getAvailableSystems()
+
+
+def getParameterDefs():
+
+    parameterdefs = [
+        {
+            "switches"  : "--system",
+            "help"      : "Script building and execution system.  Available systems: %s" % ", ".join(AVAILABLE_SYSTEMS.keys()),
+            "name"      : "SYSTEM",
+            "default"   : "bash",
+        },
+        {
+            "switches"  : ["-j","--concurrency"],
+            "help"      : "Maximum number of commands to run at once",
+            "name"      : "CONCURRENCY",
+            "type"      : int,
+            "default"   : os.cpu_count() or 1,
+        },
+        {
+            "switches"  : "--shared-script",
+            "help"      : "Write one script for the whole batch instead of one per command.  If a command has a syntax error the batch falls back to a script per command",
+            "name"      : "SHARED_SCRIPT",
+            "action"    : "store_true",
+        },
+        {
+            "switches"  : "CMD_FILE",
+            "help"      : "File of commands, one per line.  Blank lines and lines starting with # are skipped.  Use - for stdin",
+            "nargs"     : "?",
+            "default"   : "-",
+        },
+    ]
+    return parameterdefs
+
+
+def readCommands(cmdfile):
+    """
+    Read commands from the file name, or stdin if it is -
+    """
+    if cmdfile == "-":
+        lines = sys.stdin.readlines()
+    else:
+        try:
+            with open(cmdfile,"r") as f:
+                lines = f.readlines()
+        except IOError as e:
+            raise UserException("Unable to read commands from %s: %s" % (cmdfile,str(e)))
+    return [line.strip() for line in lines if line.strip() != "" and not line.strip().startswith("#")]
+
+
+def hexbatch(args):
+    """
+    Run each command in the batch file
+    """
+    cmds = readCommands(args["CMD_FILE"])
+    runlogger = getRunLogger(runlogger = args["RUNLOGGER"])
+    system = getSystem(args["SYSTEM"], runlogger = runlogger)
+    runids = waitFor(system.map(cmds,concurrency=args["CONCURRENCY"],sharedscript=args["SHARED_SCRIPT"]))
+
+    failed = 0
+    for runid in runids:
+        result = runlogger.get(runid).get("result")
+        if result != "SUCCESS":
+            failed += 1
+        sys.stdout.write("%s\t%s\n" % (runid,result))
+    if failed > 0:
+        logger.error("%d of %d commands failed" % (failed,len(runids)))
+        return 1
+    return 0
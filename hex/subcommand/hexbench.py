@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""
+bench subcommand
+
+Runs the hex benchmarks and writes the results as JSON.  Given the results of
+an earlier run, reports the measurements that have changed.
+
+@date      : 2026-10-18 23:12:40
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import sys
+import json
+import logging
+from hex import UserException
+from hex.bench import runBenchmarks, compareResults, BENCHMARK_ORDER, DEFAULT_COUNT, DEFAULT_SIZES, DEFAULT_THRESHOLD
+
+logger = logging.getLogger("hex")
+
+
+def getParameterDefs():
+
+    parameterdefs = [
+        {
+            "switches"  : "--benchmark",
+            "help"      : "Benchmark to run (%s).  May be repeated.  [default: all]" % ", ".join(BENCHMARK_ORDER),
+            "name"      : "BENCHMARKS",
+            "action"    : "append",
+        },
+        {
+            "switches"  : "--count",
+            "help"      : "Runs timed for each execute and launch measurement, and command line starts",
+            "name"      : "COUNT",
+            "type"      : int,
+            "default"   : DEFAULT_COUNT,
+        },
+        {
+            "switches"  : "--sizes",
+            "help"      : "Comma separated numbers of runs to save for the runlogger measurements, e.g. 1000,10000,100000,1000000",
+            "name"      : "SIZES",
+            "default"   : ",".join(str(size) for size in DEFAULT_SIZES),
+        },
+        {
+            "switches"  : "--workdir",
+            "help"      : "Directory for the temporary runlogs and scripts.  [default: the system temporary directory]",
+            "name"      : "WORKDIR",
+        },
+        {
+            "switches"  : ["-o","--output"],
+            "help"      : "Write the results to this file instead of stdout",
+            "name"      : "OUTPUT",
+        },
+        {
+            "switches"  : "--baseline",
+            "help"      : "Results of an earlier hex bench to compare with",
+            "name"      : "BASELINE",
+        },
+        {
+            "switches"  : "--threshold",
+            "help"      : "Report changes from the baseline larger than this fraction",
+            "name"      : "THRESHOLD",
+            "type"      : float,
+            "default"   : DEFAULT_THRESHOLD,
+        },
+    ]
+    return parameterdefs
+
+
+def hexbench(args):
+    """
+    Run the benchmarks.  The --runlogger option is not used; each benchmark
+    makes runloggers of its own.
+    """
+    try:
+        sizes = [int(size) for size in args["SIZES"].split(",") if size.strip()]
+    except ValueError:
+        raise UserException("--sizes must be a comma separated list of numbers, not %s" % args["SIZES"])
+
+    baseline = None
+    if args["BASELINE"] is not None:
+        try:
+            with open(args["BASELINE"]) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise UserException("Unable to read benchmark results from %s: %s" % (args["BASELINE"],str(e)))
+
+    report = runBenchmarks(args["BENCHMARKS"],count=args["COUNT"],sizes=sizes,workdir=args["WORKDIR"])
+    text = json.dumps(report,indent=4,sort_keys=True)
+    if args["OUTPUT"] is None:
+        sys.stdout.write(text + "\n")
+    else:
+        with open(args["OUTPUT"],"w") as f:
+            f.write(text + "\n")
+
+    if baseline is not None:
+        changes = compareResults(baseline,report,args["THRESHOLD"])
+        sys.stderr.write("Compared with hex %s:\n" % baseline.get("version"))
+        for name, statistic, oldvalue, newvalue, change in changes:
+            sys.stderr.write("%s\t%s\t%.6g\t%.6g\t%+.1f%%\n" % (name,statistic,oldvalue,newvalue,change * 100))
+        if not changes:
+            sys.stderr.write("No changes larger than %.0f%%\n" % (args["THRESHOLD"] * 100))
+    return 0
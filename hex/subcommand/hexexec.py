@@ -13,8 +13,9 @@ Directly runs a command line string without embellishment.
 """
 import argparse
 import logging
-from hex.system import getAvailableSystems,getSystem
-from hex.runlog import getRunLogger
+from hex import UserException
+from hex.system import getAvailableSystems,getSystem,waitFor
+from hex.runlog import getRunLogger, COMPRESSION_SUFFIXES
 
 logger = logging.getLogger("hex")
 AVAILABLE_SYSTEMS = getAvailableSystems()
@@ -29,6 +30,60 @@ def getParameterDefs():
             "name"      : "SYSTEM",
             "default"   : "bash",
         },
+        {
+            "switches"  : "--via-daemon",
+            "help"      : "Run the command on the hex daemon (see hex serve) instead of in this process",
+            "name"      : "VIA_DAEMON",
+            "action"    : "store_true",
+        },
+        {
+            "switches"  : "--socket",
+            "help"      : "Socket of the hex daemon.  Defaults to the hex serve default, ~/.hex/hexd.sock",
+            "name"      : "SOCKET",
+        },
+        {
+            "switches"  : "--compress",
+            "help"      : "Compress the stdout and stderr files.  Available: %s" % ", ".join(sorted(COMPRESSION_SUFFIXES.keys())),
+            "name"      : "COMPRESSION",
+            "choices"   : sorted(COMPRESSION_SUFFIXES.keys()),
+        },
+        {
+            "switches"  : "--max-output-bytes",
+            "help"      : "Keep only the first and last half of this many bytes of stdout and of stderr",
+            "name"      : "MAX_OUTPUT_BYTES",
+            "type"      : int,
+        },
+        {
+            "switches"  : "--rotate-bytes",
+            "help"      : "Rotate the stdout and stderr files every this many bytes",
+            "name"      : "ROTATE_BYTES",
+            "type"      : int,
+        },
+        {
+            "switches"  : "--cache",
+            "help"      : "Reuse the result of an earlier successful run of the same command with unchanged inputs",
+            "name"      : "CACHE",
+            "action"    : "store_true",
+        },
+        {
+            "switches"  : "--recache",
+            "help"      : "Forget any cached result and run the command again, caching the new result",
+            "name"      : "RECACHE",
+            "action"    : "store_true",
+        },
+        {
+            "switches"  : "--input",
+            "help"      : "Input file of the command; a cached result is only reused if it is unchanged.  May be repeated.",
+            "name"      : "INPUTS",
+            "action"    : "append",
+            "default"   : [],
+        },
+        {
+            "switches"  : "--hash-inputs",
+            "help"      : "Compare input files by content rather than by modification time and size",
+            "name"      : "HASH_INPUTS",
+            "action"    : "store_true",
+        },
         {
             "switches"  : "CMD_SPEC",
             "help"      : "Command specification",
@@ -46,10 +101,27 @@ def hexexec(args):
     """
     Direct execution of the command with no argument processing
     """
+    cmd     = " ".join([args["CMD_SPEC"]] + args["CMD_ARGS"])
+    if args["VIA_DAEMON"]:
+        # Only needed here, so that plain hex exec does not load the daemon
+        from hex.system.daemon import HexClient, DEFAULT_SOCKET_PATH
+        client = HexClient(args["SOCKET"] or DEFAULT_SOCKET_PATH)
+        if args["RECACHE"]:
+            raise UserException("--recache can't be used with --via-daemon")
+        runid, result = client.execute(cmd,system=args["SYSTEM"],cache=args["CACHE"],inputs=args["INPUTS"],hashinputs=args["HASH_INPUTS"])
+        return 0 if result == "SUCCESS" else 1
 
     # Create the system
     systemkey = args["SYSTEM"]
     runlogger = getRunLogger(runlogger = args["RUNLOGGER"])
-    system = getSystem(systemkey, runlogger = runlogger)
-    cmd     = " ".join([args["CMD_SPEC"]] + args["CMD_ARGS"])
-    system.execute(cmd)
+    system = getSystem(
+        systemkey,
+        runlogger = runlogger,
+        compression = args["COMPRESSION"],
+        maxoutputbytes = args["MAX_OUTPUT_BYTES"],
+        rotatebytes = args["ROTATE_BYTES"],
+    )
+    cache   = args["CACHE"] or args["RECACHE"]
+    if args["RECACHE"]:
+        system.invalidateCache(cmd,inputs=args["INPUTS"],hashinputs=args["HASH_INPUTS"])
+    waitFor(system.execute(cmd,cache=cache,inputs=args["INPUTS"],hashinputs=args["HASH_INPUTS"]))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+gc subcommand
+
+Deletes stored runs that are older, more numerous, or larger than a retention
+policy allows, along with old temporary scripts.
+
+@date      : 2026-10-18 18:31:52
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import sys
+import logging
+from hex import UserException
+from hex.runlog import getRunLogger, RetentionPolicy, DEFAULT_PRUNE_STATUSES
+from hex.system.bashsystem import pruneScripts
+
+logger = logging.getLogger("hex")
+
+SECONDS_PER_DAY = 86400
+
+
+def getParameterDefs():
+
+    parameterdefs = [
+        {
+            "switches"  : "--max-age",
+            "help"      : "Delete runs that started more than this many days ago",
+            "name"      : "MAX_AGE",
+            "type"      : float,
+        },
+        {
+            "switches"  : "--max-count",
+            "help"      : "Keep at most this many of the most recent runs",
+            "name"      : "MAX_COUNT",
+            "type"      : int,
+        },
+        {
+            "switches"  : "--max-size",
+            "help"      : "Keep only as many of the most recent runs as fit in this size, e.g. 500M or 20G",
+            "name"      : "MAX_SIZE",
+        },
+        {
+            "switches"  : "--status",
+            "help"      : "Status of runs that may be deleted.  May be repeated.  [default: %s]" % ", ".join(DEFAULT_PRUNE_STATUSES),
+            "name"      : "STATUSES",
+            "action"    : "append",
+        },
+        {
+            "switches"  : "--dry-run",
+            "help"      : "List what would be deleted without deleting it",
+            "name"      : "DRY_RUN",
+            "action"    : "store_true",
+        },
+    ]
+    return parameterdefs
+
+
+def hexgc(args):
+    """
+    Prune runs and temporary scripts
+    """
+    if args["MAX_AGE"] is None and args["MAX_COUNT"] is None and args["MAX_SIZE"] is None:
+        raise UserException("Specify at least one of --max-age, --max-count, or --max-size")
+    maxage = None if args["MAX_AGE"] is None else args["MAX_AGE"] * SECONDS_PER_DAY
+    policy = RetentionPolicy(maxage=maxage,maxcount=args["MAX_COUNT"],maxbytes=args["MAX_SIZE"],statuses=args["STATUSES"])
+
+    runlogger = getRunLogger(runlogger = args["RUNLOGGER"])
+    pruned = runlogger.prune(policy,dryrun=args["DRY_RUN"])
+    scripts = pruneScripts(maxage,dryrun=args["DRY_RUN"]) if maxage is not None else []
+
+    verb = "Would delete" if args["DRY_RUN"] else "Deleted"
+    if args["DRY_RUN"]:
+        for run in pruned:
+            sys.stdout.write("%s\t%s\t%d\n" % (run["runid"],run["reason"],run["size"]))
+    sys.stdout.write("%s %d runs (%d bytes) and %d temporary scripts\n" % (verb,len(pruned),sum(run["size"] for run in pruned),len(scripts)))
+    return 0
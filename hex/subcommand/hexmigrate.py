@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+migrate subcommand
+
+Moves the run directories of a runlog path into a different layout, e.g.
+from one flat directory into hash shards, and records the new layout.  The
+paths stored in run logs, and in the database with --runlogger sql, are
+updated to match.
+
+@date      : 2026-10-18 13:58:30
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import sys
+import logging
+from hex.runlog import getRunLogger, DEFAULT_RUNLOG_PATH, RUNLOG_LAYOUTS
+
+logger = logging.getLogger("hex")
+
+
+def getParameterDefs():
+
+    parameterdefs = [
+        {
+            "switches"  : "--layout",
+            "help"      : "Layout to move runs into.  Available layouts: %s" % ", ".join(RUNLOG_LAYOUTS),
+            "name"      : "LAYOUT",
+            "choices"   : RUNLOG_LAYOUTS,
+            "required"  : True,
+        },
+        {
+            "switches"  : "--from",
+            "help"      : "Layout the runs are in now.  [default: the layout recorded in the runlog path]",
+            "name"      : "FROM_LAYOUT",
+            "choices"   : RUNLOG_LAYOUTS,
+        },
+        {
+            "switches"  : "--path",
+            "help"      : "Runlog path to migrate",
+            "name"      : "RUNLOG_PATH",
+            "default"   : DEFAULT_RUNLOG_PATH,
+        },
+    ]
+    return parameterdefs
+
+
+def hexmigrate(args):
+    """
+    Migrate the runlog path to the new layout.  New runs will use it too.
+    """
+    runlogger = getRunLogger(runlogger = args["RUNLOGGER"],pathname=args["RUNLOG_PATH"])
+    fromlayout = args["FROM_LAYOUT"] or runlogger.layout
+    runlogger.setLayout(args["LAYOUT"])
+    moved = runlogger.migrateLayout(fromlayout=fromlayout)
+    sys.stdout.write("Moved %d runs in %s to the %s layout\n" % (moved,args["RUNLOG_PATH"],args["LAYOUT"]))
+    return 0
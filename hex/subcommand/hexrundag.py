@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""
+run-dag subcommand
+
+Runs a workflow of commands with dependencies, described in a JSON file (see
+hex.system.dag), with independent commands running at once.  Prints the state
+and runid of each node in dependency order, then the runid of the workflow.
+Nodes that have not changed since they last succeeded are reused rather than
+run again, and shown as REUSED with the runid of that run.
+
+@date      : 2026-10-19 00:12:37
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import sys
+import logging
+from hex.system import getAvailableSystems,getSystem
+from hex.system.dag import Dag, DagRunner, DONE_STATES
+from hex.runlog import getRunLogger
+
+logger = logging.getLogger("hex")
+AVAILABLE_SYSTEMS = getAvailableSystems()
+
+
+def getParameterDefs():
+
+    parameterdefs = [
+        {
+            "switches"  : "--system",
+            "help"      : "Script building and execution system.  Available systems: %s" % ", ".join(AVAILABLE_SYSTEMS.keys()),
+            "name"      : "SYSTEM",
+            "default"   : "bash",
+        },
+        {
+            "switches"  : ["-j","--max-jobs"],
+            "help"      : "Maximum number of nodes to run at once.  [default: the workflow's maxjobs, or the number of CPUs]",
+            "name"      : "MAX_JOBS",
+            "type"      : int,
+        },
+        {
+            "switches"  : "--rerun-all",
+            "help"      : "Run every node, even those that could be reused from an earlier run of the workflow.  The new runs replace the earlier ones as the runs to reuse",
+            "name"      : "RERUN_ALL",
+            "action"    : "store_true",
+        },
+        {
+            "switches"  : "--hash-inputs",
+            "help"      : "Decide whether input files have changed by their contents rather than their modification times and sizes",
+            "name"      : "HASH_INPUTS",
+            "action"    : "store_true",
+        },
+        {
+            "switches"  : "--monitor",
+            "help"      : "Print the output of each node to the console",
+            "name"      : "MONITOR",
+            "action"    : "store_true",
+        },
+        {
+            "switches"  : "DAG_FILE",
+            "help"      : "JSON workflow description",
+        },
+    ]
+    return parameterdefs
+
+
+def hexrundag(args):
+    """
+    Run the workflow
+    """
+    dag = Dag.load(args["DAG_FILE"])
+    runlogger = getRunLogger(runlogger = args["RUNLOGGER"])
+    system = getSystem(args["SYSTEM"], runlogger = runlogger)
+    runner = DagRunner(system,args["MAX_JOBS"],reuse=not args["RERUN_ALL"],hashinputs=args["HASH_INPUTS"])
+    result = runner.run(dag,monitor=args["MONITOR"])
+
+    for name in dag.getOrder():
+        node = result.nodes[name]
+        sys.stdout.write("%s\n" % "\t".join([name,node["state"] or "",node.get("runid") or "",node.get("reason") or ""]))
+    sys.stdout.write("%s\t%s\n" % (result.runid,"SUCCESS" if result.succeeded else "FAIL"))
+    if not result.succeeded:
+        failed = [name for name in dag.order if result.nodes[name]["state"] not in DONE_STATES]
+        logger.error("%d of %d workflow nodes did not succeed" % (len(failed),len(dag.order)))
+        return 1
+    return 0
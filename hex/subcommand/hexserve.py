@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+serve subcommand
+
+Runs the hex daemon in the foreground until it is interrupted or terminated.
+Clients use it with hex submit or hex exec --via-daemon.
+
+@date      : 2026-10-18 19:40:03
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import signal
+import logging
+from hex import UserException
+from hex.runlog import getRunLogger
+from hex.system.daemon import HexServer, DEFAULT_SOCKET_PATH, DEFAULT_MAX_JOBS
+
+logger = logging.getLogger("hex")
+
+
+def getParameterDefs():
+
+    parameterdefs = [
+        {
+            "switches"  : "--socket",
+            "help"      : "Unix domain socket to listen on",
+            "name"      : "SOCKET",
+            "default"   : DEFAULT_SOCKET_PATH,
+        },
+        {
+            "switches"  : ["-j","--max-jobs"],
+            "help"      : "Maximum number of commands to run at once",
+            "name"      : "MAX_JOBS",
+            "type"      : int,
+            "default"   : DEFAULT_MAX_JOBS,
+        },
+        {
+            "switches"  : "--cpus",
+            "help"      : "CPUs shared by running commands [default: all of this host's]",
+            "name"      : "CPUS",
+            "type"      : int,
+        },
+        {
+            "switches"  : "--memory",
+            "help"      : "Memory shared by running commands, e.g. 64G [default: all of this host's]",
+            "name"      : "MEMORY",
+        },
+        {
+            "switches"  : "--user-cap",
+            "help"      : "USER=N: run at most N commands of USER at once, where USER is the name given with hex submit --user (by default the client's login name).  May be repeated.",
+            "name"      : "USER_CAPS",
+            "action"    : "append",
+        },
+        {
+            "switches"  : "--tag-cap",
+            "help"      : "TAG=N: run at most N commands tagged TAG at once.  May be repeated.",
+            "name"      : "TAG_CAPS",
+            "action"    : "append",
+        },
+    ]
+    return parameterdefs
+
+
+def parseCaps(values):
+    """
+    Turn a list of NAME=N strings into a dictionary
+    """
+    caps = {}
+    for value in values or []:
+        name, sep, count = value.rpartition("=")
+        if not sep or not name or not count.isdigit():
+            raise UserException("Concurrency cap %s should look like NAME=N" % value)
+        caps[name] = int(count)
+    return caps
+
+
+def hexserve(args):
+    """
+    Serve until SIGINT or SIGTERM.  Running commands are allowed to finish.
+    """
+    runlogger = getRunLogger(runlogger = args["RUNLOGGER"])
+    schedulerkwargs = {
+        "cpus"      : args["CPUS"],
+        "memory"    : args["MEMORY"],
+        "usercaps"  : parseCaps(args["USER_CAPS"]),
+        "tagcaps"   : parseCaps(args["TAG_CAPS"]),
+    }
+    server = HexServer(args["SOCKET"],runlogger=runlogger,maxjobs=args["MAX_JOBS"],schedulerkwargs=schedulerkwargs)
+    signal.signal(signal.SIGTERM,signal.default_int_handler)
+    logger.info("hex daemon listening on %s" % args["SOCKET"])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        runlogger.flush()
+    return 0
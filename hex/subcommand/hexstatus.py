@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""
+status subcommand
+
+Shows the status of many runs at once: the runs given, or the unfinished
+runs in the index.  Run logs are loaded together rather than one at a time,
+and runs whose process has died are marked LOST.
+
+@date      : 2026-10-18 22:10:36
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import sys
+import logging
+from hex.runlog import getRunLogger
+from hex.system.liveness import reconcileRuns, ACTIVE_STATUSES
+
+logger = logging.getLogger("hex")
+
+
+def getParameterDefs():
+
+    parameterdefs = [
+        {
+            "switches"  : "--status",
+            "help"      : "Show runs with this status when no runids are given.  May be repeated.  [default: %s]" % ", ".join(ACTIVE_STATUSES),
+            "name"      : "STATUSES",
+            "action"    : "append",
+        },
+        {
+            "switches"  : "--parent",
+            "help"      : "Show the runs that are part of this run, e.g. the steps of a workflow, whatever their status unless --status is given",
+            "name"      : "PARENT",
+        },
+        {
+            "switches"  : "--limit",
+            "help"      : "Show at most this many runs when no runids are given",
+            "name"      : "LIMIT",
+            "type"      : int,
+        },
+        {
+            "switches"  : "--no-check",
+            "help"      : "Report the run logs as they are, without checking that running runs are alive",
+            "name"      : "NO_CHECK",
+            "action"    : "store_true",
+        },
+        {
+            "switches"  : "RUNIDS",
+            "help"      : "Run ids to show",
+            "nargs"     : "*",
+        },
+    ]
+    return parameterdefs
+
+
+def hexstatus(args):
+    """
+    Print runid, status, result, hostname, jobid, start time and command of each run
+    """
+    runlogger = getRunLogger(runlogger = args["RUNLOGGER"])
+    runids = args["RUNIDS"]
+    if not runids:
+        statuses = args["STATUSES"] or (None if args["PARENT"] else ACTIVE_STATUSES)
+        runids = [run["runid"] for run in runlogger.query(status=statuses,limit=args["LIMIT"],parentrunid=args["PARENT"])]
+
+    found = runlogger.statusMany(runids)
+    for runid in runids:
+        if runid not in found:
+            logger.error("Unable to load run %s" % runid)
+    runlogs = [found[runid] for runid in runids if runid in found]
+    if not args["NO_CHECK"]:
+        runlogs = reconcileRuns(runlogger,runlogs)
+
+    for runlog in runlogs:
+        cmd = (runlog.get("cmd") or "").split("\n")[0]
+        sys.stdout.write("%s\n" % "\t".join(str(value) for value in [
+            runlog["runid"],
+            runlog.get("status"),
+            runlog.get("result") or "",
+            runlog.get("hostname"),
+            runlog.get("jobid"),
+            runlog.get("starttime"),
+            cmd,
+        ]))
+    return 0 if len(runlogs) == len(runids) else 1
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+submit subcommand
+
+Starts a command on the hex daemon and prints its runid without waiting for
+it to finish.  The command is queued by the daemon's scheduler until there
+is room for the cpus and memory it declares.  --user names the workload the
+command is scheduled under for the daemon's per-user caps and fair share.
+
+@date      : 2026-10-18 19:41:17
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import sys
+import argparse
+import logging
+from hex.runlog.retention import parseSize
+from hex.system.daemon import HexClient, DEFAULT_SOCKET_PATH
+
+logger = logging.getLogger("hex")
+
+
+def getParameterDefs():
+
+    parameterdefs = [
+        {
+            "switches"  : "--socket",
+            "help"      : "Socket of the hex daemon",
+            "name"      : "SOCKET",
+            "default"   : DEFAULT_SOCKET_PATH,
+        },
+        {
+            "switches"  : "--system",
+            "help"      : "Script building and execution system",
+            "name"      : "SYSTEM",
+            "default"   : "bash",
+        },
+        {
+            "switches"  : "--priority",
+            "help"      : "Scheduling priority.  Higher priorities run first.",
+            "name"      : "PRIORITY",
+            "type"      : int,
+            "default"   : 0,
+        },
+        {
+            "switches"  : "--user",
+            "help"      : "Name the command is scheduled under for the daemon's --user-cap limits and fair share.  [default: your login name]",
+            "name"      : "USER",
+        },
+        {
+            "switches"  : "--tag",
+            "help"      : "Tag used for the daemon's per-tag concurrency caps.  May be repeated.",
+            "name"      : "TAGS",
+            "action"    : "append",
+        },
+        {
+            "switches"  : "--cpus",
+            "help"      : "Number of CPUs the command needs",
+            "name"      : "CPUS",
+            "type"      : int,
+            "default"   : 1,
+        },
+        {
+            "switches"  : "--mem",
+            "help"      : "Memory the command needs, e.g. 512M or 4G",
+            "name"      : "MEMORY",
+            "default"   : "0",
+        },
+        {
+            "switches"  : "CMD_SPEC",
+            "help"      : "Command specification",
+        },
+        {
+            "switches"  : "CMD_ARGS",
+            "help"      : "Command arguments",
+            "nargs"     : argparse.REMAINDER,
+        }
+    ]
+    return parameterdefs
+
+
+def hexsubmit(args):
+    """
+    Submit the command and print the runid
+    """
+    cmd = " ".join([args["CMD_SPEC"]] + args["CMD_ARGS"])
+    runid, result = HexClient(args["SOCKET"]).execute(
+        cmd,
+        wait=False,
+        monitor=False,
+        system=args["SYSTEM"],
+        priority=args["PRIORITY"],
+        tags=args["TAGS"],
+        cpus=args["CPUS"],
+        memory=parseSize(args["MEMORY"]),
+        user=args["USER"],
+    )
+    sys.stdout.write("%s\n" % runid)
+    return 0
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+tail subcommand
+
+Streams the stdout and stderr of a run to the console, following the
+files until the run is no longer RUNNING.  Segments that have already been
+rotated out are printed first, and the follower moves on to the new file
+when the output is rotated while it is being followed.  Compressed output
+can't be followed, so it is printed once the run has finished.
+
+@date      : 2026-10-18 10:02:15
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import time
+import logging
+from hex import UserException
+from hex.runlog import getRunLogger, getCompression, getSegmentPaths, openCapture, openCompressed
+from hex.system.streams import FileFollower, consoleSinks, MAX_FOLLOW_WAIT, DEFAULT_CHUNK_SIZE
+from hex.system.liveness import findLostRuns, ACTIVE_STATUSES
+
+logger = logging.getLogger("hex")
+
+
+def getParameterDefs():
+
+    parameterdefs = [
+        {
+            "switches"  : "--nofollow",
+            "help"      : "Print the current output and exit instead of following it",
+            "name"      : "NOFOLLOW",
+            "action"    : "store_true",
+        },
+        {
+            "switches"  : "RUNID",
+            "help"      : "Run id of the run to follow",
+        },
+    ]
+    return parameterdefs
+
+
+def isRunning(runlogger,runid):
+    """
+    True if the run log says the run is still going and, when it ran on this host,
+    its process still exists.
+    """
+    runlog = runlogger.get(runid)
+    if runlog.get("status") not in ACTIVE_STATUSES:
+        return False
+    return not findLostRuns([runlog])
+
+
+def hextail(args):
+    """
+    Follow the output of a run
+    """
+    runid = args["RUNID"]
+    runlogger = getRunLogger(runlogger = args["RUNLOGGER"])
+    try:
+        runlog = runlogger.get(runid)
+    except Exception as e:
+        raise UserException("Unable to load run %s: %s" % (runid,str(e)))
+
+    outsink, errsink = consoleSinks()
+    follower = FileFollower()
+    compressed = []
+    rotated = []
+    for key, sink in [("stdoutfile",outsink),("stderrfile",errsink)]:
+        if not runlog.get(key):
+            continue
+        if getCompression(runlog[key]) is not None:
+            compressed.append((runlog[key],sink))
+        elif os.path.exists(runlog[key]):
+            # Open the earlier segments before the current file, so that a rotation
+            # in between can't make a segment be printed twice
+            segments = []
+            for path in getSegmentPaths(runlog[key])[:-1]:
+                try:
+                    segments.append(openCompressed(path,"rb"))
+                except FileNotFoundError:
+                    pass
+            follower.add(runlog[key],sink,segments=getSegmentPaths)
+            rotated.append((segments,sink))
+
+    # Re-reading the run log on every write would be expensive, so only check it
+    # about as often as the follower would wake up on its own
+    state = {"checked" : 0, "running" : True}
+
+    def done():
+        if args.get("NOFOLLOW"):
+            return True
+        now = time.time()
+        if now - state["checked"] >= MAX_FOLLOW_WAIT:
+            state["checked"] = now
+            state["running"] = isRunning(runlogger,runid)
+        return not state["running"]
+
+    try:
+        for segments, sink in rotated:
+            for f in segments:
+                with f:
+                    for data in iter(lambda: f.read(DEFAULT_CHUNK_SIZE),b""):
+                        sink.write(data)
+        follower.follow(done)
+        for path, sink in compressed:
+            f = openCapture(path,"rb")
+            if f is None:
+                continue
+            with f:
+                for data in iter(lambda: f.read(DEFAULT_CHUNK_SIZE),b""):
+                    sink.write(data)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        follower.close()
+        outsink.close()
+        errsink.close()
+    return 0
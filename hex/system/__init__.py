@@ -1,17 +1,37 @@
 from .bashsystem import *
 from hex import UserException,getClassFromName
+import importlib
 
+# Names from modules that are only imported when first used, so that running
+# a command with the BashSystem does not load asyncio or the scheduler
+LAZY_IMPORTS = {
+    "AsyncBashSystem"   : "asyncbashsystem",
+    "WAIT_POLL_MAX"     : "asyncbashsystem",
+    "Scheduler"         : "scheduler",
+    "Dag"               : "dag",
+    "DagRunner"         : "dag",
+    "runDag"            : "dag",
+}
 
-def getSystem(systemkey="bash", runlogger = None):
+
+def __getattr__(name):
+    if name in LAZY_IMPORTS:
+        module = importlib.import_module("%s.%s" % (__name__,LAZY_IMPORTS[name]))
+        return getattr(module,name)
+    raise AttributeError("module %s has no attribute %s" % (__name__,name))
+
+
+def getSystem(systemkey="bash", runlogger = None, **kwargs):
     """
-    Return the system by key.  If no key is given, bash is returned
+    Return the system by key.  If no key is given, bash is returned.
+    Other keyword arguments are passed to the system's constructor.
     """
     availablesystems = getAvailableSystems()
     if systemkey not in availablesystems.keys():
         raise UserException("System %s is not available.  Available systems include %s" % (systemkey,availablesystems.keys()))
     classname = availablesystems[systemkey]
     systemcls = getClassFromName(classname)
-    return systemcls(runlogger = runlogger)
+    return systemcls(runlogger = runlogger, **kwargs)
 
 
 def getAvailableSystems():
@@ -21,4 +41,17 @@ def getAvailableSystems():
 
     return {
         "bash" : "hex.system.bashsystem.BashSystem",
+        "asyncbash" : "hex.system.asyncbashsystem.AsyncBashSystem",
+        "slurm" : "hex.system.slurmsystem.SlurmSystem",
     }
+
+
+def waitFor(result):
+    """
+    Systems like AsyncBashSystem return coroutines.  This runs one to
+    completion and returns its value; anything else is returned as is.
+    """
+    if hasattr(result,"__await__"):
+        import asyncio
+        return asyncio.run(result)
+    return result
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+asyncio version of the bash system.  Scripts are composed and logged just as
+they are by BashSystem, but are run with asyncio subprocesses so that many jobs
+can be supervised from a single event loop.
+
+@date      : 2026-10-18 11:40:27
+@author    : Harvard FAS Informatics
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+
+import os
+import asyncio
+import logging
+from asyncio.subprocess import PIPE, DEVNULL
+from hex import UserException
+from hex.events import OUTPUT_EVENT, EventSink
+from hex.profiling import span
+from hex.runlog.capture import CaptureWriter
+from hex.system.bashsystem import BashSystem
+from hex.system.streams import DEFAULT_CHUNK_SIZE, consoleSinks
+
+logger = logging.getLogger("hex")
+
+# How often wait() re-reads the run log of a run that was not launched by this system
+WAIT_POLL_MAX = 5.0
+
+
+class AsyncBashSystem(BashSystem):
+    """
+    Bash interpreter system with coroutine execute(), launch(), and wait() methods.
+
+    Output is read with asyncio stream readers and copied to the stdout / stderr
+    files (and the console if monitor is set), so no threads are needed.
+    Runlogger calls are made in the loop's default executor so that a slow
+    runlogger does not stall other jobs.
+
+    asyncio reaps its own child processes, so rusage is not recorded for these runs.
+    """
+    def __init__(self,interpreter="/bin/bash",scriptsuffix=".sh",runlogger=None,**kwargs):
+        super(AsyncBashSystem,self).__init__(interpreter=interpreter,scriptsuffix=scriptsuffix,runlogger=runlogger,**kwargs)
+        self.tasks = {}
+
+    async def callRunLogger(self,method,*args):
+        """
+        Run a (blocking) runlogger method in the default executor
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None,method,*args)
+
+    async def copyStream(self,reader,filename,sink):
+        """
+        Copy an asyncio stream to a file and / or a sink until EOF.  The file is
+        written through a CaptureWriter if output is being captured.
+        """
+        f = None
+        if filename is not None:
+            f = (CaptureWriter(filename,self.maxoutputbytes,self.rotatebytes,self.rotatecount) if self.isCapturing() else None) or open(filename,'wb')
+        try:
+            while True:
+                data = await reader.read(DEFAULT_CHUNK_SIZE)
+                if not data:
+                    break
+                if f is not None:
+                    f.write(data)
+                    # Plain files are flushed so that they can be tailed
+                    if hasattr(f,"flush"):
+                        f.flush()
+                if sink is not None:
+                    sink.write(data)
+        finally:
+            if f is not None:
+                f.close()
+
+    async def executeScript(self,scriptfilepath,runid=None,stdoutfile=None,stderrfile=None,cmd=None,monitor=True,onstart=None,cwd=None,env=None,sinks=None,parentrunid=None,
+                            scriptargs=None):
+        """
+        Runs the script file, waits for it to complete, and logs it with the run logger.
+        Returns the runid assigned by the RunLogger.
+
+        If onstart is set, it is called with the runid once the RUNNING run log has been saved.
+        cwd, env, sinks, parentrunid and scriptargs are as for BashSystem.executeScript.
+        """
+        stdoutfile, stderrfile = self.getOutputFiles(runid,stdoutfile,stderrfile)
+        outsink, errsink = (sinks or consoleSinks()) if monitor else (None, None)
+        wantoutput = self.events.wants(OUTPUT_EVENT)
+
+        with span("asyncbash.spawn",runid=runid):
+            proc = await asyncio.create_subprocess_exec(
+                self.interpreter,scriptfilepath,*list(scriptargs or []),
+                stdout=PIPE if stdoutfile is not None or monitor or wantoutput else DEVNULL,
+                stderr=PIPE if stderrfile is not None or monitor or wantoutput else DEVNULL,
+                cwd=cwd,
+                env=env,
+            )
+        try:
+            runlog = self.createRunLog(scriptfilepath,proc.pid,runid,stdoutfile,stderrfile,cmd,parentrunid=parentrunid,scriptargs=scriptargs)
+            runid = await self.callRunLogger(self.runlogger.save,runlog)
+            if onstart is not None:
+                onstart(runid)
+
+            copiers = []
+            for reader, filename, sink, stream in [(proc.stdout,stdoutfile,outsink,"stdout"),(proc.stderr,stderrfile,errsink,"stderr")]:
+                if self.events.wants(OUTPUT_EVENT):
+                    sink = EventSink(self.events,runid,stream,sink)
+                if reader is not None:
+                    copiers.append(self.copyStream(reader,filename,sink))
+            with span("asyncbash.output",runid=runid):
+                await asyncio.gather(*copiers)
+            with span("asyncbash.wait",runid=runid):
+                returncode = await proc.wait()
+        except BaseException:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
+        finally:
+            for sink in [outsink,errsink]:
+                if sink is not None:
+                    sink.close()
+
+        return await self.callRunLogger(self.completeRunLog,runid,returncode)
+
+    async def execute(self,cmds,stdoutfile=None,stderrfile=None,runid=None,monitor=True,onstart=None,cache=False,inputs=None,hashinputs=False,cwd=None,env=None,sinks=None,
+                      parentrunid=None):
+        """
+        Execute a command and wait for it to finish.
+
+        cmd may be either a string or a list.  A list is
+        treated as several commands.
+
+        cache, inputs, hashinputs, cwd, env, sinks and parentrunid are as for BashSystem.execute.
+        As there, a cache hit returns the cached run's runid rather than runid.
+        """
+        if isinstance(cmds,str):
+            cmds = [cmds]
+        cmdstr = "\n".join(cmds)
+
+        cachekey = None
+        if cache:
+            cachekey = await self.callRunLogger(self.getCacheKey,cmds,inputs,hashinputs)
+            entry = await self.callRunLogger(self.getResultCache().get,cachekey)
+            if entry is not None:
+                return await self.callRunLogger(self.replayCachedResult,entry,stdoutfile,stderrfile,monitor,sinks)
+
+        if runid is None:
+            runid = await self.callRunLogger(self.runlogger.newRunId,cmdstr)
+
+        scriptfilepath = self.makeScriptFile(self.compose(content=cmdstr),runid=runid)
+        runid = await self.executeScript(
+            scriptfilepath,
+            runid=runid,
+            stdoutfile=stdoutfile,
+            stderrfile=stderrfile,
+            cmd=cmdstr,
+            monitor=monitor,
+            onstart=onstart,
+            cwd=cwd,
+            env=env,
+            sinks=sinks,
+            parentrunid=parentrunid,
+        )
+
+        if cachekey is not None:
+            runlog = await self.callRunLogger(self.runlogger.get,runid)
+            if runlog.get("result") == "SUCCESS":
+                await self.callRunLogger(self.getResultCache().put,cachekey,runlog)
+        return runid
+
+    async def launch(self,cmds,stdoutfile=None,stderrfile=None,runid=None,monitor=False):
+        """
+        Start a command in the background and return its runid as soon as the
+        run log has been saved.  Use wait(runid) to get the finished RunLog.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+
+        def onstart(runid):
+            if not started.done():
+                started.set_result(runid)
+
+        task = asyncio.ensure_future(self.execute(cmds,stdoutfile,stderrfile,runid,monitor,onstart=onstart))
+
+        def ondone(task):
+            # Report failures that happen before the run log is saved
+            if not started.done():
+                if task.cancelled():
+                    started.cancel()
+                elif task.exception() is not None:
+                    started.set_exception(task.exception())
+
+        task.add_done_callback(ondone)
+        runid = await started
+        self.tasks[runid] = task
+        return runid
+
+    async def executeBatchJob(self,scriptfilepath,index,cmds,monitor=False):
+        """
+        Run one command of a batch script written by makeBatchScript
+        """
+        if isinstance(cmds,str):
+            cmds = [cmds]
+        cmdstr = "\n".join(cmds)
+        runid = await self.callRunLogger(self.runlogger.newRunId,cmdstr)
+        return await self.executeScript(scriptfilepath,runid=runid,cmd=cmdstr,monitor=monitor,scriptargs=[str(index)])
+
+    async def map(self,cmdslist,concurrency=None,monitor=False,sharedscript=False):
+        """
+        Execute many commands, running at most concurrency of them at a time.
+        Returns the runids in the same order as cmdslist.
+
+        If sharedscript is set, one batch script is written for all of the
+        commands, as in BashSystem.map, unless it does not parse.
+
+        concurrency defaults to the number of CPUs.
+        """
+        if concurrency is None:
+            concurrency = os.cpu_count() or 1
+        if concurrency < 1:
+            raise UserException("Concurrency must be at least 1, not %s" % str(concurrency))
+        semaphore = asyncio.Semaphore(concurrency)
+        scriptfilepath = None
+        if sharedscript and cmdslist:
+            scriptfilepath = self.makeBatchScript(cmdslist)
+
+        async def run(i,cmds):
+            async with semaphore:
+                if scriptfilepath is not None:
+                    return await self.executeBatchJob(scriptfilepath,i,cmds,monitor)
+                return await self.execute(cmds,monitor=monitor)
+
+        return await asyncio.gather(*[run(i,cmds) for i, cmds in enumerate(cmdslist)])
+
+    async def wait(self,runid):
+        """
+        Wait for a run to finish and return its RunLog.
+
+        Runs launched by this system are awaited directly.  Any other run is
+        checked through the runlogger, with a backoff, until it is no longer RUNNING.
+        """
+        task = self.tasks.pop(runid,None)
+        if task is not None:
+            await task
+            return await self.callRunLogger(self.runlogger.get,runid)
+
+        delay = 0.1
+        while True:
+            runlog = await self.callRunLogger(self.runlogger.get,runid)
+            if runlog.get("status") not in ["RUNNING","QUEUED"]:
+                return runlog
+            await asyncio.sleep(delay)
+            delay = min(delay * 2,WAIT_POLL_MAX)
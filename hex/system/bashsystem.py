@@ -11,24 +11,126 @@ running of scripts
 @license   : GPLv2
 """
 
-import os, socket, sys, logging
+import os, socket, logging
 import time
-from subprocess import Popen,PIPE
+import select
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import Popen,PIPE,DEVNULL
+import shutil
 import tempfile
+from string import Formatter
 from textwrap import TextWrapper
 from hex import __version__,UserException
 from hex.runlog import RunLog, DefaultRunLogger
+from hex.runlog.resultcache import ResultCache, DEFAULT_CACHE_NAME
+from hex.events import OUTPUT_EVENT, EventSink, getEventBus
+from hex.profiling import span, timed
+from hex.runlog.capture import CaptureWriter, DEFAULT_ROTATE_COUNT, checkCompression, addCompressionSuffix, openCapture
+from hex.system.streams import DEFAULT_CHUNK_SIZE, OutputPump, FileFollower, consoleSinks, openPidFd
+from hex.system.resources import hasExited, waitForProcess, TreeMemorySampler
 from datetime import datetime
 
 # If a custom bash script template is needed, specify the path to it with the BASH_SYSTEM_TEMPLATE env var
 BASH_SYSTEM_TEMPLATE_PATH = os.environ.get('BASH_SYSTEM_TEMPLATE')
 
+# Template used when there is no BASH_SYSTEM_TEMPLATE
+DEFAULT_TEMPLATE = """{comment}
+
+{content}
+"""
+
+# Script comments are wrapped at 60 characters.  TextWrapper keeps no state
+# between fill() calls, so one is shared by every system.
+COMMENT_WRAPPER = TextWrapper(replace_whitespace=False,width=60,initial_indent="# ",subsequent_indent="# ")
+
+# Parsed templates by template string, and template file contents by path
+SCRIPT_TEMPLATES = {}
+TEMPLATE_FILES = {}
+
 # The default bash script dir is ~/.hex/bashscripts
 DEFAULT_BASH_SCRIPTDIR = os.path.expanduser("~/.hex/bashscripts")
 
+# Seconds that launch() waits for a forked run to report that it has started
+LAUNCH_TIMEOUT = 60
+
+# Message sent by a launched run once its run log is saved
+LAUNCH_READY = "READY"
+
 logger = logging.getLogger("hex")
 
 
+def pruneScripts(maxage,scriptdir=DEFAULT_BASH_SCRIPTDIR,dryrun=False):
+    """
+    Delete temporary script files (see BashSystem.makeScriptFile) last modified
+    more than maxage seconds ago.  Returns the paths of the deleted files.
+    """
+    if not os.path.isdir(scriptdir):
+        return []
+    cutoff = time.time() - maxage
+    pruned = []
+    for entry in os.scandir(scriptdir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                if not dryrun:
+                    os.remove(entry.path)
+                pruned.append(entry.path)
+        except OSError as e:
+            logger.warning("Unable to remove script %s: %s" % (entry.path,str(e)))
+    return pruned
+
+
+class ScriptTemplate(object):
+    """
+    A script template with {comment} and {content} fields, parsed once so that
+    filling it in is a join.  Templates that use format specs, conversions or
+    any other fields are filled in with str.format.
+    """
+    def __init__(self,templatestr):
+        self.templatestr = templatestr
+        self.parts = []
+        for literal, field, spec, conversion in Formatter().parse(templatestr):
+            if field is not None and (field not in ("comment","content") or spec or conversion):
+                self.parts = None
+                break
+            self.parts.append((literal,field))
+
+    def render(self,comment,content):
+        if self.parts is None:
+            return self.templatestr.format(comment=comment,content=content)
+        fields = {"comment" : comment, "content" : content}
+        return "".join(literal + (fields[field] if field is not None else "") for literal, field in self.parts)
+
+
+def getScriptTemplate(templatestr):
+    """
+    Return the ScriptTemplate for a template string, parsing it the first time
+    """
+    template = SCRIPT_TEMPLATES.get(templatestr)
+    if template is None:
+        template = SCRIPT_TEMPLATES[templatestr] = ScriptTemplate(templatestr)
+    return template
+
+
+def loadTemplateFile(path):
+    """
+    Return the contents of a template file.  The file is read again only if its
+    modification time or size has changed since it was last read.
+    """
+    try:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns,stat.st_size)
+        cached = TEMPLATE_FILES.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        with open(path,"r") as f:
+            templatestr = f.read()
+    except Exception as e:
+        raise UserException("Unable to read bash template %s: %s" % (path,str(e)))
+    TEMPLATE_FILES[path] = (signature,templatestr)
+    return templatestr
+
+
 class BashSystem(object):
     """
     Basic bash interpreter system.
@@ -36,28 +138,50 @@ class BashSystem(object):
     If no runlogger is specified the DefaultRunLogger is used.
 
     If interpreter is specified, it should be the full path.
+
+    The resource usage of each run is recorded in its RunLog.  If memsampleinterval
+    is set, the memory of the run's whole process tree is also sampled that often
+    (in seconds) and the peak recorded as peaktreerss.
+
+    execute(cache=True) reuses the earlier successful run of the same script and
+    inputs, if there is one, from resultcache.  By default the cache is kept in
+    the runlogger's path.
+
+    Output going to files can be captured through this process instead of being
+    written by the run directly: compressed ("gzip" or "zstd"), capped at
+    maxoutputbytes (keeping the head and tail), and / or rotated every rotatebytes
+    keeping rotatecount old segments.  See hex.runlog.capture.
+
+    Output events go to events, by default the runlogger's event bus.  When
+    something subscribes to them, output files are written through this process
+    so that it sees each chunk.
+
+    Script templates are read from BASH_SYSTEM_TEMPLATE once per change to the
+    file, and parsed once, rather than for every system and script.
     """
-    def __init__(self,interpreter="/bin/bash",scriptsuffix=".sh",runlogger=None,**kwargs):
+    def __init__(self,interpreter="/bin/bash",scriptsuffix=".sh",runlogger=None,memsampleinterval=None,resultcache=None,
+                 compression=None,maxoutputbytes=None,rotatebytes=None,rotatecount=DEFAULT_ROTATE_COUNT,events=None,**kwargs):
         self.interpreter = interpreter
         self.scriptsuffix = scriptsuffix
+        self.memsampleinterval = memsampleinterval
+        self.resultcache = resultcache
+
+        checkCompression(compression)
+        self.compression = compression
+        self.maxoutputbytes = maxoutputbytes
+        self.rotatebytes = rotatebytes
+        self.rotatecount = rotatecount
 
         if runlogger is None:
             runlogger = DefaultRunLogger()
 
         self.runlogger = runlogger
+        self.events = events or getattr(runlogger,"events",None) or getEventBus()
+        self.launchstats = {"count" : 0, "total" : 0.0, "max" : 0.0, "last" : None}
 
-        self.default_template = """{comment}
-
-{content}
-"""
+        self.default_template = DEFAULT_TEMPLATE
         if BASH_SYSTEM_TEMPLATE_PATH is not None:
-            try:
-                templatestr = ""
-                with open(BASH_SYSTEM_TEMPLATE_PATH,"r") as f:
-                    templatestr = f.read()
-                self.default_template = templatestr
-            except Exception as e:
-                raise UserException("Unable to read bash template %s: %s" % (BASH_SYSTEM_TEMPLATE_PATH,str(e)))
+            self.default_template = loadTemplateFile(BASH_SYSTEM_TEMPLATE_PATH)
 
     def getTemplate(self):
         return self.default_template
@@ -66,13 +190,11 @@ class BashSystem(object):
         """
         Formats a string as a bash comment
         """
-        # Replace newlines with a \n#
-        comment = comment.replace("\n","\n# ")
-        textwidth = 60  # 60 char comments
-        wrapper = TextWrapper(replace_whitespace=False,width=textwidth,initial_indent="# ",subsequent_indent="# ")
         if comment is None or comment.strip() == "":
             return ""
-        return wrapper.fill(comment)
+        # Replace newlines with a \n#
+        comment = comment.replace("\n","\n# ")
+        return COMMENT_WRAPPER.fill(comment)
 
     def defaultComment(self):
         """
@@ -80,6 +202,7 @@ class BashSystem(object):
         """
         return "bash script composed by hex version %s on %s" % (__version__,str(datetime.now()))
 
+    @timed("bash.compose")
     def compose(self,**kwargs):
         """
         Composes a bash script string using the kwargs
@@ -95,17 +218,17 @@ class BashSystem(object):
         if "comment" in kwargs:
             comment = kwargs["comment"]
         comment = self.formatComment(comment)
-        templatestr = self.getTemplate()
-        return templatestr.format(comment=comment,content=kwargs["content"])
+        return getScriptTemplate(self.getTemplate()).render(comment,kwargs["content"])
 
+    @timed("bash.makeScriptFile")
     def makeScriptFile(self,scriptcontents,runid=None,scriptpath=None):
         """
         Write a script file using scriptcontents and return the file path.
 
         If scriptpath is specified, it will be used.
         If runid is specified, the runlogger will be used to create a scriptpath
-        If scriptpath is not specified, and runid is not specified, an os tempfile will be created.
-        Tempfiles that are created are not removed.
+        If scriptpath is not specified, and runid is not specified, a tempfile will be created
+        in DEFAULT_BASH_SCRIPTDIR.  Tempfiles are not removed here; see pruneScripts.
         """
 
         if scriptpath is None:
@@ -117,103 +240,260 @@ class BashSystem(object):
                 if not os.path.exists(scriptdir):
                     os.makedirs(scriptdir)
 
-                scripth = open(scriptpath,'w')
             else:
-                scripth = tempfile.NamedTemporaryFile(suffix=self.scriptsuffix,delete=False)
+                os.makedirs(DEFAULT_BASH_SCRIPTDIR,exist_ok=True)
+                scripth = tempfile.NamedTemporaryFile(mode='w',suffix=self.scriptsuffix,dir=DEFAULT_BASH_SCRIPTDIR,delete=False)
                 scriptpath = scripth.name
+                scripth.close()
 
         # Write contents and return path
-        scripth.write(scriptcontents + "\n")
+        with open(scriptpath,'w') as scripth:
+            scripth.write(scriptcontents + "\n")
         return scriptpath
 
-    def executeScript(self,scriptfilepath,runid=None,stdoutfile=None,stderrfile=None,cmd=None,monitor=True):
+    def getOutputFiles(self,runid=None,stdoutfile=None,stderrfile=None):
         """
-        Launches the script file, waits for it to complete,
-        and logs it with the run logger.  Returns the runid assigned by the RunLogger.
-
-        If runid is not set, the RunLogger will generate a new one.
-
-        If stdoutfile or stderrfile are not set, the stdout / stderr lines are printed
-
-        cmd is the command being run and is only for annotation purposes
+        Resolve the stdout and stderr file names for a run.  If a file is not
+        specified and runid is set, the runlogger's path is used.  Otherwise
+        None is returned for that stream.
         """
-        hostname = socket.gethostname().split('.',1)[0]
-        args = [self.interpreter,scriptfilepath]
-
-        # Setup stdout
         if stdoutfile is None and runid is not None:
             stdoutfile = self.runlogger.getStdOutPath(runid)
-        if stdoutfile is None:
-            stdout = PIPE
-        else:
-            stdout = open(stdoutfile,'w')
-
-        # Setup stderr
         if stderrfile is None and runid is not None:
             stderrfile = self.runlogger.getStdErrPath(runid)
+        if self.compression is not None:
+            stdoutfile, stderrfile = [None if f is None else addCompressionSuffix(f,self.compression) for f in [stdoutfile,stderrfile]]
+        return stdoutfile, stderrfile
 
-        if stderrfile is None:
-            stderr = PIPE
-        else:
-            stderr = open(stderrfile,'w')
+    def isCapturing(self):
+        """
+        True if output files are written through this process rather than by the run
+        """
+        return self.compression is not None or self.maxoutputbytes is not None or self.rotatebytes is not None
 
-        proc = Popen(args,stdout=stdout,stderr=stderr)
+    def openCaptureWriters(self,stdoutfile,stderrfile,runid=None):
+        """
+        Return a CaptureWriter (or None) for each of the stdout and stderr files.
 
-        # Save the run log
+        If output events are wanted, each stream gets an EventSink for runid
+        instead, wrapping its CaptureWriter if there is one, so that console
+        output is piped through this process too.
+        """
+        capturing = self.isCapturing() or self.events.wants(OUTPUT_EVENT)
+        writers = [None if f is None or not capturing else CaptureWriter(f,self.maxoutputbytes,self.rotatebytes,self.rotatecount) for f in [stdoutfile,stderrfile]]
+        if self.events.wants(OUTPUT_EVENT):
+            writers = [EventSink(self.events,runid,stream,writer) for stream, writer in zip(["stdout","stderr"],writers)]
+        return writers
+
+    def createRunLog(self,scriptfilepath,jobid,runid=None,stdoutfile=None,stderrfile=None,cmd=None,status="RUNNING",parentrunid=None,scriptargs=None):
+        """
+        Create (but do not save) the RunLog for a script that has just been started.
+        parentrunid links the run to the run it is part of, e.g. a workflow.
+        scriptargs are the arguments the script was run with, if any.
+        """
         runlog = RunLog(
             runid=runid,
             interpreter=self.interpreter,
             scriptfilepath=scriptfilepath,
-            jobid=proc.pid,
+            jobid=jobid,
             starttime=datetime.now(),
             system="%s.%s" % (self.__module__, self.__class__.__name__),
-            hostname=hostname,
-            status="RUNNING",
+            hostname=socket.gethostname().split('.',1)[0],
+            status=status,
             cmd=cmd,
         )
         if stdoutfile is not None:
             runlog["stdoutfile"] = stdoutfile
         if stderrfile is not None:
             runlog["stderrfile"] = stderrfile
-        runid = self.runlogger.save(runlog)
-
-        # Execute and wait
-        if monitor:
-            if stdoutfile is None:
-                stdouth = proc.stdout
-            else:
-                stdouth = runlog.getStdOutHandle()
-            if stderrfile is None:
-                stderrh = proc.stderr
-            else:
-                stderrh = runlog.getStdErrHandle()
-
-            while proc.poll() is None:
-                sys.stdout.write(stdouth.readline())
-                sys.stderr.write(stderrh.readline())
-            try:
-                sys.stdout.write(stdouth.readline())
-                sys.stderr.write(stderrh.readline())
-            except Exception:
-                pass
-
-            sys.stdout.flush()
-            sys.stderr.flush()
-        else:
-            proc.wait()
-
-        # Update the run log with the result
+        if parentrunid is not None:
+            runlog["parentrunid"] = parentrunid
+        if scriptargs:
+            runlog["scriptargs"] = list(scriptargs)
+        return runlog
+
+    @timed("bash.completeRunLog")
+    def completeRunLog(self,runid,returncode,resources=None):
+        """
+        Update the saved run log with the result of the run and any resource
+        usage collected for it.  Returns the runid.
+        """
         runlog = self.runlogger.get(runid)
         runlog["endtime"] = datetime.now()
+        if resources:
+            runlog.update(resources)
         runlog["status"] = "COMPLETED"
-        if proc.returncode == 0:
+        if returncode == 0:
             runlog["result"] = "SUCCESS"
         else:
             runlog["result"] = "FAIL"
 
         return self.runlogger.save(runlog)
 
-    def execute(self,cmds,stdoutfile=None,stderrfile=None,runid=None,monitor=True):
+    def executeScript(self,scriptfilepath,runid=None,stdoutfile=None,stderrfile=None,cmd=None,monitor=True,onstart=None,cwd=None,env=None,sinks=None,parentrunid=None,
+                      scriptargs=None):
+        """
+        Launches the script file, waits for it to complete,
+        and logs it with the run logger.  Returns the runid assigned by the RunLogger.
+
+        If runid is not set, the RunLogger will generate a new one.
+
+        If stdoutfile or stderrfile are not set, the stdout / stderr lines are printed
+
+        cmd is the command being run and is only for annotation purposes
+
+        If onstart is set, it is called with the runid once the RUNNING run log has been saved
+
+        cwd and env are the working directory and environment of the script.  If
+        sinks is set, monitored output goes to its (stdout, stderr) sinks instead
+        of the console.  parentrunid is recorded in the run log.
+
+        scriptargs are passed to the script, e.g. the index of the command to run
+        in a batch script (see makeBatchScript), and recorded in the run log.
+        """
+        args = [self.interpreter,scriptfilepath] + list(scriptargs or [])
+
+        stdoutfile, stderrfile = self.getOutputFiles(runid,stdoutfile,stderrfile)
+        outcapture, errcapture = self.openCaptureWriters(stdoutfile,stderrfile,runid)
+        with span("bash.popen",runid=runid):
+            stdout = PIPE if stdoutfile is None or outcapture is not None else open(stdoutfile,'w')
+            stderr = PIPE if stderrfile is None or errcapture is not None else open(stderrfile,'w')
+
+            proc = Popen(args,stdout=stdout,stderr=stderr,cwd=cwd,env=env)
+
+            # The child has its own copies of any output files
+            for f in [stdout,stderr]:
+                if f is not PIPE:
+                    f.close()
+
+        sampler = None
+        if self.memsampleinterval and TreeMemorySampler.available():
+            sampler = TreeMemorySampler(proc.pid,self.memsampleinterval).start()
+
+        # Save the run log
+        runlog = self.createRunLog(scriptfilepath,proc.pid,runid,stdoutfile,stderrfile,cmd,parentrunid=parentrunid,scriptargs=scriptargs)
+        runid = self.runlogger.save(runlog)
+        if onstart is not None:
+            onstart(runid)
+
+        # Execute and wait
+        with span("bash.output",runid=runid):
+            try:
+                if monitor:
+                    self.monitorProcess(proc,stdoutfile,stderrfile,outcapture,errcapture,sinks)
+                else:
+                    # Nothing else is reading the pipes, so don't let them fill up
+                    pump = OutputPump()
+                    for pipe, capture in [(proc.stdout,outcapture),(proc.stderr,errcapture)]:
+                        if pipe is not None:
+                            pump.register(pipe,*[capture for capture in [capture] if capture is not None])
+                    pump.run()
+            finally:
+                for capture in [outcapture,errcapture]:
+                    if capture is not None:
+                        capture.close()
+                for pipe in [proc.stdout,proc.stderr]:
+                    if pipe is not None:
+                        pipe.close()
+        with span("bash.wait",runid=runid):
+            resources = waitForProcess(proc)
+        if sampler is not None:
+            resources["peaktreerss"] = sampler.stop()
+
+        # Update the run log with the result
+        return self.completeRunLog(runid,proc.returncode,resources)
+
+    def monitorProcess(self,proc,stdoutfile=None,stderrfile=None,outcapture=None,errcapture=None,sinks=None):
+        """
+        Copy the output of a running process to the console, or to the
+        (stdout, stderr) sinks if they are given, until it exits.
+        The process is not reaped, so that its resource usage can be collected.
+
+        Piped output is multiplexed with an OutputPump, and also written to the
+        capture writers if they are given.  Output that the process writes to
+        files itself is followed with a FileFollower.  Everything is drained
+        after the process exits.
+        """
+        outsink, errsink = sinks or consoleSinks()
+        pump = OutputPump()
+        follower = None
+        for pipe, filename, sink, capture in [(proc.stdout,stdoutfile,outsink,outcapture),(proc.stderr,stderrfile,errsink,errcapture)]:
+            if capture is not None:
+                pump.register(pipe,capture,sink)
+            elif filename is None:
+                pump.register(pipe,sink)
+            else:
+                if follower is None:
+                    follower = FileFollower()
+                follower.add(filename,sink)
+
+        try:
+            if follower is None:
+                pump.run()
+            else:
+                pumpthread = None
+                if pump.hasSources():
+                    # One stream is piped and the other is in a file
+                    pumpthread = threading.Thread(target=pump.run)
+                    pumpthread.daemon = True
+                    pumpthread.start()
+                pidfd = openPidFd(proc.pid)
+                try:
+                    follower.follow(lambda: hasExited(proc),wakefd=pidfd)
+                finally:
+                    if pidfd is not None:
+                        os.close(pidfd)
+                if pumpthread is not None:
+                    pumpthread.join()
+        finally:
+            for sink in [outsink,errsink]:
+                sink.close()
+
+    def getResultCache(self):
+        """
+        Return the result cache, creating one in the runlogger's path if none was given
+        """
+        if self.resultcache is None:
+            self.resultcache = ResultCache(os.path.join(self.runlogger.pathname,DEFAULT_CACHE_NAME))
+        return self.resultcache
+
+    def getCacheKey(self,cmds,inputs=None,hashinputs=False):
+        """
+        Result cache key for the command(s) and input files.  The script is composed
+        without the default comment, which has a timestamp in it.
+        """
+        if isinstance(cmds,str):
+            cmds = [cmds]
+        script = self.compose(content="\n".join(cmds),comment="")
+        return self.getResultCache().getKey(script,self.interpreter,inputs,hashinputs)
+
+    def invalidateCache(self,cmds,inputs=None,hashinputs=False):
+        """
+        Forget the cached result of the command(s).  Returns True if there was one.
+        """
+        return self.getResultCache().invalidate(self.getCacheKey(cmds,inputs,hashinputs))
+
+    def replayCachedResult(self,entry,stdoutfile=None,stderrfile=None,monitor=True,sinks=None):
+        """
+        Hand back the output of a cached run as if it had just run: copy it to the
+        requested stdout / stderr files and, if monitor is set, to the console
+        (or the sinks).
+        """
+        outsink, errsink = sinks or consoleSinks()
+        for cached, target, sink in [(entry["stdoutfile"],stdoutfile,outsink),(entry["stderrfile"],stderrfile,errsink)]:
+            if target is not None:
+                with openCapture(cached,"rb") as f, open(target,"wb") as t:
+                    shutil.copyfileobj(f,t)
+            if monitor:
+                with openCapture(cached,"rb") as f:
+                    for data in iter(lambda: f.read(DEFAULT_CHUNK_SIZE),b""):
+                        sink.write(data)
+                sink.close()
+        return entry["runid"]
+
+    @timed("bash.execute")
+    def execute(self,cmds,stdoutfile=None,stderrfile=None,runid=None,monitor=True,onstart=None,cache=False,inputs=None,hashinputs=False,cwd=None,env=None,sinks=None,
+                parentrunid=None):
         """
         Execute a command synchronously.
 
@@ -224,17 +504,35 @@ class BashSystem(object):
         and logs it.
 
         If monitor is True, then stdout and stderr will be printed to the console.
+
+        If cache is True and the same command(s) have run successfully before with
+        the same input files (paths in inputs, compared by mtime and size, or by
+        content if hashinputs is set), the earlier runid is returned and its output
+        replayed instead of running again.  Successful runs are added to the cache.
+        The returned runid is then the cached run's, not runid, even if runid was
+        given; callers that created a run log for runid should close it off.
+
+        cwd, env, sinks and parentrunid are passed to executeScript.
         """
         # Setup command string
         if isinstance(cmds,str):
             cmds = [cmds]
         cmdstr = "\n".join(cmds)
 
+        cachekey = None
+        if cache:
+            with span("bash.cacheLookup"):
+                cachekey = self.getCacheKey(cmds,inputs,hashinputs)
+                entry = self.getResultCache().get(cachekey)
+            if entry is not None:
+                logger.debug("Using cached result of %s for %s%s" % (entry["runid"],cmdstr,"" if runid is None else " instead of running %s" % runid))
+                return self.replayCachedResult(entry,stdoutfile,stderrfile,monitor,sinks)
+
         # If runid is none, we need to get one so that the runlogger can keep everything together
         if runid is None:
             runid = self.runlogger.newRunId(cmd=cmdstr)
 
-        return self.executeScript(
+        runid = self.executeScript(
             self.makeScriptFile(
                 self.compose(content=cmdstr),
                 runid=runid,
@@ -244,13 +542,97 @@ class BashSystem(object):
             stderrfile=stderrfile,
             cmd=cmdstr,
             monitor=monitor,
+            onstart=onstart,
+            cwd=cwd,
+            env=env,
+            sinks=sinks,
+            parentrunid=parentrunid,
         )
 
+        if cachekey is not None:
+            runlog = self.runlogger.get(runid)
+            if runlog.get("result") == "SUCCESS":
+                self.getResultCache().put(cachekey,runlog)
+        return runid
+
+    def makeBatchScript(self,cmdslist):
+        """
+        Write one script for a batch of commands and return its path.  The script
+        takes the index of a command in cmdslist as its argument and runs just that
+        command, so a batch needs one script file rather than one per command.
+
+        The whole script is parsed by the interpreter, so one command with a syntax
+        error would break every job in the batch.  Each command is put in its own
+        { } group, which makes a stray ;; or esac a syntax error too, and the script
+        is checked with -n.  If the check fails, the script is removed and None is
+        returned, and the caller should give each command its own script.
+        """
+        cases = []
+        for i, cmds in enumerate(cmdslist):
+            if isinstance(cmds,str):
+                cmds = [cmds]
+            cases.append("%d) {\n%s\n}\n;;" % (i,"\n".join(cmds)))
+        content = 'hex_batch_index="$1"\nshift\ncase "$hex_batch_index" in\n%s\n*)\necho "No command $hex_batch_index in this batch" >&2\nexit 2\n;;\nesac' % "\n".join(cases)
+        scriptfilepath = self.makeScriptFile(self.compose(content=content,comment="hex batch of %d commands" % len(cmdslist)))
+
+        check = Popen([self.interpreter,"-n",scriptfilepath],stdout=DEVNULL,stderr=PIPE)
+        error = check.communicate()[1]
+        if check.returncode != 0:
+            logger.warning("Batch script %s does not parse, running each command from its own script: %s" % (scriptfilepath,error.decode("utf-8","replace").strip()))
+            os.remove(scriptfilepath)
+            return None
+        return scriptfilepath
+
+    def executeBatchJob(self,scriptfilepath,index,cmds,monitor=False):
+        """
+        Run one command of a batch script written by makeBatchScript
+        """
+        if isinstance(cmds,str):
+            cmds = [cmds]
+        cmdstr = "\n".join(cmds)
+        runid = self.runlogger.newRunId(cmd=cmdstr)
+        return self.executeScript(scriptfilepath,runid=runid,cmd=cmdstr,monitor=monitor,scriptargs=[str(index)])
+
+    def map(self,cmdslist,concurrency=None,monitor=False,sharedscript=False):
+        """
+        Execute many commands, running at most concurrency of them at a time.
+
+        Each item of cmdslist is anything that execute() accepts.  Jobs are
+        run from a pool of threads in this process, each one waiting on its own
+        script, so there is no Python fork per job and all jobs share this
+        system's runlogger.  Returns the runids in the same order as cmdslist.
+
+        If sharedscript is set, one batch script is written for all of the
+        commands (see makeBatchScript) and each job runs it with its index.
+        If the batch script does not parse, each command gets its own script.
+
+        concurrency defaults to the number of CPUs.
+        """
+        if concurrency is None:
+            concurrency = os.cpu_count() or 1
+        if concurrency < 1:
+            raise UserException("Concurrency must be at least 1, not %s" % str(concurrency))
+
+        scriptfilepath = None
+        if sharedscript and cmdslist:
+            scriptfilepath = self.makeBatchScript(cmdslist)
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            if scriptfilepath is not None:
+                futures = [pool.submit(self.executeBatchJob,scriptfilepath,i,cmds,monitor) for i, cmds in enumerate(cmdslist)]
+            else:
+                futures = [pool.submit(self.execute,cmds,monitor=monitor) for cmds in cmdslist]
+            return [future.result() for future in futures]
+
     def launch(self,cmds,stdoutfile=None,stderrfile=None,runid=None,monitor=False):
         """
         Executes a command asynchronously by forking a call to the execute() method.
-        Waits until runlog has been initiated before it returns.
-        If after 10 attempts, the runlog is still not created an exception is thrown.
+
+        The forked process reports back over a pipe as soon as the RUNNING run log
+        has been saved, or with the error if it could not start the run, so launch
+        returns (or raises) as soon as the outcome is known.  If nothing is heard
+        within LAUNCH_TIMEOUT seconds an exception is thrown.
+
+        The time from fork to the ready signal is recorded; see getLaunchStats().
         """
 
         # Make sure we can return the runid
@@ -260,21 +642,94 @@ class BashSystem(object):
         if runid is None:
             runid = self.runlogger.newRunId(cmd=cmdstr)
 
+        starttime = time.time()
+        readfd, writefd = os.pipe()
         pid = os.fork()
         if pid == 0:
-            self.execute(cmds,stdoutfile,stderrfile,runid,monitor)
-            os._exit(0)
-        else:
-            max_attempts = 10
-            attempts = 0
-            sleepytime = 5
-            error = ""
-            while attempts <= max_attempts:
+            os.close(readfd)
+            # Fork again so that the run is not left as a zombie of the caller
+            if os.fork() != 0:
+                os._exit(0)
+            self.executeLaunched(cmds,stdoutfile,stderrfile,runid,monitor,writefd)
+
+        os.close(writefd)
+        try:
+            os.waitpid(pid,0)
+            message = self.readLaunchMessage(readfd,LAUNCH_TIMEOUT)
+        finally:
+            os.close(readfd)
+
+        if message is None:
+            raise Exception("Launch of command(s) %s has not created a valid runlog after %d seconds" % (str(cmds),LAUNCH_TIMEOUT))
+        if message == "":
+            raise Exception("Launch of command(s) %s exited before creating a runlog" % str(cmds))
+        if message != LAUNCH_READY:
+            raise Exception("Launch of command(s) %s failed: %s" % (str(cmds),message))
+
+        latency = time.time() - starttime
+        self.launchstats["count"] += 1
+        self.launchstats["total"] += latency
+        self.launchstats["max"] = max(self.launchstats["max"],latency)
+        self.launchstats["last"] = latency
+        logger.debug("Launched %s in %.4f seconds" % (runid,latency))
+        return runid
+
+    def executeLaunched(self,cmds,stdoutfile,stderrfile,runid,monitor,writefd):
+        """
+        Runs in the forked process of launch().  Executes the commands, writing
+        LAUNCH_READY to writefd once the run log is saved, or the error message
+        if the run could not be started.  Never returns.
+        """
+        status = 0
+        ready = []
+
+        def onstart(runid):
+            os.write(writefd,(LAUNCH_READY + "\n").encode())
+            os.close(writefd)
+            ready.append(runid)
+
+        try:
+            self.execute(cmds,stdoutfile,stderrfile,runid,monitor,onstart=onstart)
+        except BaseException as e:
+            status = 1
+            if not ready:
                 try:
-                    self.runlogger.get(runid)
-                    return runid
-                except Exception as e:
-                    error = str(e)
-                    time.sleep(sleepytime)
-                    attempts += 1
-            raise Exception("Launch of command(s) %s has not created a valid runlog: %s" % (str(cmds),error))
+                    os.write(writefd,(str(e).replace("\n"," ") + "\n").encode())
+                except OSError:
+                    pass
+        finally:
+            # os._exit skips atexit handlers, so write out any buffered run logs first
+            try:
+                self.runlogger.flush()
+            finally:
+                os._exit(status)
+
+    def readLaunchMessage(self,readfd,timeout):
+        """
+        Read the one line message written by executeLaunched.  Returns the
+        message, an empty string if the pipe was closed without one, or None
+        on timeout.
+        """
+        data = b""
+        deadline = time.time() + timeout
+        while not data.endswith(b"\n"):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            ready, _, _ = select.select([readfd],[],[],remaining)
+            if not ready:
+                return None
+            chunk = os.read(readfd,4096)
+            if not chunk:
+                break
+            data += chunk
+        return data.decode(errors="replace").strip()
+
+    def getLaunchStats(self):
+        """
+        Return the launch latency statistics (in seconds) for this system:
+        count, total, mean, max, and last.
+        """
+        stats = dict(self.launchstats)
+        stats["mean"] = stats["total"] / stats["count"] if stats["count"] > 0 else None
+        return stats
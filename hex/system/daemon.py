@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+hex daemon
+
+| A long lived server that runs commands for hex clients over a Unix domain
+| socket, so that each command costs a socket round trip instead of an
+| interpreter start, config load and runlogger setup.  The server owns the
+| systems and the runlogger, and limits how many commands run at once.
+|
+| The protocol is one JSON object per line.  A client sends a single request,
+| {"op" : "exec", "cmds" : ..., ...}, and the server answers with events:
+| queued (with the runid, if the command has to wait for the scheduler), started
+| (with the runid), stdout / stderr (base64 data) and finally done (with the
+| runid and result) or error.  ping and status requests get a single reply.
+|
+| Commands run as the user that owns the daemon, so only that user (or root)
+| may connect.  The user of an exec request is therefore not a login identity
+| but a name the client declares (by default its login name) so that the
+| scheduler's per-user caps and fair share can tell workloads apart, e.g.
+| hex submit --user pipeline-a.
+
+@date      : 2026-10-18 19:22:41
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import json
+import time
+import getpass
+import base64
+import socket
+import struct
+import logging
+import threading
+import socketserver
+from hex import __version__, UserException
+from hex.system import getSystem
+from hex.system.streams import consoleSinks
+from hex.system.scheduler import Scheduler
+
+DEFAULT_SOCKET_PATH = os.path.expanduser("~/.hex/hexd.sock")
+
+# Commands run at once by default
+DEFAULT_MAX_JOBS = os.cpu_count() or 1
+
+# Seconds a client waits to connect before deciding there is no daemon
+CONNECT_TIMEOUT = 5
+
+logger = logging.getLogger("hex")
+
+
+def getPeerUid(sock):
+    """
+    Return the uid of the process at the other end of a Unix socket, or None
+    where SO_PEERCRED is not available
+    """
+    if not hasattr(socket,"SO_PEERCRED"):
+        return None
+    creds = sock.getsockopt(socket.SOL_SOCKET,socket.SO_PEERCRED,struct.calcsize("3i"))
+    pid, uid, gid = struct.unpack("3i",creds)
+    return uid
+
+
+class MessageSink(object):
+    """
+    Output sink that sends what is written to a client as stdout / stderr events.
+    Once the client goes away, output is dropped and the run carries on.
+    """
+    def __init__(self,handler,stream):
+        self.handler = handler
+        self.stream = stream
+
+    def write(self,data):
+        self.handler.send(event=self.stream,data=base64.b64encode(data).decode("ascii"))
+
+    def close(self):
+        pass
+
+
+class HexRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles one client request
+    """
+    def setup(self):
+        super(HexRequestHandler,self).setup()
+        self.sendlock = threading.Lock()
+        self.connected = True
+
+    def send(self,**message):
+        """
+        Send an event to the client.  Returns False if the client has gone.
+        """
+        with self.sendlock:
+            if not self.connected:
+                return False
+            try:
+                self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+                self.wfile.flush()
+            except OSError:
+                self.connected = False
+        return self.connected
+
+    def handle(self):
+        uid = getPeerUid(self.request)
+        if uid is not None and uid not in (os.getuid(),0):
+            logger.warning("Refused connection from uid %d" % uid)
+            self.send(event="error",message="Permission denied")
+            return
+
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+            op = request.get("op")
+            if op == "ping":
+                self.send(event="pong",version=__version__,pid=os.getpid())
+            elif op == "status":
+                self.send(event="status",**self.server.getStatus())
+            elif op == "exec":
+                self.server.execute(request,self)
+            else:
+                self.send(event="error",message="Unknown request %s" % op)
+        except Exception as e:
+            logger.exception("Request failed")
+            self.send(event="error",message=str(e))
+
+
+class HexServer(socketserver.ThreadingMixIn,socketserver.UnixStreamServer):
+    """
+    Runs hex commands for clients.  Each connection gets a thread, and commands
+    are run by a Scheduler with at most maxjobs at once; schedulerkwargs (cpus,
+    memory, usercaps, tagcaps, shares) are passed to it.
+
+    runlogger is shared by every run.  Systems are created on first use, one
+    per system key (see hex.system.getAvailableSystems).
+    """
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self,socketpath=DEFAULT_SOCKET_PATH,runlogger=None,maxjobs=DEFAULT_MAX_JOBS,systemkwargs=None,schedulerkwargs=None):
+        self.socketpath = socketpath
+        self.runlogger = runlogger
+        self.maxjobs = maxjobs
+        self.systemkwargs = systemkwargs or {}
+        self.systems = {}
+        self.lock = threading.Lock()
+        self.scheduler = Scheduler(self.getSystem("bash"),maxjobs=maxjobs,**(schedulerkwargs or {}))
+        self.started = time.time()
+
+        self.removeStaleSocket()
+        os.makedirs(os.path.dirname(os.path.abspath(socketpath)),exist_ok=True)
+        oldmask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(self,socketpath,HexRequestHandler)
+        finally:
+            os.umask(oldmask)
+
+    def removeStaleSocket(self):
+        """
+        Remove a socket left behind by a daemon that is no longer running
+        """
+        if not os.path.exists(self.socketpath):
+            return
+        if HexClient(self.socketpath).isRunning():
+            raise UserException("A hex daemon is already listening on %s" % self.socketpath)
+        os.remove(self.socketpath)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        try:
+            os.remove(self.socketpath)
+        except OSError:
+            pass
+
+    def getSystem(self,systemkey):
+        with self.lock:
+            if systemkey not in self.systems:
+                self.systems[systemkey] = getSystem(systemkey,runlogger=self.runlogger,**self.systemkwargs)
+            return self.systems[systemkey]
+
+    def getStatus(self):
+        status = self.scheduler.getStatus()
+        status["uptime"] = time.time() - self.started
+        status["pid"] = os.getpid()
+        return status
+
+    def execute(self,request,handler):
+        """
+        Run an exec request, streaming events to the handler's client.  If the
+        request has wait set to false the client only waits for the started event
+        and output is not sent.
+        """
+        system = self.getSystem(request.get("system","bash"))
+        monitor = request.get("wait",True) and request.get("monitor",True)
+        sinks = (MessageSink(handler,"stdout"),MessageSink(handler,"stderr")) if monitor else None
+
+        job = self.scheduler.enqueue(
+            request["cmds"],
+            priority=request.get("priority",0),
+            user=request.get("user"),
+            tags=request.get("tags"),
+            cpus=request.get("cpus",1),
+            memory=request.get("memory",0),
+            system=system,
+            stdoutfile=request.get("stdoutfile"),
+            stderrfile=request.get("stderrfile"),
+            monitor=monitor,
+            onstart=lambda runid: handler.send(event="started",runid=runid),
+            cache=request.get("cache",False),
+            inputs=request.get("inputs"),
+            hashinputs=request.get("hashinputs",False),
+            cwd=request.get("cwd"),
+            env=request.get("env"),
+            sinks=sinks,
+        )
+        if self.scheduler.isQueued(job.runid):
+            handler.send(event="queued",runid=job.runid)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+
+        runid = job.resultrunid or job.runid
+        result = None
+        try:
+            result = system.runlogger.get(runid).get("result")
+        except Exception:
+            # A cached result whose run has since been pruned
+            pass
+        handler.send(event="done",runid=runid,result=result)
+
+
+class HexClient(object):
+    """
+    Sends requests to a hex daemon
+    """
+    def __init__(self,socketpath=DEFAULT_SOCKET_PATH):
+        self.socketpath = socketpath
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(self.socketpath)
+        except OSError as e:
+            sock.close()
+            raise UserException("No hex daemon is listening on %s (%s).  Start one with hex serve." % (self.socketpath,str(e)))
+        sock.settimeout(None)
+        return sock
+
+    def request(self,**request):
+        """
+        Send a request and yield the events that come back
+        """
+        sock = self.connect()
+        try:
+            sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            with sock.makefile("rb") as f:
+                for line in f:
+                    event = json.loads(line.decode("utf-8"))
+                    yield event
+                    if event.get("event") in ("done","error","pong","status"):
+                        return
+        finally:
+            sock.close()
+
+    def isRunning(self):
+        try:
+            return any(event.get("event") == "pong" for event in self.request(op="ping"))
+        except (UserException, OSError, ValueError):
+            return False
+
+    def getStatus(self):
+        for event in self.request(op="status"):
+            if event.get("event") == "error":
+                raise Exception(event.get("message"))
+            return event
+
+    def execute(self,cmds,wait=True,monitor=True,sinks=None,system="bash",cache=False,inputs=None,hashinputs=False,stdoutfile=None,stderrfile=None,
+                priority=0,tags=None,cpus=1,memory=0,user=None):
+        """
+        Run command(s) on the daemon, in this process's working directory and
+        environment.  Output is written to the console (or the (stdout, stderr)
+        sinks) as it arrives.  Returns (runid, result).
+
+        If wait is False, returns (runid, None) as soon as the run has been
+        queued or started.  priority, tags, cpus and memory are used by the
+        daemon's scheduler, and so is user, the name the command is scheduled
+        under for per-user caps and fair share (by default the login name).
+        """
+        request = {
+            "op"            : "exec",
+            "cmds"          : cmds,
+            "system"        : system,
+            "priority"      : priority,
+            "user"          : user or getpass.getuser(),
+            "tags"          : tags or [],
+            "cpus"          : cpus,
+            "memory"        : memory,
+            "wait"          : wait,
+            "monitor"       : monitor,
+            "cache"         : cache,
+            "inputs"        : [os.path.abspath(path) for path in (inputs or [])],
+            "hashinputs"    : hashinputs,
+            "cwd"           : os.getcwd(),
+            "env"           : dict(os.environ),
+        }
+        for key, path in [("stdoutfile",stdoutfile),("stderrfile",stderrfile)]:
+            if path is not None:
+                request[key] = os.path.abspath(path)
+
+        outsink, errsink = sinks or consoleSinks()
+        try:
+            for event in self.request(**request):
+                kind = event.get("event")
+                if kind == "stdout":
+                    outsink.write(base64.b64decode(event["data"]))
+                elif kind == "stderr":
+                    errsink.write(base64.b64decode(event["data"]))
+                elif kind in ("queued","started") and not wait:
+                    return event["runid"], None
+                elif kind == "done":
+                    return event["runid"], event.get("result")
+                elif kind == "error":
+                    raise UserException("hex daemon error: %s" % event.get("message"))
+        finally:
+            outsink.close()
+            errsink.close()
+        raise Exception("Connection to the hex daemon was lost")
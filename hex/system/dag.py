@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+DAG
+
+| Workflows of commands with dependencies.  Each node of a Dag is a command
+| that runs once the nodes it depends on have succeeded, either because it
+| names them in deps or because it reads (inputs) a file that another node
+| writes (outputs).  A DagRunner runs the nodes on a system, as many at once
+| as it is allowed, each as a run of its own linked to a parent run for the
+| workflow.  When a node fails, the nodes downstream of it are skipped.
+|
+| A workflow can be described in JSON:
+|
+|   {
+|       "name"      : "align",
+|       "maxjobs"   : 4,
+|       "nodes"     : [
+|           {"name" : "index", "cmd" : "bwa index ref.fa", "outputs" : ["ref.fa.bwt"]},
+|           {"name" : "align", "cmd" : "bwa mem ref.fa reads.fq > out.sam", "inputs" : ["ref.fa.bwt"]}
+|       ]
+|   }
+|
+| nodes may also be an object keyed by node name.  cmd may be a list of commands.
+|
+| Running the same workflow again only reruns the nodes whose command, inputs
+| or upstream runs have changed since they last succeeded; the others are
+| reused, with the runids of the runs that succeeded.
+
+@date      : 2026-10-19 00:12:37
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from hex import UserException
+from hex.runlog.resultcache import getInputSignature
+from hex.system import waitFor
+
+# What became of each node in a DagRunner run
+SUCCESS_STATE = "SUCCESS"
+FAIL_STATE = "FAIL"
+SKIPPED_STATE = "SKIPPED"
+REUSED_STATE = "REUSED"
+DONE_STATES = (SUCCESS_STATE,REUSED_STATE)
+
+# Directory in the runlog path where the checkpoints of succeeded nodes are kept
+DEFAULT_CHECKPOINT_NAME = ".checkpoints"
+
+# Options of a node in a workflow description that are passed to execute()
+NODE_OPTIONS = ["stdoutfile","stderrfile","cwd","env","cache","hashinputs"]
+
+# Nodes run at once by default
+DEFAULT_MAX_JOBS = os.cpu_count() or 1
+
+logger = logging.getLogger("hex")
+
+
+class Node(object):
+    """
+    A command in a Dag.  cmds is a command or list of commands, deps the names
+    of nodes that must succeed first, and inputs and outputs the files it reads
+    and writes.  Other keyword arguments (e.g. stdoutfile, cwd) are passed to
+    the system's execute().  Relative inputs and outputs are in the node's cwd.
+    """
+    def __init__(self,name,cmds,deps=None,inputs=None,outputs=None,**kwargs):
+        if isinstance(cmds,str):
+            cmds = [cmds]
+        if not name or not cmds:
+            raise UserException("A workflow node needs a name and a command")
+        self.name = name
+        self.cmds = list(cmds)
+        self.deps = list(deps or [])
+        self.inputs = list(inputs or [])
+        self.outputs = list(outputs or [])
+        self.kwargs = kwargs
+
+    def getPath(self,path):
+        """
+        Absolute path of one of the node's files, resolving relative paths
+        against its cwd as the command will
+        """
+        return os.path.abspath(os.path.join(self.kwargs.get("cwd") or "",path))
+
+    def getInputs(self):
+        return [self.getPath(path) for path in self.inputs]
+
+    def getOutputs(self):
+        return [self.getPath(path) for path in self.outputs]
+
+
+class Dag(object):
+    """
+    A workflow: nodes, in the order they were added, and their dependencies
+    """
+    def __init__(self,name="dag",maxjobs=None):
+        self.name = name
+        self.maxjobs = maxjobs
+        self.nodes = {}
+        self.order = []
+
+    def add(self,name,cmds,deps=None,inputs=None,outputs=None,**kwargs):
+        """
+        Add a node and return it.  See Node.
+        """
+        if name in self.nodes:
+            raise UserException("Workflow %s has more than one node named %s" % (self.name,name))
+        node = Node(name,cmds,deps,inputs,outputs,**kwargs)
+        self.nodes[name] = node
+        self.order.append(name)
+        return node
+
+    def getDependencies(self):
+        """
+        Return {node name : set of the names of nodes it depends on}, including
+        the nodes that write its inputs
+        """
+        writers = {}
+        for name in self.order:
+            for path in self.nodes[name].getOutputs():
+                if path in writers:
+                    raise UserException("Nodes %s and %s both write %s" % (writers[path],name,path))
+                writers[path] = name
+
+        dependencies = {}
+        for name in self.order:
+            node = self.nodes[name]
+            deps = set(node.deps)
+            unknown = [dep for dep in deps if dep not in self.nodes]
+            if unknown:
+                raise UserException("Node %s depends on unknown nodes %s" % (name,", ".join(sorted(unknown))))
+            for path in node.getInputs():
+                writer = writers.get(path)
+                if writer is not None and writer != name:
+                    deps.add(writer)
+            dependencies[name] = deps
+        return dependencies
+
+    def getOrder(self):
+        """
+        The node names in an order where each comes after its dependencies.
+        Raises a UserException if the dependencies have a cycle.
+        """
+        dependencies = self.getDependencies()
+        order = []
+        done = set()
+        remaining = list(self.order)
+        while remaining:
+            ready = [name for name in remaining if dependencies[name] <= done]
+            if not ready:
+                raise UserException("Workflow %s has a dependency cycle among %s" % (self.name,", ".join(remaining)))
+            order.extend(ready)
+            done.update(ready)
+            remaining = [name for name in remaining if name not in done]
+        return order
+
+    @classmethod
+    def fromDict(cls,data):
+        """
+        Make a Dag from a workflow description (see the module documentation)
+        """
+        if not isinstance(data,dict) or "nodes" not in data:
+            raise UserException("A workflow description needs nodes")
+        dag = cls(name=data.get("name","dag"),maxjobs=data.get("maxjobs"))
+        nodes = data["nodes"]
+        if isinstance(nodes,dict):
+            nodes = [dict(spec,name=name) for name, spec in nodes.items()]
+        for spec in nodes:
+            spec = dict(spec)
+            name = spec.pop("name",None)
+            cmds = spec.pop("cmd",None) or spec.pop("cmds",None)
+            unknown = [key for key in spec if key not in ["deps","inputs","outputs"] + NODE_OPTIONS]
+            if unknown:
+                raise UserException("Unknown options %s for workflow node %s" % (", ".join(sorted(unknown)),name))
+            dag.add(name,cmds,**spec)
+        dag.getOrder()
+        return dag
+
+    @classmethod
+    def load(cls,path):
+        """
+        Read a workflow description from a JSON file
+        """
+        try:
+            with open(path,"r") as f:
+                data = json.load(f)
+        except (IOError, ValueError) as e:
+            raise UserException("Unable to read workflow from %s: %s" % (path,str(e)))
+        return cls.fromDict(data)
+
+
+class DagResult(object):
+    """
+    What happened in a run of a Dag.  runid is the parent run and nodes maps
+    each node name to a dictionary with its state, runid (if it ran), result
+    and, for failed or skipped nodes, the reason.
+    """
+    def __init__(self,runid,nodes):
+        self.runid = runid
+        self.nodes = nodes
+
+    @property
+    def succeeded(self):
+        return all(node["state"] in DONE_STATES for node in self.nodes.values())
+
+
+class Checkpoints(object):
+    """
+    The runids of workflow nodes that succeeded, keyed by step key (see
+    DagRunner.getStepKey).  Each checkpoint is a small file in path.
+    """
+    def __init__(self,path):
+        self.path = path
+        os.makedirs(self.path,exist_ok=True)
+
+    def get(self,key):
+        """
+        Return the runid checkpointed for key, or None
+        """
+        try:
+            with open(os.path.join(self.path,key),"r") as f:
+                return json.load(f).get("runid")
+        except (IOError, OSError, ValueError):
+            return None
+
+    def put(self,key,runid,node=None):
+        fd, tmppath = tempfile.mkstemp(prefix=".%s." % key[0:8],dir=self.path)
+        with os.fdopen(fd,"w") as f:
+            json.dump({"runid" : runid, "node" : node},f)
+        os.replace(tmppath,os.path.join(self.path,key))
+
+    def invalidate(self,key):
+        """
+        Remove the checkpoint for key.  Returns True if there was one.
+        """
+        try:
+            os.remove(os.path.join(self.path,key))
+            return True
+        except OSError:
+            return False
+
+
+class DagRunner(object):
+    """
+    Runs Dags on a system with at most maxjobs nodes at once.
+
+    The workflow is logged as a parent run, whose runlog has the command
+    "dag: <name>" and is completed with SUCCESS only if every node succeeded.
+    Each node is a run of its own with parentrunid set to the parent's runid,
+    so the nodes of a workflow can be found with runlogger.query(parentrunid=...).
+
+    A node fails if its command fails, if one of its inputs is missing when it is
+    due to start, or if one of its outputs is missing after it succeeds.
+
+    If checkpoint is set, each node that succeeds is checkpointed under its step
+    key, and a node whose step key has a checkpoint is not run again as long as
+    the checkpointed run's log still has the result SUCCESS and the node's
+    outputs exist.  It is REUSED, with the runid of that run.  Checkpoints are
+    kept in the runlogger's path unless checkpoints (a Checkpoints) is given.
+    If reuse is not set, every node is run, but the nodes that succeed are still
+    checkpointed, replacing their earlier checkpoints.  hashinputs compares input files by content rather than mtime and size.
+    """
+    def __init__(self,system,maxjobs=None,checkpoint=True,checkpoints=None,hashinputs=False,reuse=True):
+        self.system = system
+        self.maxjobs = maxjobs
+        self.checkpoint = checkpoint
+        self.reuse = reuse
+        self.checkpoints = checkpoints
+        self.hashinputs = hashinputs
+        if checkpoint and checkpoints is None:
+            self.checkpoints = Checkpoints(os.path.join(system.runlogger.pathname,DEFAULT_CHECKPOINT_NAME))
+
+    def run(self,dag,monitor=False):
+        """
+        Run the workflow and return a DagResult
+        """
+        order = dag.getOrder()
+        dependencies = dag.getDependencies()
+        maxjobs = self.maxjobs or dag.maxjobs or DEFAULT_MAX_JOBS
+        runlogger = self.system.runlogger
+
+        parentcmd = "dag: %s" % dag.name
+        parentrunid = runlogger.newRunId(cmd=dag.name)
+        runlogger.save(self.system.createRunLog("",os.getpid(),runid=parentrunid,cmd=parentcmd))
+
+        nodes = dict((name,{"state" : None, "runid" : None, "result" : None}) for name in order)
+        pending = list(order)
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=maxjobs) as executor:
+                while pending or running:
+                    for name in list(pending):
+                        if len(running) >= maxjobs:
+                            break
+                        deps = dependencies[name]
+                        if any(nodes[dep]["state"] in (FAIL_STATE,SKIPPED_STATE) for dep in deps):
+                            pending.remove(name)
+                            failed = sorted(dep for dep in deps if nodes[dep]["state"] in (FAIL_STATE,SKIPPED_STATE))
+                            nodes[name].update(state=SKIPPED_STATE,reason="upstream %s did not succeed" % ", ".join(failed))
+                        elif all(nodes[dep]["state"] in DONE_STATES for dep in deps):
+                            pending.remove(name)
+                            upstream = dict((dep,nodes[dep]["runid"]) for dep in deps)
+                            running[executor.submit(self.runNode,dag.nodes[name],parentrunid,monitor,upstream)] = name
+                    if not running:
+                        continue
+                    finished, unfinished = wait(list(running.keys()),return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name = running.pop(future)
+                        try:
+                            nodes[name].update(future.result())
+                        except Exception as e:
+                            logger.error("Workflow node %s failed: %s" % (name,str(e)))
+                            nodes[name].update(state=FAIL_STATE,reason=str(e))
+        finally:
+            result = DagResult(parentrunid,nodes)
+            parent = runlogger.get(parentrunid)
+            parent["status"] = "COMPLETED"
+            parent["endtime"] = datetime.now()
+            parent["result"] = "SUCCESS" if result.succeeded else "FAIL"
+            runlogger.save(parent)
+        return result
+
+    def getStepKey(self,node,upstream):
+        """
+        Key for a node's name, command(s), interpreter, working directory,
+        environment and input files, and the runids of the upstream nodes it
+        depends on ({node name : runid}).  If any of them change, so does the key.
+        """
+        hashinputs = node.kwargs.get("hashinputs",self.hashinputs)
+        digest = hashlib.sha256()
+        digest.update(("%s\0%s\0" % (node.name,self.system.interpreter)).encode("utf-8"))
+        digest.update(json.dumps([node.kwargs.get("cwd"),node.kwargs.get("env")],sort_keys=True).encode("utf-8") + b"\0")
+        digest.update(self.system.compose(content="\n".join(node.cmds),comment="").encode("utf-8") + b"\0")
+        for path in sorted(node.getInputs()):
+            digest.update(("%s\0%s\0" % (path,getInputSignature(path,hashinputs))).encode("utf-8"))
+        for name in sorted(upstream):
+            digest.update(("%s\0%s\0" % (name,upstream[name])).encode("utf-8"))
+        return digest.hexdigest()
+
+    def findCheckpoint(self,node,key):
+        """
+        Return the runid of the checkpointed run of a node if it can be reused
+        """
+        runid = self.checkpoints.get(key)
+        if runid is None:
+            return None
+        try:
+            runlog = self.system.runlogger.get(runid)
+        except Exception:
+            # The run has been pruned since
+            runlog = {}
+        if runlog.get("result") != "SUCCESS" or not all(os.path.exists(path) for path in node.getOutputs()):
+            self.checkpoints.invalidate(key)
+            return None
+        return runid
+
+    def runNode(self,node,parentrunid,monitor=False,upstream=None):
+        """
+        Run one node, or reuse its checkpointed run, and return its state, runid and result
+        """
+        missing = [path for path, resolved in zip(node.inputs,node.getInputs()) if not os.path.exists(resolved)]
+        if missing:
+            return {"state" : FAIL_STATE, "reason" : "missing inputs %s" % ", ".join(missing)}
+
+        key = None
+        if self.checkpoint:
+            key = self.getStepKey(node,upstream or {})
+            runid = self.findCheckpoint(node,key) if self.reuse else None
+            if runid is not None:
+                logger.debug("Reusing run %s of workflow node %s" % (runid,node.name))
+                return {"state" : REUSED_STATE, "runid" : runid, "result" : "SUCCESS"}
+
+        kwargs = dict(node.kwargs)
+        kwargs.setdefault("monitor",monitor)
+        runid = waitFor(self.system.execute(node.cmds,inputs=node.getInputs(),parentrunid=parentrunid,**kwargs))
+        runresult = self.system.runlogger.get(runid).get("result")
+        state = {"runid" : runid, "result" : runresult, "state" : SUCCESS_STATE if runresult == "SUCCESS" else FAIL_STATE}
+        if runresult == "SUCCESS":
+            missing = [path for path, resolved in zip(node.outputs,node.getOutputs()) if not os.path.exists(resolved)]
+            if missing:
+                state.update(state=FAIL_STATE,reason="missing outputs %s" % ", ".join(missing))
+            elif key is not None:
+                self.checkpoints.put(key,runid,node.name)
+        else:
+            state["reason"] = "command failed"
+        return state
+
+
+def runDag(dag,system,maxjobs=None,monitor=False,checkpoint=True,reuse=True):
+    """
+    Run a Dag, or a workflow file, on a system and return the DagResult
+    """
+    if isinstance(dag,str):
+        dag = Dag.load(dag)
+    return DagRunner(system,maxjobs,checkpoint=checkpoint,reuse=reuse).run(dag,monitor)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Liveness of runs
+
+| A run stays RUNNING in its run log until the process that was monitoring it
+| completes the log.  If that process dies first, nothing ever does.  This
+| reconciles run logs with what is really running: the jobid of a run on this
+| host is its process id, or for a QUEUED run the id of the process that queued
+| it, which is checked in /proc, and Slurm runs are checked with one squeue /
+| sacct call for all of them.  Runs whose process is gone are marked LOST, with
+| the result FAIL.
+
+@date      : 2026-10-18 21:55:48
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import socket
+import logging
+from datetime import datetime
+from hex import UserException
+from hex.system.resources import getBootTime, getProcessStartTime
+
+LOST_STATUS = "LOST"
+
+# Statuses of runs that have not finished
+ACTIVE_STATUSES = ["QUEUED","RUNNING"]
+
+# A process that started more than this many seconds after its run was logged
+# is a later process that was given the same pid
+PID_REUSE_TOLERANCE = 2
+
+logger = logging.getLogger("hex")
+
+
+def isSlurmRun(runlog):
+    return str(runlog.get("system","")).endswith(".SlurmSystem")
+
+
+def isProcessAlive(pid,starttime=None,boottime=None):
+    """
+    True if process pid exists and, where /proc is available and starttime (a
+    datetime) is given, started no later than starttime
+    """
+    if boottime is not None:
+        started = getProcessStartTime(pid,boottime)
+        if started is None:
+            return False
+        if starttime is None:
+            return True
+        return started <= starttime.timestamp() + PID_REUSE_TOLERANCE
+    try:
+        os.kill(pid,0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def findLostRuns(runlogs,hostname=None):
+    """
+    Return the QUEUED or RUNNING run logs, of runs started on this host (or
+    hostname), whose process is no longer running.  /proc is read once per run.
+    """
+    hostname = hostname or socket.gethostname().split(".",1)[0]
+    boottime = getBootTime()
+    lost = []
+    for runlog in runlogs:
+        if runlog.get("status") not in ACTIVE_STATUSES or runlog.get("hostname") != hostname or isSlurmRun(runlog):
+            continue
+        try:
+            pid = int(runlog.get("jobid"))
+        except (TypeError, ValueError):
+            continue
+        starttime = runlog.get("starttime")
+        if not isProcessAlive(pid,starttime if isinstance(starttime,datetime) else None,boottime):
+            lost.append(runlog)
+    return lost
+
+
+def reconcileRuns(runlogger,runlogs,hostname=None):
+    """
+    Bring unfinished run logs up to date and return them all, in the same order.
+    Runs on this host whose process has gone are saved as LOST.  Slurm runs are
+    updated from Slurm.  Runs on other hosts are left as they are.
+
+    runlogs may only hold some of the fields of each run (see
+    SQLRunLogger.statusMany), so a lost run's full log is loaded and saved.
+    """
+    runlogs = list(runlogs)
+    slurmrunids = [runlog["runid"] for runlog in runlogs if runlog.get("status") in ACTIVE_STATUSES and isSlurmRun(runlog)]
+    if slurmrunids:
+        from hex.system.slurmsystem import SlurmSystem
+        try:
+            updated = dict((runlog["runid"],runlog) for runlog in SlurmSystem(runlogger=runlogger).updateRunLogs(slurmrunids))
+            runlogs = [updated.get(runlog["runid"],runlog) for runlog in runlogs]
+        except UserException as e:
+            logger.warning("Unable to check Slurm runs: %s" % str(e))
+
+    updated = {}
+    for runlog in findLostRuns(runlogs,hostname):
+        try:
+            full = runlogger.get(runlog["runid"])
+        except Exception:
+            full = runlog
+        updated[runlog["runid"]] = full
+        if full.get("status") not in ACTIVE_STATUSES:
+            # It finished after runlogs were read
+            continue
+        logger.info("Run %s (process %s) is no longer running; marking it LOST" % (full["runid"],full.get("jobid")))
+        full["status"] = LOST_STATUS
+        full["result"] = "FAIL"
+        full["endtime"] = datetime.now()
+        runlogger.save(full)
+    return [updated.get(runlog["runid"],runlog) for runlog in runlogs]
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+Resource accounting for runs
+
+| Collects what a run consumed: the rusage reported by wait4 when the process
+| is reaped, and optionally the peak resident memory of the whole process tree,
+| sampled from /proc while the run is going.
+
+@date      : 2026-10-18 16:05:12
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import threading
+
+PAGE_SIZE_KB = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os,"sysconf") else 4
+
+
+def hasExited(proc):
+    """
+    True if the process has exited.  Unlike Popen.poll() this does not reap it,
+    so its rusage can still be collected with waitForProcess.
+    """
+    if proc.returncode is not None:
+        return True
+    try:
+        return os.waitid(os.P_PID,proc.pid,os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        return True
+
+
+def rusageToDict(rusage):
+    """
+    Convert a resource.struct_rusage into RunLog resource fields.  maxrss is in KB.
+    """
+    return {
+        "usercpu"   : rusage.ru_utime,
+        "syscpu"    : rusage.ru_stime,
+        "maxrss"    : rusage.ru_maxrss,
+        "inblock"   : rusage.ru_inblock,
+        "oublock"   : rusage.ru_oublock,
+        "nvcsw"     : rusage.ru_nvcsw,
+        "nivcsw"    : rusage.ru_nivcsw,
+    }
+
+
+def waitForProcess(proc):
+    """
+    Wait for a Popen process to exit, set its returncode, and return its resource
+    usage as a dictionary.  An empty dictionary is returned if the process was
+    already reaped elsewhere.
+    """
+    if proc.returncode is not None:
+        return {}
+    try:
+        pid, status, rusage = os.wait4(proc.pid,0)
+    except ChildProcessError:
+        proc.wait()
+        return {}
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return rusageToDict(rusage)
+
+
+def getProcessTree(rootpid):
+    """
+    Return the pids of rootpid and all of its descendants, from /proc
+    """
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open("/proc/%s/stat" % name,"r") as f:
+                stat = f.read()
+        except (IOError, OSError):
+            continue
+        # The command name is in parentheses and may contain spaces
+        fields = stat[stat.rfind(")") + 2:].split()
+        children.setdefault(int(fields[1]),[]).append(int(name))
+
+    pids = [rootpid]
+    i = 0
+    while i < len(pids):
+        pids.extend(children.get(pids[i],[]))
+        i += 1
+    return pids
+
+
+def getBootTime():
+    """
+    Seconds since the epoch at which this host booted, from /proc/stat, or None
+    """
+    try:
+        with open("/proc/stat","r") as f:
+            for line in f:
+                if line.startswith("btime "):
+                    return int(line.split()[1])
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def getProcessStartTime(pid,boottime=None):
+    """
+    Seconds since the epoch at which process pid started, from /proc, or None if
+    there is no such process.  Pass boottime (see getBootTime) when checking many
+    processes.
+    """
+    boottime = getBootTime() if boottime is None else boottime
+    try:
+        with open("/proc/%d/stat" % pid,"r") as f:
+            stat = f.read()
+    except (IOError, OSError):
+        return None
+    fields = stat[stat.rfind(")") + 2:].split()
+    return boottime + float(fields[19]) / os.sysconf("SC_CLK_TCK")
+
+
+def getTreeRss(rootpid):
+    """
+    Total resident memory, in KB, of a process and its descendants
+    """
+    total = 0
+    for pid in getProcessTree(rootpid):
+        try:
+            with open("/proc/%d/statm" % pid,"r") as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE_KB
+        except (IOError, OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+class TreeMemorySampler(object):
+    """
+    Samples the resident memory of a process tree every interval seconds in a
+    background thread and keeps the peak.  Only available where /proc is.
+    """
+    def __init__(self,pid,interval):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    @classmethod
+    def available(cls):
+        return os.path.isdir("/proc/self")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak,getTreeRss(self.pid))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        """
+        Stop sampling and return the peak tree RSS in KB
+        """
+        self.stopped.set()
+        self.thread.join()
+        return self.peak
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Scheduler
+
+| Admission control for a system.  Submitted commands are saved with the status
+| QUEUED and wait in a priority queue until they can be dispatched without going
+| over the scheduler's limits: a maximum number of jobs, per-user and per-tag
+| caps, and the CPUs and memory the jobs declare they need.  Jobs of the same
+| priority are ordered by fair share, so one user's burst does not hold back
+| everyone else's work.
+
+@date      : 2026-10-18 20:31:05
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import heapq
+import getpass
+import logging
+import threading
+from datetime import datetime
+from hex import UserException
+from hex.runlog.retention import parseSize
+from hex.system import waitFor
+
+QUEUED_STATUS = "QUEUED"
+CANCELLED_STATUS = "CANCELLED"
+
+logger = logging.getLogger("hex")
+
+
+def getTotalMemory():
+    """
+    Physical memory of this host in bytes, or None if it can't be determined
+    """
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class Job(object):
+    """
+    A submitted command and what it needs to run.  kwargs are passed to the
+    system's execute().
+    """
+    def __init__(self,system,runid,cmds,priority,user,tags,cpus,memory,kwargs):
+        self.system = system
+        self.runid = runid
+        self.cmds = cmds
+        self.priority = priority
+        self.user = user
+        self.tags = list(tags or [])
+        self.cpus = cpus
+        self.memory = memory
+        self.kwargs = kwargs
+        self.done = threading.Event()
+        self.error = None
+        # The runid holding the result, which for a result cache hit is the earlier run's
+        self.resultrunid = None
+
+
+class Scheduler(object):
+    """
+    Runs commands on a system, in priority order, once there is room for them.
+
+    maxjobs limits the number of jobs running at once.  cpus and memory (bytes, or
+    a size like "64G") are the capacity shared by running jobs and default to this
+    host's.  usercaps and tagcaps map a user or tag to the most jobs it may have
+    running; a job with several tags must fit under every one of their caps.
+
+    Higher priorities are dispatched first.  Within a priority, jobs are ordered by
+    start-time fair queueing: each user's jobs are spaced out in virtual time by the
+    CPUs they declare, divided by the user's weight in shares (default 1).  A job
+    that has to wait for CPUs or memory holds back the lower ranked jobs, so that
+    large jobs are not starved by small ones; jobs that are over a user or tag cap
+    are skipped.
+
+    Each dispatched job runs in a thread of this process, on the scheduler's
+    system unless another one is given to submit().
+    """
+    def __init__(self,system,maxjobs=None,cpus=None,memory=None,usercaps=None,tagcaps=None,shares=None):
+        self.system = system
+        self.maxjobs = maxjobs
+        self.cpus = cpus if cpus is not None else (os.cpu_count() or 1)
+        self.memory = parseSize(memory) if memory is not None else getTotalMemory()
+        self.usercaps = dict(usercaps or {})
+        self.tagcaps = dict(tagcaps or {})
+        self.shares = dict(shares or {})
+
+        self.lock = threading.Lock()
+        self.pending = []
+        self.seq = 0
+        self.vtime = 0.0
+        self.vfinish = {}
+        self.jobs = {}
+        self.running = {}
+
+    def submit(self,cmds,**kwargs):
+        """
+        Queue command(s) and return the runid.  See enqueue().
+        """
+        return self.enqueue(cmds,**kwargs).runid
+
+    def enqueue(self,cmds,priority=0,user=None,tags=None,cpus=1,memory=0,runid=None,system=None,**kwargs):
+        """
+        Queue command(s) and return the Job.  The run is logged as QUEUED until it
+        is dispatched.  cpus and memory are what the job needs; other keyword
+        arguments are passed to the system's execute(); output is not monitored
+        unless monitor=True is given.
+        """
+        system = system or self.system
+        kwargs.setdefault("monitor",False)
+        if isinstance(cmds,str):
+            cmds = [cmds]
+        memory = parseSize(memory) or 0
+        if cpus > self.cpus or (self.memory is not None and memory > self.memory):
+            raise UserException("Command needs %s cpus and %d bytes of memory, more than the scheduler's %s cpus and %s bytes" % (cpus,memory,self.cpus,self.memory))
+
+        cmdstr = "\n".join(cmds)
+        if runid is None:
+            runid = system.runlogger.newRunId(cmd=cmdstr)
+        # The jobid of a queued run is this process, so that the run can be found to be
+        # LOST if it goes before dispatching the run (see hex.system.liveness)
+        runlog = system.createRunLog("",os.getpid(),runid=runid,stdoutfile=kwargs.get("stdoutfile"),stderrfile=kwargs.get("stderrfile"),cmd=cmdstr,status=QUEUED_STATUS,
+                                     parentrunid=kwargs.get("parentrunid"))
+        system.runlogger.save(runlog)
+
+        job = Job(system,runid,cmds,priority,user or getpass.getuser(),tags,cpus,memory,kwargs)
+        with self.lock:
+            vstart = max(self.vtime,self.vfinish.get(job.user,0.0))
+            self.vfinish[job.user] = vstart + float(max(cpus,1)) / self.shares.get(job.user,1)
+            self.seq += 1
+            heapq.heappush(self.pending,(-priority,vstart,self.seq,job))
+            self.jobs[runid] = job
+        self.dispatch()
+        return job
+
+    def isAdmissible(self,job):
+        """
+        Return None if job can start now, "cap" if a user or tag cap is in the
+        way, or "resources" if it has to wait for CPUs, memory or a job slot.
+        """
+        running = list(self.running.values())
+        if self.usercaps.get(job.user) is not None and len([r for r in running if r.user == job.user]) >= self.usercaps[job.user]:
+            return "cap"
+        for tag in job.tags:
+            if self.tagcaps.get(tag) is not None and len([r for r in running if tag in r.tags]) >= self.tagcaps[tag]:
+                return "cap"
+        if self.maxjobs is not None and len(running) >= self.maxjobs:
+            return "resources"
+        if sum(r.cpus for r in running) + job.cpus > self.cpus:
+            return "resources"
+        if self.memory is not None and sum(r.memory for r in running) + job.memory > self.memory:
+            return "resources"
+        return None
+
+    def dispatch(self):
+        """
+        Start every queued job that fits, best ranked first.  Returns the runids started.
+        """
+        started = []
+        with self.lock:
+            skipped = []
+            while self.pending:
+                entry = heapq.heappop(self.pending)
+                job = entry[3]
+                reason = self.isAdmissible(job)
+                if reason == "cap":
+                    skipped.append(entry)
+                    continue
+                if reason == "resources":
+                    skipped.append(entry)
+                    break
+                self.vtime = max(self.vtime,entry[1])
+                self.running[job.runid] = job
+                threading.Thread(target=self.run,args=(job,),name="hex-%s" % job.runid).start()
+                started.append(job.runid)
+            for entry in skipped:
+                heapq.heappush(self.pending,entry)
+        return started
+
+    def run(self,job):
+        """
+        Execute a dispatched job, then make room for the next ones
+        """
+        try:
+            job.resultrunid = waitFor(job.system.execute(job.cmds,runid=job.runid,**job.kwargs))
+            if job.resultrunid != job.runid:
+                # A result cache hit never runs, so close off the queued run log
+                self.finishRunLog(job,"COMPLETED",job.system.runlogger.get(job.resultrunid).get("result"))
+        except Exception as e:
+            logger.error("Scheduled run %s failed: %s" % (job.runid,str(e)))
+            job.error = e
+            self.finishRunLog(job,"COMPLETED","FAIL")
+        finally:
+            with self.lock:
+                self.running.pop(job.runid,None)
+                self.jobs.pop(job.runid,None)
+            job.done.set()
+            self.dispatch()
+
+    def finishRunLog(self,job,status,result=None):
+        runlog = job.system.runlogger.get(job.runid)
+        runlog["status"] = status
+        runlog["endtime"] = datetime.now()
+        if result is not None:
+            runlog["result"] = result
+        job.system.runlogger.save(runlog)
+
+    def cancel(self,runid):
+        """
+        Remove a job that has not been dispatched yet.  Its run is logged as
+        CANCELLED.  Returns False if the job is not queued.
+        """
+        with self.lock:
+            entries = [entry for entry in self.pending if entry[3].runid == runid]
+            if not entries:
+                return False
+            self.pending.remove(entries[0])
+            heapq.heapify(self.pending)
+            job = self.jobs.pop(runid)
+        self.finishRunLog(job,CANCELLED_STATUS)
+        job.done.set()
+        return True
+
+    def isQueued(self,runid):
+        with self.lock:
+            return runid in self.jobs and runid not in self.running
+
+    def wait(self,runids=None,timeout=None):
+        """
+        Wait for the given jobs (default: all unfinished ones) to finish.  Returns
+        False if the timeout, in seconds, expired first.
+        """
+        with self.lock:
+            runids = list(self.jobs.keys()) if runids is None else runids
+            jobs = [self.jobs[runid] for runid in runids if runid in self.jobs]
+        for job in jobs:
+            if not job.done.wait(timeout):
+                return False
+        return True
+
+    def getStatus(self):
+        """
+        Counts of queued and running jobs and the capacity in use
+        """
+        with self.lock:
+            running = list(self.running.values())
+            return {
+                "queued"        : len(self.pending),
+                "running"       : len(running),
+                "maxjobs"       : self.maxjobs,
+                "cpus"          : self.cpus,
+                "cpusused"      : sum(job.cpus for job in running),
+                "memory"        : self.memory,
+                "memoryused"    : sum(job.memory for job in running),
+            }
@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Runs hex scripts as Slurm batch jobs
+
+| Scripts are composed as for the BashSystem, with #SBATCH directives for the
+| resources the jobs need, and submitted with sbatch.  The Slurm job id is the
+| run's jobid.  Runs are QUEUED while the job is pending and RUNNING while it
+| runs; their status is brought up to date in bulk, with one squeue call for
+| all of the jobs and one sacct call for those that squeue no longer knows.
+
+@date      : 2026-10-18 21:04:12
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import time
+import shlex
+import logging
+from subprocess import Popen, PIPE
+from datetime import datetime
+from hex import __version__, UserException
+from hex.system.bashsystem import BashSystem
+from hex.system.liveness import LOST_STATUS
+from hex.system.streams import FileFollower, consoleSinks
+
+# Seconds between squeue / sacct polls while waiting for jobs
+DEFAULT_POLL_INTERVAL = 10
+
+# Slurm job states, as reported by squeue and sacct, that are still waiting to run
+# or running.  Every other state is final.
+SLURM_QUEUED_STATES = ["PENDING","REQUEUED","REQUEUE_HOLD","REQUEUE_FED","RESV_DEL_HOLD"]
+SLURM_RUNNING_STATES = ["RUNNING","CONFIGURING","COMPLETING","SUSPENDED","STOPPED","SIGNALING","STAGE_OUT","RESIZING"]
+
+# Reported for a job that neither squeue nor sacct knows about
+SLURM_UNKNOWN_STATE = "UNKNOWN"
+
+# A job can leave the queue before slurmdbd has written its accounting record,
+# so an UNKNOWN job keeps its status until it has been UNKNOWN for this many
+# seconds (and at least two polls).  Then its run is LOST.
+DEFAULT_UNKNOWN_GRACE = 300
+
+# Run log field with the time (seconds since the epoch) a job was first UNKNOWN
+UNKNOWN_SINCE_FIELD = "slurmunknownsince"
+FINAL_STATUSES = ("COMPLETED",LOST_STATUS)
+
+SLURM_SCRIPT_TEMPLATE = """#!%s
+{comment}
+
+{content}
+"""
+
+logger = logging.getLogger("hex")
+
+
+def getRunStatus(state):
+    """
+    Run log status for a Slurm job state
+    """
+    if state in SLURM_QUEUED_STATES:
+        return "QUEUED"
+    if state in SLURM_RUNNING_STATES:
+        return "RUNNING"
+    return "COMPLETED"
+
+
+class SlurmSystem(BashSystem):
+    """
+    Submits scripts to Slurm with sbatch.
+
+    partition, timelimit (e.g. "1:00:00"), memory (e.g. "4G"), cpus (per task)
+    and account become #SBATCH directives in each script; sbatchargs is a list of
+    any other sbatch options, e.g. ["--qos=short"].  The sbatch, squeue and sacct
+    commands are found on the PATH.
+
+    execute() waits for its job to finish, following its output if monitor is set.
+    launch() returns as soon as the job is submitted.  map() submits the commands
+    as one job array, with at most concurrency tasks running at once.
+
+    Slurm writes the output files itself, so they can't be compressed, capped or
+    rotated, and there are no output events; queued, started and finished events
+    come from the run logs as they are updated.
+
+    A run whose job neither squeue nor sacct knows about is marked LOST (and
+    FAIL) only once it has been unknown for unknowngrace seconds.
+    """
+    def __init__(self,runlogger=None,partition=None,timelimit=None,memory=None,cpus=None,account=None,sbatchargs=None,pollinterval=DEFAULT_POLL_INTERVAL,
+                 unknowngrace=DEFAULT_UNKNOWN_GRACE,**kwargs):
+        super(SlurmSystem,self).__init__(runlogger=runlogger,**kwargs)
+        if self.isCapturing():
+            raise UserException("Slurm jobs write their own output files, so they can't be compressed, capped or rotated")
+        self.partition = partition
+        self.timelimit = timelimit
+        self.memory = memory
+        self.cpus = cpus
+        self.account = account
+        self.sbatchargs = list(sbatchargs or [])
+        self.pollinterval = pollinterval
+        self.unknowngrace = unknowngrace
+        self.default_template = SLURM_SCRIPT_TEMPLATE % self.interpreter
+
+    def defaultComment(self):
+        return "Slurm batch script composed by hex version %s on %s" % (__version__,str(datetime.now()))
+
+    def getDirectives(self):
+        """
+        #SBATCH lines for the resources requested from Slurm
+        """
+        options = [
+            ("partition",self.partition),
+            ("time",self.timelimit),
+            ("mem",self.memory),
+            ("cpus-per-task",self.cpus),
+            ("account",self.account),
+        ]
+        directives = ["#SBATCH --%s=%s" % (name,value) for name, value in options if value is not None]
+        return directives + ["#SBATCH %s" % arg for arg in self.sbatchargs]
+
+    def compose(self,**kwargs):
+        """
+        Composes a Slurm batch script.  The #SBATCH directives go ahead of the
+        content so that sbatch reads them.
+        """
+        if "content" not in kwargs:
+            raise UserException("SlurmSystem compose requires a content keyword argument.")
+        directives = self.getDirectives()
+        if directives:
+            kwargs["content"] = "\n".join(directives) + "\n\n" + kwargs["content"]
+        return super(SlurmSystem,self).compose(**kwargs)
+
+    def runCommand(self,args,env=None):
+        """
+        Run a Slurm command and return (returncode, stdout, stderr)
+        """
+        try:
+            proc = Popen(args,stdout=PIPE,stderr=PIPE,env=env)
+        except OSError as e:
+            raise UserException("Unable to run %s: %s" % (args[0],str(e)))
+        stdout, stderr = proc.communicate()
+        return proc.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+    def sbatch(self,scriptfilepath,options=None,env=None,scriptargs=None):
+        """
+        Submit a script with sbatch and return the Slurm job id.  options are
+        added to the sbatch command line, and scriptargs are passed to the script.
+        """
+        args = ["sbatch","--parsable"] + list(options or []) + [scriptfilepath] + list(scriptargs or [])
+        returncode, stdout, stderr = self.runCommand(args,env)
+        if returncode != 0:
+            raise Exception("sbatch of %s failed: %s" % (scriptfilepath,stderr.strip()))
+        # --parsable prints jobid or jobid;cluster
+        return stdout.strip().split(";")[0]
+
+    def getOutputOptions(self,stdoutfile,stderrfile,cwd=None):
+        """
+        sbatch options that send output to the files, which are created now so
+        that they can be followed from the start, and set the working directory
+        """
+        options = ["--open-mode=append"]
+        for option, path in [("--output",stdoutfile),("--error",stderrfile)]:
+            open(path,"w").close()
+            options.append("%s=%s" % (option,path))
+        if cwd is not None:
+            options.append("--chdir=%s" % cwd)
+        return options
+
+    def executeScript(self,scriptfilepath,runid=None,stdoutfile=None,stderrfile=None,cmd=None,monitor=True,onstart=None,cwd=None,env=None,sinks=None,parentrunid=None,wait=True,
+                      scriptargs=None):
+        """
+        Submits the script and, if wait is set, waits for the job to finish.
+        Returns the runid.
+
+        The run log is saved as soon as the job is submitted, and onstart is
+        called with the runid then.  If monitor is set, the output files are
+        followed and written to the console (or the (stdout, stderr) sinks)
+        while waiting.  The job gets the submitting environment, or env.
+        scriptargs are passed to the script.
+        """
+        if runid is None:
+            runid = self.runlogger.newRunId(cmd=cmd)
+        stdoutfile, stderrfile = self.getOutputFiles(runid,stdoutfile,stderrfile)
+        options = ["--job-name=%s" % runid] + self.getOutputOptions(stdoutfile,stderrfile,cwd)
+        jobid = self.sbatch(scriptfilepath,options,env,scriptargs)
+
+        runlog = self.createRunLog(scriptfilepath,jobid,runid,stdoutfile,stderrfile,cmd,status="QUEUED",parentrunid=parentrunid,scriptargs=scriptargs)
+        runid = self.runlogger.save(runlog)
+        if onstart is not None:
+            onstart(runid)
+        if not wait:
+            return runid
+
+        if monitor:
+            outsink, errsink = sinks or consoleSinks()
+            follower = FileFollower()
+            follower.add(stdoutfile,outsink)
+            follower.add(stderrfile,errsink)
+            try:
+                follower.follow(self.getPoller([runid]))
+            finally:
+                for sink in [outsink,errsink]:
+                    sink.close()
+        else:
+            self.waitForRuns([runid])
+        return runid
+
+    def launch(self,cmds,stdoutfile=None,stderrfile=None,runid=None,monitor=False):
+        """
+        Submit command(s) and return the runid without waiting for the job
+        """
+        if isinstance(cmds,str):
+            cmds = [cmds]
+        cmdstr = "\n".join(cmds)
+        if runid is None:
+            runid = self.runlogger.newRunId(cmd=cmdstr)
+        scriptfilepath = self.makeScriptFile(self.compose(content=cmdstr),runid=runid)
+        return self.executeScript(scriptfilepath,runid,stdoutfile,stderrfile,cmdstr,monitor=False,wait=False)
+
+    def submitArray(self,cmdslist,concurrency=None,sharedscript=False):
+        """
+        Submit many commands as a single job array and return their runids, in
+        the same order, without waiting.  Each command gets its own run and
+        script; its jobid is the array task, e.g. 1234_5.  If sharedscript is
+        set, the commands share one batch script instead (see makeBatchScript),
+        which each task runs with its index, unless the batch script does not
+        parse.
+        """
+        if concurrency is not None and concurrency < 1:
+            raise UserException("Concurrency must be at least 1, not %s" % str(concurrency))
+        if not cmdslist:
+            return []
+        runlogs = []
+        cases = []
+        batchpath = self.makeBatchScript(cmdslist) if sharedscript else None
+        for i, cmds in enumerate(cmdslist):
+            if isinstance(cmds,str):
+                cmds = [cmds]
+            cmdstr = "\n".join(cmds)
+            runid = self.runlogger.newRunId(cmd=cmdstr)
+            if batchpath is None:
+                scriptfilepath, scriptargs = self.makeScriptFile(self.compose(content=cmdstr),runid=runid), []
+            else:
+                scriptfilepath, scriptargs = batchpath, [str(i)]
+            stdoutfile, stderrfile = self.getOutputFiles(runid)
+            runlogs.append(self.createRunLog(scriptfilepath,None,runid,stdoutfile,stderrfile,cmdstr,status="QUEUED",scriptargs=scriptargs))
+            command = " ".join(shlex.quote(arg) for arg in [self.interpreter,scriptfilepath] + scriptargs)
+            cases.append("    %d) exec %s > %s 2> %s ;;" % (i,command,shlex.quote(stdoutfile),shlex.quote(stderrfile)))
+
+        content = 'case "$SLURM_ARRAY_TASK_ID" in\n%s\nesac' % "\n".join(cases)
+        driverpath = self.makeScriptFile(self.compose(content=content,comment="hex job array of %d commands" % len(cmdslist)))
+        array = "--array=0-%d" % (len(cmdslist) - 1)
+        if concurrency is not None:
+            array += "%%%d" % concurrency
+        jobid = self.sbatch(driverpath,[array,"--job-name=hex-array","--output=/dev/null","--error=/dev/null"])
+
+        runids = []
+        for i, runlog in enumerate(runlogs):
+            runlog["jobid"] = "%s_%d" % (jobid,i)
+            runids.append(self.runlogger.save(runlog))
+        return runids
+
+    def map(self,cmdslist,concurrency=None,monitor=False,sharedscript=False):
+        """
+        Run many commands as one job array and wait for all of them.  Returns
+        the runids in the same order as cmdslist.
+        """
+        runids = self.submitArray(cmdslist,concurrency,sharedscript)
+        self.waitForRuns(runids)
+        return runids
+
+    def getJobStates(self,jobids):
+        """
+        Return {jobid : (state, exitcode)} for the Slurm jobs, with one squeue
+        call and, for jobs that have left the queue, one sacct call.  exitcode
+        is None until the job has finished.  Jobs that neither command knows
+        about get the state UNKNOWN.
+        """
+        jobids = sorted(set(str(jobid) for jobid in jobids))
+        states = {}
+        if not jobids:
+            return states
+
+        returncode, stdout, stderr = self.runCommand(["squeue","--noheader","--array","--jobs=%s" % ",".join(jobids),"--format=%i|%T"])
+        if returncode != 0:
+            # squeue fails if none of the jobs are still known
+            logger.debug("squeue failed: %s" % stderr.strip())
+        for line in stdout.splitlines():
+            fields = line.strip().split("|")
+            if len(fields) == 2 and fields[0] in jobids:
+                states[fields[0]] = (fields[1],None)
+
+        finished = [jobid for jobid in jobids if jobid not in states]
+        if finished:
+            returncode, stdout, stderr = self.runCommand(["sacct","--noheader","--parsable2","--allocations","--jobs=%s" % ",".join(finished),"--format=JobID,State,ExitCode"])
+            if returncode != 0:
+                logger.warning("sacct failed: %s" % stderr.strip())
+            for line in stdout.splitlines():
+                fields = line.strip().split("|")
+                if len(fields) != 3 or fields[0] not in finished:
+                    continue
+                # e.g. "CANCELLED by 1234" and "0:15" (exit code:signal)
+                state = fields[1].split(" ")[0]
+                exitcode = None
+                if getRunStatus(state) == "COMPLETED":
+                    try:
+                        exitcode = int(fields[2].split(":")[0])
+                    except ValueError:
+                        exitcode = None
+                states[fields[0]] = (state,exitcode)
+
+        for jobid in jobids:
+            states.setdefault(jobid,(SLURM_UNKNOWN_STATE,None))
+        return states
+
+    def updateRunLogs(self,runids):
+        """
+        Bring the QUEUED and RUNNING run logs of the runids up to date with Slurm
+        and return all of the run logs.  A finished job SUCCEEDs only if Slurm says
+        it COMPLETED with exit code 0.
+
+        The first time a job is UNKNOWN the time is recorded in its run log, and
+        the run keeps its status.  If it is still UNKNOWN unknowngrace seconds
+        later, the run is LOST.
+        """
+        runlogs = [self.runlogger.get(runid) for runid in runids]
+        active = [runlog for runlog in runlogs if runlog.get("status") in ("QUEUED","RUNNING") and runlog.get("jobid") is not None]
+        states = self.getJobStates([runlog["jobid"] for runlog in active])
+        for runlog in active:
+            state, exitcode = states[str(runlog["jobid"])]
+            if state == SLURM_UNKNOWN_STATE:
+                since = runlog.get(UNKNOWN_SINCE_FIELD)
+                if since is None:
+                    runlog[UNKNOWN_SINCE_FIELD] = time.time()
+                    self.runlogger.save(runlog)
+                    continue
+                if time.time() - since < self.unknowngrace:
+                    continue
+                logger.warning("Slurm has no record of job %s for run %s; marking it LOST" % (runlog["jobid"],runlog["runid"]))
+                runlog["status"] = LOST_STATUS
+                runlog["endtime"] = datetime.now()
+                runlog["result"] = "FAIL"
+                self.runlogger.save(runlog)
+                continue
+
+            status = getRunStatus(state)
+            if status == runlog["status"] and UNKNOWN_SINCE_FIELD not in runlog:
+                continue
+            runlog.pop(UNKNOWN_SINCE_FIELD,None)
+            runlog["status"] = status
+            if status == "COMPLETED":
+                runlog["endtime"] = datetime.now()
+                runlog["result"] = "SUCCESS" if state == "COMPLETED" and exitcode == 0 else "FAIL"
+            self.runlogger.save(runlog)
+        return runlogs
+
+    def getPoller(self,runids):
+        """
+        Return a function that is True once all of the runs are COMPLETED or
+        LOST.  It checks with Slurm at most every pollinterval seconds.
+        """
+        state = {"last" : None, "done" : False}
+
+        def done():
+            if not state["done"] and (state["last"] is None or time.time() - state["last"] >= self.pollinterval):
+                state["last"] = time.time()
+                state["done"] = all(runlog.get("status") in FINAL_STATUSES for runlog in self.updateRunLogs(runids))
+            return state["done"]
+        return done
+
+    def waitForRuns(self,runids):
+        """
+        Wait until all of the runs are COMPLETED or LOST
+        """
+        done = self.getPoller(runids)
+        while not done():
+            time.sleep(self.pollinterval)
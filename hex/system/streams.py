@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+
+"""
+Stream handling for systems
+
+| OutputPump multiplexes the stdout / stderr pipes of a child process with
+| selectors so that neither pipe can fill up while the other is being read.
+| FileFollower streams output files as they grow, using inotify where it is
+| available and exponential backoff polling otherwise.
+
+@date      : 2026-10-18 09:12:40
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+"""
+import os
+import sys
+import time
+import errno
+import codecs
+import select
+import selectors
+import ctypes
+import ctypes.util
+
+# Pipes are read in chunks of this many bytes
+DEFAULT_CHUNK_SIZE = 65536
+
+# Bounds for the polling interval used when following files.  MAX_FOLLOW_WAIT
+# is also the longest a follower goes without checking whether it is done.
+MIN_FOLLOW_WAIT = 0.01
+MAX_FOLLOW_WAIT = 1.0
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+class ConsoleWriter(object):
+    """
+    Writes raw bytes to a console stream (e.g. sys.stdout).
+
+    If the stream has an underlying binary buffer, bytes are written directly.
+    Otherwise they are decoded incrementally so that multibyte characters
+    split across chunks are not mangled.
+    """
+    def __init__(self,stream):
+        self.stream = stream
+        self.buffer = getattr(stream,"buffer",None)
+        self.decoder = None
+        if self.buffer is None:
+            self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(self,data):
+        if self.buffer is not None:
+            self.stream.flush()
+            self.buffer.write(data)
+            self.buffer.flush()
+        else:
+            self.stream.write(self.decoder.decode(data))
+            self.stream.flush()
+
+    def close(self):
+        if self.decoder is not None:
+            self.stream.write(self.decoder.decode(b"",final=True))
+            self.stream.flush()
+
+
+class OutputPump(object):
+    """
+    Copies data from one or more pipes to sinks until every pipe reaches EOF.
+
+    Each source is a file object (or file descriptor) and each sink is any object
+    with a write(bytes) method.  The pump blocks in select() while the child is
+    idle, so it costs no CPU, and because it runs until EOF rather than until the
+    process exits, output written just before exit is never dropped.
+    """
+    def __init__(self,chunksize=DEFAULT_CHUNK_SIZE):
+        self.chunksize = chunksize
+        self.selector = selectors.DefaultSelector()
+
+    def register(self,source,*sinks):
+        """
+        Register a pipe to be pumped into the sinks.
+        """
+        fd = source if isinstance(source,int) else source.fileno()
+        os.set_blocking(fd,False)
+        self.selector.register(fd,selectors.EVENT_READ,sinks)
+
+    def hasSources(self):
+        """
+        True if any registered source has not reached EOF
+        """
+        return len(self.selector.get_map()) > 0
+
+    def pumpOnce(self,timeout=None):
+        """
+        Wait up to timeout seconds for data and copy whatever is available.
+        Returns False once all sources have reached EOF.
+        """
+        if not self.hasSources():
+            return False
+        for key, _ in self.selector.select(timeout):
+            try:
+                data = os.read(key.fd,self.chunksize)
+            except BlockingIOError:
+                continue
+            if not data:
+                self.selector.unregister(key.fd)
+                continue
+            for sink in key.data:
+                sink.write(data)
+        return self.hasSources()
+
+    def run(self):
+        """
+        Pump until every source is at EOF.
+        """
+        try:
+            while self.pumpOnce():
+                pass
+        finally:
+            self.selector.close()
+
+
+class Inotify(object):
+    """
+    Minimal ctypes wrapper around the Linux inotify API.
+
+    Only used to wake up a FileFollower when one of its files is written or closed.
+    """
+    _libc = None
+
+    @classmethod
+    def libc(cls):
+        if cls._libc is None:
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",use_errno=True)
+                libc.inotify_init1
+                cls._libc = libc
+            except (OSError, AttributeError):
+                cls._libc = False
+        return cls._libc
+
+    @classmethod
+    def available(cls):
+        return bool(cls.libc())
+
+    def __init__(self):
+        libc = self.libc()
+        if not libc:
+            raise OSError(errno.ENOSYS,"inotify is not available")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err,os.strerror(err))
+
+    def watch(self,path,mask=IN_MODIFY | IN_CLOSE_WRITE):
+        wd = self.libc().inotify_add_watch(self.fd,os.fsencode(path),mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err,os.strerror(err),path)
+        return wd
+
+    def wait(self,timeout,otherfds=()):
+        """
+        Wait up to timeout seconds for an event, or for any of otherfds to become readable.
+        Returns True if anything happened.
+        Pending events are discarded; the caller just re-reads its files.
+        """
+        ready, _, _ = select.select([self.fd] + list(otherfds),[],[],timeout)
+        if not ready:
+            return False
+        if self.fd not in ready:
+            return True
+        try:
+            while os.read(self.fd,4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class FileFollower(object):
+    """
+    Follows one or more files, copying new bytes to sinks as the files grow.
+
+    Between reads the follower sleeps on inotify if available, otherwise it polls
+    with a wait that doubles from minwait up to maxwait and resets whenever
+    new data shows up.  Either way an idle follower uses no CPU to speak of.
+
+    If a file is renamed away and a new one created at its path, as when a
+    CaptureWriter rotates its output, the rest of the old file is copied and the
+    follower carries on with the new one from its beginning.  If the file was
+    added with a segments function, any segments rotated out since are copied
+    in between.
+    """
+    def __init__(self,chunksize=DEFAULT_CHUNK_SIZE,minwait=MIN_FOLLOW_WAIT,maxwait=MAX_FOLLOW_WAIT,useinotify=True):
+        self.chunksize = chunksize
+        self.minwait = minwait
+        self.maxwait = maxwait
+        self.files = []
+        self.inotify = None
+        if useinotify and Inotify.available():
+            try:
+                self.inotify = Inotify()
+            except OSError:
+                self.inotify = None
+
+    def add(self,path,*sinks,segments=None):
+        """
+        Follow path, writing its contents to sinks.  Reading starts at the beginning of the file.
+
+        segments, e.g. hex.runlog.getSegmentPaths, returns the paths that path's
+        output is rotated through, oldest first.
+        """
+        f = open(path,"rb")
+        self.watch(path)
+        self.files.append([path,f,sinks,segments])
+
+    def watch(self,path):
+        if self.inotify is not None:
+            try:
+                self.inotify.watch(path)
+            except OSError:
+                # Fall back to polling for everything
+                self.inotify.close()
+                self.inotify = None
+
+    def reopen(self,entry):
+        """
+        If the file at entry's path is no longer the one being read, return the
+        files that follow it, opened and oldest first.  Otherwise an empty list.
+        """
+        path, f, sinks, segments = entry
+        try:
+            if os.stat(path).st_ino == os.fstat(f.fileno()).st_ino:
+                return []
+        except FileNotFoundError:
+            # Renamed, but the new file is not there yet
+            return []
+        files = []
+        for segment in (segments(path) if segments is not None else [path]):
+            try:
+                files.append(open(segment,"rb"))
+            except FileNotFoundError:
+                pass
+        inode = os.fstat(f.fileno()).st_ino
+        for i, newf in enumerate(files):
+            if os.fstat(newf.fileno()).st_ino == inode:
+                for done in files[:i + 1]:
+                    done.close()
+                files = files[i + 1:]
+                break
+        if files:
+            self.watch(path)
+        return files
+
+    def copy(self,f,sinks):
+        found = False
+        while True:
+            data = f.read(self.chunksize)
+            if not data:
+                return found
+            found = True
+            for sink in sinks:
+                sink.write(data)
+
+    def readAvailable(self):
+        """
+        Copy whatever has been appended to the files since the last read,
+        moving on to a new file where one has replaced a followed path.
+        Returns True if anything was read.
+        """
+        found = False
+        for entry in self.files:
+            found = self.copy(entry[1],entry[2]) or found
+            files = self.reopen(entry)
+            while files:
+                # The old file may have been written to after the copy above
+                self.copy(entry[1],entry[2])
+                entry[1].close()
+                for f in files[:-1]:
+                    self.copy(f,entry[2])
+                    f.close()
+                entry[1] = files[-1]
+                self.copy(entry[1],entry[2])
+                found = True
+                files = self.reopen(entry)
+        return found
+
+    def follow(self,done,wakefd=None):
+        """
+        Stream the files until done() returns True, then drain anything left.
+
+        done is checked after every wakeup, so it should be cheap or throttle itself.
+        If wakefd is set (e.g. a pidfd for the process writing the files), the
+        follower also wakes up as soon as it becomes readable.
+        """
+        wait = self.minwait
+        try:
+            while True:
+                finished = done()
+                if self.readAvailable():
+                    wait = self.minwait
+                if finished:
+                    break
+                if self.inotify is not None:
+                    self.inotify.wait(self.maxwait,[] if wakefd is None else [wakefd])
+                else:
+                    time.sleep(wait)
+                    wait = min(wait * 2,self.maxwait)
+        finally:
+            self.close()
+
+    def close(self):
+        for path, f, sinks, segments in self.files:
+            f.close()
+        self.files = []
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+
+def openPidFd(pid):
+    """
+    Return a pidfd for the process, which becomes readable when it exits, or None
+    if pidfds are not supported here.
+    """
+    if not hasattr(os,"pidfd_open"):
+        return None
+    try:
+        return os.pidfd_open(pid)
+    except OSError:
+        return None
+
+
+def consoleSinks(stdout=None,stderr=None):
+    """
+    Return ConsoleWriters for the given streams, defaulting to sys.stdout / sys.stderr
+    """
+    return ConsoleWriter(stdout or sys.stdout), ConsoleWriter(stderr or sys.stderr)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+"""
+Helpers shared by the hex tests
+
+@date      : 2026-10-19 09:12:44
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+
+
+class BytesSink(object):
+    """
+    Output sink that keeps everything written to it in data
+    """
+    def __init__(self):
+        self.data = b""
+
+    def write(self,data):
+        self.data += data
+
+    def close(self):
+        pass
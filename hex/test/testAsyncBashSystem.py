@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+AsyncBashSystem tests
+
+@date      : 2026-10-18 12:10:44
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import time
+import asyncio
+from unittest import mock
+from hex.system import AsyncBashSystem, getSystem
+from hex.system import bashsystem
+from hex.runlog import DefaultRunLogger
+
+ASYNC_RUNLOG_PATH = "/tmp/asyncrunlogsfortesting"
+SCRIPT_PATH = os.path.join(ASYNC_RUNLOG_PATH,"scripts")
+
+
+class TestAsyncBashSystem(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % ASYNC_RUNLOG_PATH)
+        self.bash = AsyncBashSystem(runlogger=DefaultRunLogger(pathname=ASYNC_RUNLOG_PATH))
+        # Keep temporary scripts out of ~/.hex/bashscripts
+        self.scriptdir = mock.patch.object(bashsystem,"DEFAULT_BASH_SCRIPTDIR",SCRIPT_PATH)
+        self.scriptdir.start()
+
+    def tearDown(self):
+        self.scriptdir.stop()
+        os.system("rm -rf %s" % ASYNC_RUNLOG_PATH)
+
+    def testGetSystem(self):
+        """
+        The async system should be available through getSystem
+        """
+        system = getSystem("asyncbash")
+        self.assertTrue(isinstance(system,AsyncBashSystem),"Incorrect system class: %s" % system.__class__)
+
+    def testExecute(self):
+        """
+        Execute a command with AsyncBashSystem.execute and check the run log and output files
+        """
+        outstr = "Stdout"
+        errstr = "Stderr"
+        cmd = "echo '%s' && echo '%s' >&2" % (outstr,errstr)
+        runid = asyncio.run(self.bash.execute(cmd,monitor=False))
+
+        runlog = self.bash.runlogger.get(runid)
+        self.assertTrue(runlog["system"] == "hex.system.asyncbashsystem.AsyncBashSystem", "Incorrect system: %s" % runlog["system"])
+        self.assertTrue(runlog["status"] == "COMPLETED", "Incorrect status: %s" % runlog["status"])
+        self.assertTrue(runlog["result"] == "SUCCESS","Incorrect result: %s" % runlog["result"])
+        with open(runlog["stdoutfile"],"r") as f:
+            stdout = f.read()
+        self.assertTrue(stdout == outstr + "\n", "Incorrect stdout: %s" % stdout)
+        with open(runlog["stderrfile"],"r") as f:
+            stderr = f.read()
+        self.assertTrue(stderr == errstr + "\n", "Incorrect stderr: %s" % stderr)
+
+    def testLaunchAndWaitMany(self):
+        """
+        Launch many sleeping commands from one event loop.  They should run concurrently,
+        be RUNNING right after launch, and be COMPLETED after wait.
+        """
+        async def run():
+            runids = []
+            for i in range(20):
+                runids.append(await self.bash.launch(["sleep 1","exit %d" % (i % 2)]))
+            running = [self.bash.runlogger.get(runid)["status"] for runid in runids]
+            runlogs = [await self.bash.wait(runid) for runid in runids]
+            return running, runlogs
+
+        start = time.time()
+        running, runlogs = asyncio.run(run())
+        elapsed = time.time() - start
+
+        self.assertTrue(elapsed < 10,"Launched commands did not run concurrently: %.1f seconds" % elapsed)
+        self.assertTrue(set(running) == set(["RUNNING"]),"Incorrect status after launch: %s" % running)
+        for i, runlog in enumerate(runlogs):
+            self.assertTrue(runlog["status"] == "COMPLETED","Command not completed! \n%s" % str(runlog))
+            expected = "SUCCESS" if i % 2 == 0 else "FAIL"
+            self.assertTrue(runlog["result"] == expected,"Incorrect result!\n%s" % str(runlog))
+
+    def testMapWithSharedScript(self):
+        """
+        map with sharedscript should run each command from one batch script
+        """
+        runids = asyncio.run(self.bash.map(["echo %d" % i for i in range(3)] + ["exit 1"],concurrency=2,sharedscript=True))
+        runlogs = [self.bash.runlogger.get(runid) for runid in runids]
+        self.assertTrue(len(set(runlog["scriptfilepath"] for runlog in runlogs)) == 1,"Jobs did not share a script")
+        self.assertTrue([runlog["result"] for runlog in runlogs] == ["SUCCESS"] * 3 + ["FAIL"],"Incorrect results: %s" % runlogs)
+        with open(runlogs[1]["stdoutfile"]) as f:
+            self.assertTrue(f.read() == "1\n","Incorrect output")
+
+        runids = asyncio.run(self.bash.map(["echo 0","if then","echo 2"],concurrency=2,sharedscript=True))
+        runlogs = [self.bash.runlogger.get(runid) for runid in runids]
+        self.assertTrue(len(set(runlog["scriptfilepath"] for runlog in runlogs)) == 3,"Jobs shared a broken script")
+        self.assertTrue([runlog["result"] for runlog in runlogs] == ["SUCCESS","FAIL","SUCCESS"],"Incorrect results with a broken command: %s" % runlogs)
@@ -10,27 +10,35 @@ BashSystem tests
 @license   : GPLv2
 
 """
-import unittest, os
+import unittest, os, io
 import time
+from unittest import mock
 from hex.system import BashSystem
+from hex.system import bashsystem
+from hex.system.bashsystem import pruneScripts, getScriptTemplate
 from hex.runlog import DefaultRunLogger
 
 NON_DEFAULT_RUNLOG_PATH = "/tmp/runlogsfortesting"
 ALTERNATE_RUNLOG_PATH = "/tmp/altrunlog"
+SCRIPT_PATH = "/tmp/bashscriptsfortesting"
 
 
 class TestBashSystem(unittest.TestCase):
 
     def setUp(self):
-        for d in [NON_DEFAULT_RUNLOG_PATH,ALTERNATE_RUNLOG_PATH]:
+        for d in [NON_DEFAULT_RUNLOG_PATH,ALTERNATE_RUNLOG_PATH,SCRIPT_PATH]:
             try:
                 os.system("rm -rf %s" % d)
                 os.makedirs(d)
             except Exception:
                 pass
+        # Keep temporary scripts out of ~/.hex/bashscripts
+        self.scriptdir = mock.patch.object(bashsystem,"DEFAULT_BASH_SCRIPTDIR",SCRIPT_PATH)
+        self.scriptdir.start()
 
     def tearDown(self):
-        for d in [NON_DEFAULT_RUNLOG_PATH,ALTERNATE_RUNLOG_PATH]:
+        self.scriptdir.stop()
+        for d in [NON_DEFAULT_RUNLOG_PATH,ALTERNATE_RUNLOG_PATH,SCRIPT_PATH]:
             try:
                 os.system("rm -rf %s" % d)
             except Exception:
@@ -58,6 +66,31 @@ We should be two comment lines in the bash script."""
         self.assertTrue("# %s" % longcomment[0:51] in script, "Script does not contain comment: \n%s" % script)
         self.assertTrue("# %s" % longcomment[52:100] in script, "Script does not contain wrapped comment line: \n%s" % script)
 
+    def testScriptTemplates(self):
+        """
+        Template files should only be read again when they change, and templates should fill in as str.format would
+        """
+        templatepath = os.path.join(ALTERNATE_RUNLOG_PATH,"template.sh")
+        with open(templatepath,"w") as f:
+            f.write("#!/bin/bash\n{comment}\nset -e\n{content}\n")
+        with mock.patch.object(bashsystem,"BASH_SYSTEM_TEMPLATE_PATH",templatepath):
+            with mock.patch("builtins.open",wraps=open) as opened:
+                systems = [BashSystem() for i in range(3)]
+            reads = [call for call in opened.call_args_list if call[0][0] == templatepath]
+            self.assertTrue(len(reads) == 1,"Template file read %d times" % len(reads))
+            script = systems[0].compose(content="echo {braces}",comment="")
+            self.assertTrue(script == "#!/bin/bash\n\nset -e\necho {braces}\n","Incorrect script: %s" % script)
+
+            with open(templatepath,"w") as f:
+                f.write("#!/bin/bash -x\n{comment}\n{content}\n")
+            os.utime(templatepath,ns=(0,0))
+            self.assertTrue(BashSystem().getTemplate().startswith("#!/bin/bash -x\n"),"Changed template file not read")
+
+        for templatestr in ["{comment}\n{{literal}}\n{content}\n","{comment!s}\n{content:>12}\n"]:
+            rendered = getScriptTemplate(templatestr).render("# comment","content")
+            self.assertTrue(rendered == templatestr.format(comment="# comment",content="content"),"Incorrect rendering: %s" % rendered)
+        self.assertTrue(getScriptTemplate(templatestr) is getScriptTemplate(templatestr),"Template not cached")
+
     def testScriptFileWithDefaultRunLogger(self):
         """
         Ensure that BashSystem.makeScriptFile creates the expected scriptfile using the DefaultRunLogger
@@ -97,6 +130,79 @@ We should be two comment lines in the bash script."""
         script = open(runlog["scriptfilepath"], "r").read()
         self.assertTrue(cmd in script, "Incorrect script contents: %s" % script)
 
+    def testExecuteRecordsResources(self):
+        """
+        The CPU and memory used by a run, and the peak memory of its process tree, should be in its run log
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        bash = BashSystem(runlogger=runlogger,memsampleinterval=0.05)
+
+        cmd = "python -c 'x = bytearray(50 * 1024 * 1024); import time; time.sleep(0.5)'"
+        runid = bash.execute(cmd)
+
+        resources = bash.runlogger.get(runid).getResourceUsage()
+        self.assertTrue(resources["usercpu"] + resources["syscpu"] > 0,"No CPU time recorded: %s" % resources)
+        self.assertTrue(resources["maxrss"] > 50 * 1024,"Incorrect maxrss: %s" % resources)
+        self.assertTrue(resources["peaktreerss"] > 50 * 1024,"Incorrect peaktreerss: %s" % resources)
+
+    def testExecuteWithResultCache(self):
+        """
+        A cached command should return the earlier runid and output until its input changes or it is invalidated
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        bash = BashSystem(runlogger=runlogger)
+        inputfile = os.path.join(ALTERNATE_RUNLOG_PATH,"input.txt")
+        with open(inputfile,"w") as f:
+            f.write("input\n")
+        cmd = "cat %s; echo $RANDOM" % inputfile
+
+        runid = bash.execute(cmd,monitor=False,cache=True,inputs=[inputfile])
+        output = open(runlogger.get(runid)["stdoutfile"]).read()
+        stdoutfile = os.path.join(ALTERNATE_RUNLOG_PATH,"cached.out")
+        cached = bash.execute(cmd,stdoutfile=stdoutfile,monitor=False,cache=True,inputs=[inputfile])
+        self.assertTrue(cached == runid,"Cached runid not returned: %s != %s" % (cached,runid))
+        self.assertTrue(open(stdoutfile).read() == output,"Cached output not copied to %s" % stdoutfile)
+        cached = bash.execute(cmd,runid=runlogger.newRunId(cmd=cmd),monitor=False,cache=True,inputs=[inputfile])
+        self.assertTrue(cached == runid,"Cached runid not returned when a runid was given: %s" % cached)
+
+        self.assertTrue(bash.invalidateCache(cmd,inputs=[inputfile]),"Cache entry not invalidated")
+        self.assertTrue(bash.execute(cmd,monitor=False,cache=True,inputs=[inputfile]) != runid,"Invalidated result reused")
+
+        runid = bash.execute(cmd,monitor=False,cache=True,inputs=[inputfile])
+        os.utime(inputfile,(time.time() + 10,) * 2)
+        self.assertTrue(bash.execute(cmd,monitor=False,cache=True,inputs=[inputfile]) != runid,"Result reused after the input changed")
+
+        failing = "exit 1"
+        self.assertTrue(bash.execute(failing,monitor=False,cache=True) != bash.execute(failing,monitor=False,cache=True),"Failed run cached")
+
+    def testExecuteWithCompressedOutput(self):
+        """
+        Compressed output should be written with a suffix and read back through the run log
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        bash = BashSystem(runlogger=runlogger,compression="gzip",maxoutputbytes=10000)
+
+        runid = bash.execute("seq 1 100000; echo done >&2",monitor=False)
+        runlog = runlogger.get(runid)
+        self.assertTrue(runlog["stdoutfile"].endswith(".out.gz"),"Incorrect stdout file: %s" % runlog["stdoutfile"])
+        self.assertTrue(os.path.getsize(runlog["stdoutfile"]) < 10000,"Output not capped and compressed")
+        stdout = runlog.getStdOutHandle().read()
+        self.assertTrue(stdout.startswith("1\n2\n") and stdout.endswith("99999\n100000\n"),"Incorrect stdout: %s" % stdout)
+        self.assertTrue(runlog.getStdErrHandle().read() == "done\n","Incorrect stderr")
+
+    def testPruneScripts(self):
+        """
+        Only temporary scripts older than the maximum age should be deleted
+        """
+        old = os.path.join(ALTERNATE_RUNLOG_PATH,"old.sh")
+        new = os.path.join(ALTERNATE_RUNLOG_PATH,"new.sh")
+        for path in [old,new]:
+            open(path,"w").close()
+        os.utime(old,(time.time() - 7200,) * 2)
+
+        self.assertTrue(pruneScripts(3600,scriptdir=ALTERNATE_RUNLOG_PATH) == [old],"Incorrect scripts pruned")
+        self.assertTrue(not os.path.exists(old) and os.path.exists(new),"Incorrect scripts left")
+
     def testExecuteWithSpecifiedRunId(self):
         """
         Execute a command with BashSystem.execute with a specified runid.
@@ -159,10 +265,127 @@ We should be two comment lines in the bash script."""
         self.assertTrue(runlog["status"] == "RUNNING","Incorrect status: %s" % runlog["status"])
         self.assertTrue("result" not in runlog.keys(), "Runlog has a result: %s" % str("runlog"))
 
-        # Wait for it...
-        time.sleep(sleepytime)
+        # Wait for it... launch returns as soon as the run starts, so allow a little time for it to finish up
+        time.sleep(sleepytime + 2)
 
         # Should be done by now.
         runlog = bash.runlogger.get(runid)
         self.assertTrue(runlog["status"] == "COMPLETED","Command not completed! \n%s" % str(runlog))
         self.assertTrue(runlog["result"] == "SUCCESS","Command failed!\n%s" % str(runlog))
+
+    def testExecuteScriptPipesLargeOutput(self):
+        """
+        Run a script with piped stdout / stderr that writes more than a pipe buffer to stderr before
+        writing to stdout.  All output, including the last lines written before exit, should reach the console.
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        bash = BashSystem(runlogger=runlogger)
+
+        cmd = "for i in $(seq 1 20000); do echo \"err line $i\" >&2; done; echo 'last stdout line'; echo -n 'no newline' >&2"
+        scriptfilepath = bash.makeScriptFile(bash.compose(content=cmd),scriptpath=os.path.join(ALTERNATE_RUNLOG_PATH,"pipes.sh"))
+
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with mock.patch("sys.stdout",stdout), mock.patch("sys.stderr",stderr):
+            runid = bash.executeScript(scriptfilepath,cmd=cmd)
+
+        runlog = bash.runlogger.get(runid)
+        self.assertTrue(runlog["result"] == "SUCCESS","Command failed!\n%s" % str(runlog))
+        self.assertTrue("last stdout line" in stdout.getvalue(),"Missing stdout: %s" % stdout.getvalue())
+        errlines = [line for line in stderr.getvalue().split("\n") if line.startswith("err line")]
+        self.assertTrue(len(errlines) == 20000,"Incorrect number of stderr lines: %d" % len(errlines))
+        self.assertTrue("no newline" in stderr.getvalue(),"Trailing stderr was dropped: %s" % stderr.getvalue()[-100:])
+
+    def testMapWithConcurrencyLimit(self):
+        """
+        Execute several commands with BashSystem.map.  Runids should come back in order and
+        no more than the concurrency limit should run at once.
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        bash = BashSystem(runlogger=runlogger)
+
+        # Each job leaves a marker file while it runs and records how many markers it saw
+        countfile = os.path.join(ALTERNATE_RUNLOG_PATH,"running")
+        cmds = []
+        for i in range(8):
+            cmds.append([
+                "touch %s.marker.%d" % (countfile,i),
+                "ls %s.marker.* | wc -l > %s.%d" % (countfile,countfile,i),
+                "sleep 0.5",
+                "echo 'job %d'" % i,
+                "rm %s.marker.%d" % (countfile,i),
+            ])
+        cmds.append("exit 1")
+
+        runids = bash.map(cmds,concurrency=2)
+        self.assertTrue(len(runids) == len(cmds),"Incorrect number of runids: %s" % runids)
+        for i, runid in enumerate(runids[:-1]):
+            runlog = bash.runlogger.get(runid)
+            self.assertTrue(runlog["result"] == "SUCCESS","Command failed!\n%s" % str(runlog))
+            stdout = open(runlog["stdoutfile"],"r").read()
+            self.assertTrue(stdout == "job %d\n" % i,"Runid %s out of order: %s" % (runid,stdout))
+            running = int(open("%s.%d" % (countfile,i),"r").read())
+            self.assertTrue(running <= 2,"Too many jobs running at once: %d" % running)
+        self.assertTrue(bash.runlogger.get(runids[-1])["result"] == "FAIL","Failed command not recorded as FAIL")
+
+    def testMapWithSharedScript(self):
+        """
+        A batch run with sharedscript should write one script that each job runs with its index
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        bash = BashSystem(runlogger=runlogger)
+        cmds = ["echo 'job %d' \"$1\"" % i for i in range(4)] + [["echo two","echo lines"],"exit 3"]
+
+        runids = bash.map(cmds,concurrency=2,sharedscript=True)
+        runlogs = [runlogger.get(runid) for runid in runids]
+        self.assertTrue(len(set(runlog["scriptfilepath"] for runlog in runlogs)) == 1,"Jobs did not share a script")
+        self.assertTrue([runlog["scriptargs"] for runlog in runlogs] == [[str(i)] for i in range(6)],"Incorrect script arguments")
+        self.assertTrue([runlog["cmd"] for runlog in runlogs[4:]] == ["echo two\necho lines","exit 3"],"Incorrect commands recorded")
+        for i, runlog in enumerate(runlogs[:4]):
+            stdout = open(runlog["stdoutfile"],"r").read()
+            self.assertTrue(stdout == "job %d \n" % i,"Incorrect output of job %d: %s" % (i,stdout))
+        self.assertTrue(open(runlogs[4]["stdoutfile"],"r").read() == "two\nlines\n","Multiple commands not run")
+        self.assertTrue(runlogs[4]["result"] == "SUCCESS" and runlogs[5]["result"] == "FAIL","Incorrect results")
+
+        # A command that breaks the batch script only fails its own job
+        for broken in ["if then","echo broken\n;;\n0)","esac"]:
+            runids = bash.map(["echo fine",broken,"echo also fine"],concurrency=2,sharedscript=True)
+            runlogs = [runlogger.get(runid) for runid in runids]
+            self.assertTrue(len(set(runlog["scriptfilepath"] for runlog in runlogs)) == 3,"Jobs shared a broken script")
+            self.assertTrue([runlog["result"] for runlog in runlogs] == ["SUCCESS","FAIL","SUCCESS"],"Incorrect results with %r: %s" % (broken,runlogs))
+            self.assertTrue(open(runlogs[2]["stdoutfile"],"r").read() == "also fine\n","Incorrect output after a broken command")
+
+    def testLaunchReturnsQuickly(self):
+        """
+        BashSystem.launch should return as soon as the run log is saved and record the launch latency
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        bash = BashSystem(runlogger=runlogger)
+
+        start = time.time()
+        runids = [bash.launch("sleep 2") for i in range(3)]
+        elapsed = time.time() - start
+        self.assertTrue(elapsed < 2,"Launches took too long: %.2f seconds" % elapsed)
+        for runid in runids:
+            runlog = bash.runlogger.get(runid)
+            self.assertTrue(runlog["status"] == "RUNNING","Incorrect status: %s" % runlog["status"])
+
+        stats = bash.getLaunchStats()
+        self.assertTrue(stats["count"] == 3,"Incorrect launch count: %s" % str(stats))
+        self.assertTrue(0 < stats["mean"] <= stats["max"] < 2,"Incorrect launch latencies: %s" % str(stats))
+
+    def testLaunchFailsFast(self):
+        """
+        BashSystem.launch should raise the child's error right away if the run log cannot be saved
+        """
+        class BrokenRunLogger(DefaultRunLogger):
+            def save(self,runlog):
+                raise Exception("Runlog storage is broken")
+
+        bash = BashSystem(runlogger=BrokenRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH))
+        start = time.time()
+        with self.assertRaises(Exception) as cm:
+            bash.launch("hostname")
+        elapsed = time.time() - start
+        self.assertTrue("Runlog storage is broken" in str(cm.exception),"Incorrect launch error: %s" % str(cm.exception))
+        self.assertTrue(elapsed < 2,"Launch failure took too long: %.2f seconds" % elapsed)
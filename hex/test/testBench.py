@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark suite tests
+
+@date      : 2026-10-18 23:31:08
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import json
+from hex import UserException
+from hex.bench import runBenchmarks, compareResults, summarize
+
+BENCH_PATH = "/tmp/benchfortesting"
+
+
+class BenchTest(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % BENCH_PATH)
+        os.makedirs(BENCH_PATH)
+
+    def tearDown(self):
+        os.system("rm -rf %s" % BENCH_PATH)
+
+    def testRunBenchmarks(self):
+        """
+        Each benchmark should add its measurements, and the report should be JSON
+        """
+        report = runBenchmarks(["execute","launch","runlogger","sqlrunlogger","startup"],count=2,sizes=[5],workdir=BENCH_PATH)
+        results = json.loads(json.dumps(report))["results"]
+        for name in ["subprocess.noop","execute.noop","execute.output.monitored","launch.noop","python.start","cli.exec.noop"]:
+            self.assertTrue(results[name]["count"] == 2 and results[name]["median"] > 0,"Incorrect %s measurement: %s" % (name,results.get(name)))
+        for name in ["execute.noop.overhead","cli.version.overhead"]:
+            self.assertTrue("median" in results[name],"Missing overhead %s" % name)
+        for name in ["defaultrunlogger.newrunid.5","defaultrunlogger.save.5","defaultrunlogger.get.5","sqlrunlogger.save.5"]:
+            self.assertTrue(results[name]["count"] == 5 and results[name]["rate"] > 0,"Incorrect %s measurement: %s" % (name,results.get(name)))
+        self.assertTrue(results["launch.noop.complete"]["count"] == 2,"Launched runs not timed")
+        self.assertTrue(os.listdir(BENCH_PATH) == [],"Work directory not cleaned up")
+
+        with self.assertRaises(UserException):
+            runBenchmarks(["nonsense"])
+
+    def testCompareResults(self):
+        """
+        Only changes larger than the threshold should be reported
+        """
+        baseline = {"results" : {"execute.noop" : summarize([1.0,1.0,1.0]),"gone" : {"median" : 1.0}}}
+        report = {"results" : {"execute.noop" : summarize([1.05,1.05,1.5]),"new" : {"median" : 1.0}}}
+        changes = compareResults(baseline,report,threshold=0.1)
+        self.assertTrue([(name,statistic) for name, statistic, old, new, change in changes] == [("execute.noop","total")],"Incorrect changes: %s" % changes)
+        self.assertTrue(abs(changes[0][4] - 0.2) < 1e-9,"Incorrect change: %s" % changes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+Output capture tests
+
+@date      : 2026-10-18 17:48:10
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import io
+import gzip
+import time
+import threading
+from unittest import mock
+from hex.runlog import capture, DefaultRunLogger
+from hex.runlog.capture import CaptureWriter, openCapture, getSegmentPaths
+from hex.subcommand import hextail
+from hex.system import bashsystem
+from hex.system.bashsystem import BashSystem
+from hex.system.streams import FileFollower
+from hex.test.helpers import BytesSink
+
+CAPTURE_PATH = "/tmp/capturefortesting"
+
+
+class CaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % CAPTURE_PATH)
+        os.makedirs(CAPTURE_PATH)
+
+    def tearDown(self):
+        os.system("rm -rf %s" % CAPTURE_PATH)
+
+    def writeCapture(self,filename,chunks,**kwargs):
+        path = os.path.join(CAPTURE_PATH,filename)
+        writer = CaptureWriter(path,**kwargs)
+        for chunk in chunks:
+            writer.write(chunk)
+        writer.close()
+        return path
+
+    def testGzipRoundTrip(self):
+        """
+        gzip output should be compressed on disk and read back as text
+        """
+        lines = [("line %d\n" % i).encode() for i in range(1000)]
+        path = self.writeCapture("run-stdout.out.gz",lines)
+        with gzip.open(path,"rb") as f:
+            self.assertTrue(f.read() == b"".join(lines),"Incorrect compressed contents")
+        self.assertTrue(os.path.getsize(path) < len(b"".join(lines)) / 2,"Output not compressed")
+        with openCapture(path) as f:
+            self.assertTrue(f.read() == b"".join(lines).decode(),"Incorrect decompressed text")
+
+    @unittest.skipIf(capture.zstandard is None,"zstandard is not installed")
+    def testZstdRoundTrip(self):
+        """
+        zstd output should be read back as text
+        """
+        path = self.writeCapture("run-stdout.out.zst",[b"hello\n",b"world\n"])
+        with openCapture(path) as f:
+            self.assertTrue(f.read() == "hello\nworld\n","Incorrect decompressed text")
+
+    def testHeadAndTail(self):
+        """
+        Output over maxbytes should keep the head and tail with a note of what was left out
+        """
+        data = b"".join(("%04d\n" % i).encode() for i in range(1000))
+        path = self.writeCapture("run-stdout.out",[data[i:i + 7] for i in range(0,len(data),7)],maxbytes=100)
+        with openCapture(path) as f:
+            text = f.read()
+        self.assertTrue(text.startswith(data[0:50].decode()),"Head not kept: %s" % text)
+        self.assertTrue(text.endswith(data[-50:].decode()),"Tail not kept: %s" % text)
+        self.assertTrue((capture.OMITTED_MARKER % (len(data) - 100)) in text,"Omitted bytes not noted: %s" % text)
+
+    def testRotation(self):
+        """
+        Output should be rotated into numbered segments and read back in order, dropping the oldest
+        """
+        chunks = [("%09d\n" % i).encode() for i in range(100)]
+        path = self.writeCapture("run-stdout.out.gz",chunks,rotatebytes=100,rotatecount=3)
+        segments = getSegmentPaths(path)
+        self.assertTrue(len(segments) == 4,"Incorrect segments: %s" % segments)
+        self.assertTrue(os.path.basename(segments[0]) == "run-stdout.3.out.gz","Incorrect segment name: %s" % segments[0])
+        with openCapture(path) as f:
+            self.assertTrue(f.read() == b"".join(chunks[60:]).decode(),"Incorrect rotated contents")
+
+        # A new capture to the same path does not pick up the old segments
+        path = self.writeCapture("run-stdout.out.gz",[b"new\n"])
+        self.assertTrue(getSegmentPaths(path) == [path],"Old segments left behind")
+
+    def testFollowRotation(self):
+        """
+        A follower should move on to the new file when the output it follows is rotated
+        """
+        path = os.path.join(CAPTURE_PATH,"run-stdout.out")
+        chunks = [("%09d\n" % i).encode() for i in range(100)]
+        writer = CaptureWriter(path,rotatebytes=100,rotatecount=100)
+
+        def write():
+            for chunk in chunks:
+                writer.write(chunk)
+                time.sleep(0.002)
+            writer.close()
+
+        thread = threading.Thread(target=write)
+        sink = BytesSink()
+        follower = FileFollower(maxwait=0.05)
+        follower.add(path,sink,segments=getSegmentPaths)
+        thread.start()
+        follower.follow(lambda: not thread.is_alive())
+        thread.join()
+        self.assertTrue(sink.data == b"".join(chunks),"Incorrect followed output: %s" % sink.data)
+
+    def testTailRotated(self):
+        """
+        hex tail should print the rotated segments of a run's output before the current file
+        """
+        runlogger = DefaultRunLogger(pathname=os.path.join(CAPTURE_PATH,"runlogs"))
+        with mock.patch.object(bashsystem,"DEFAULT_BASH_SCRIPTDIR",os.path.join(CAPTURE_PATH,"scripts")):
+            runid = BashSystem(runlogger=runlogger,rotatebytes=1000).execute("seq 1 400",monitor=False)
+        self.assertTrue(len(getSegmentPaths(runlogger.get(runid)["stdoutfile"])) > 1,"Output was not rotated")
+
+        stdout = io.StringIO()
+        with mock.patch.object(hextail,"getRunLogger",return_value=runlogger), mock.patch("sys.stdout",stdout):
+            hextail.hextail({"RUNID" : runid, "RUNLOGGER" : None, "NOFOLLOW" : True})
+        self.assertTrue(stdout.getvalue() == "".join("%d\n" % i for i in range(1,401)),"Incorrect tailed output: %s" % stdout.getvalue()[:100])
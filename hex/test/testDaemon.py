@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+hex daemon tests
+
+@date      : 2026-10-18 19:52:30
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import time
+import getpass
+import threading
+from hex import UserException
+from hex.runlog import DefaultRunLogger
+from hex.system.daemon import HexServer, HexClient
+from hex.test.helpers import BytesSink
+
+DAEMON_PATH = "/tmp/hexdaemonfortesting"
+SOCKET_PATH = os.path.join(DAEMON_PATH,"hexd.sock")
+
+
+class DaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % DAEMON_PATH)
+        self.runlogger = DefaultRunLogger(pathname=os.path.join(DAEMON_PATH,"runlogs"))
+        self.server = HexServer(SOCKET_PATH,runlogger=self.runlogger,maxjobs=1)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.client = HexClient(SOCKET_PATH)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        os.system("rm -rf %s" % DAEMON_PATH)
+
+    def testExecute(self):
+        """
+        Output should be streamed back and the run logged by the daemon, in the client's working directory
+        """
+        outsink, errsink = BytesSink(), BytesSink()
+        runid, result = self.client.execute("pwd; echo err >&2; echo $HEXTESTVAR",sinks=(outsink,errsink))
+        self.assertTrue(result == "SUCCESS","Incorrect result: %s" % result)
+        self.assertTrue(self.runlogger.get(runid)["status"] == "COMPLETED","Run not logged")
+        self.assertTrue(outsink.data.decode().splitlines()[0] == os.getcwd(),"Not run in the client's directory: %s" % outsink.data)
+        self.assertTrue(errsink.data == b"err\n","Incorrect stderr: %s" % errsink.data)
+
+        os.environ["HEXTESTVAR"] = "fromclient"
+        try:
+            outsink = BytesSink()
+            runid, result = self.client.execute("echo $HEXTESTVAR; exit 3",sinks=(outsink,BytesSink()))
+        finally:
+            del os.environ["HEXTESTVAR"]
+        self.assertTrue(outsink.data == b"fromclient\n","Client environment not used: %s" % outsink.data)
+        self.assertTrue(result == "FAIL","Incorrect result: %s" % result)
+
+    def testSubmitAndLimit(self):
+        """
+        A submitted command should return once started, and commands over the limit should wait
+        """
+        start = time.time()
+        runid, result = self.client.execute("sleep 1",wait=False,monitor=False)
+        self.assertTrue(time.time() - start < 1,"Submit waited for the command to finish")
+        self.assertTrue(self.runlogger.get(runid)["status"] == "RUNNING","Submitted run not started")
+
+        runid, result = self.client.execute("true",sinks=(BytesSink(),BytesSink()))
+        self.assertTrue(time.time() - start >= 1,"Second command did not wait for a slot")
+        status = self.client.getStatus()
+        self.assertTrue(status["running"] == 0 and status["maxjobs"] == 1,"Incorrect status: %s" % status)
+
+    def testUser(self):
+        """
+        Commands should be scheduled under the user the client gives, or its login name
+        """
+        runids = [self.client.execute("sleep 0.5",wait=False,monitor=False,user=user)[0] for user in ["pipeline",None]]
+        users = [self.server.scheduler.jobs[runid].user for runid in runids]
+        self.assertTrue(users == ["pipeline",getpass.getuser()],"Incorrect users: %s" % users)
+        self.server.scheduler.wait(runids)
+
+    def testSecondDaemonRefused(self):
+        """
+        A second daemon on the same socket should be refused, and clients should be told when there is no daemon
+        """
+        self.assertTrue(self.client.isRunning(),"Daemon not running")
+        with self.assertRaises(UserException):
+            HexServer(SOCKET_PATH,runlogger=self.runlogger)
+        with self.assertRaises(UserException):
+            HexClient(os.path.join(DAEMON_PATH,"none.sock")).getStatus()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+"""
+Workflow DAG tests
+
+@date      : 2026-10-19 00:40:55
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import json
+import time
+from hex import UserException
+from hex.runlog import DefaultRunLogger
+from hex.system.bashsystem import BashSystem
+from hex.system.dag import Dag, DagRunner, runDag, SUCCESS_STATE, FAIL_STATE, SKIPPED_STATE, REUSED_STATE
+
+DAG_PATH = "/tmp/dagfortesting"
+
+
+class DagTest(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % DAG_PATH)
+        os.makedirs(DAG_PATH)
+        self.runlogger = DefaultRunLogger(pathname=os.path.join(DAG_PATH,"runlogs"))
+        self.system = BashSystem(runlogger=self.runlogger)
+
+    def tearDown(self):
+        os.system("rm -rf %s" % DAG_PATH)
+
+    def path(self,name):
+        return os.path.join(DAG_PATH,name)
+
+    def testRunDag(self):
+        """
+        Nodes should run after their dependencies, linked to the parent run, and
+        nodes downstream of a failure should be skipped
+        """
+        dag = Dag("test")
+        dag.add("first","echo first > %s" % self.path("first.txt"),outputs=[self.path("first.txt")])
+        dag.add("second","cat %s > %s" % (self.path("first.txt"),self.path("second.txt")),inputs=[self.path("first.txt")])
+        dag.add("broken","exit 1",deps=["first"])
+        dag.add("after","echo after",deps=["second","broken"])
+        dag.add("afterafter","echo afterafter",deps=["after"])
+        result = DagRunner(self.system,maxjobs=2).run(dag)
+
+        states = dict((name,node["state"]) for name, node in result.nodes.items())
+        expected = {"first" : SUCCESS_STATE, "second" : SUCCESS_STATE, "broken" : FAIL_STATE, "after" : SKIPPED_STATE, "afterafter" : SKIPPED_STATE}
+        self.assertTrue(states == expected,"Incorrect states: %s" % states)
+        self.assertFalse(result.succeeded,"Workflow with a failure succeeded")
+        with open(self.path("second.txt")) as f:
+            self.assertTrue(f.read() == "first\n","Dependent node ran too early")
+
+        parent = self.runlogger.get(result.runid)
+        self.assertTrue(parent["cmd"] == "dag: test" and parent["result"] == "FAIL","Incorrect parent run: %s" % parent)
+        ran = [result.nodes[name]["runid"] for name in ["first","second","broken"]]
+        self.assertTrue(all(self.runlogger.get(runid)["parentrunid"] == result.runid for runid in ran),"Node runs not linked to the parent")
+        children = [row["runid"] for row in self.runlogger.query(parentrunid=result.runid)]
+        self.assertTrue(sorted(children) == sorted(ran),"Incorrect child runs: %s" % children)
+
+    def testConcurrency(self):
+        """
+        Independent nodes should run at once, up to maxjobs
+        """
+        dag = Dag("parallel")
+        for i in range(3):
+            dag.add("sleep%d" % i,"sleep 0.5")
+        start = time.time()
+        result = runDag(dag,self.system,maxjobs=3)
+        self.assertTrue(result.succeeded,"Workflow failed: %s" % result.nodes)
+        self.assertTrue(time.time() - start < 1.2,"Independent nodes did not run at once")
+
+        lock = self.path("lock")
+        dag = Dag("serial")
+        for i in range(3):
+            dag.add("lock%d" % i,"mkdir %s && sleep 0.1 && rmdir %s" % (lock,lock))
+        result = runDag(dag,self.system,maxjobs=1)
+        self.assertTrue(result.succeeded,"More than maxjobs nodes ran at once: %s" % result.nodes)
+
+    def testMissingFiles(self):
+        """
+        Missing inputs and outputs should fail a node
+        """
+        dag = Dag()
+        dag.add("noinput","true",inputs=[self.path("nothing")])
+        dag.add("nooutput","true",outputs=[self.path("nothing.out")])
+        result = runDag(dag,self.system)
+        self.assertTrue(all(node["state"] == FAIL_STATE for node in result.nodes.values()),"Nodes with missing files succeeded: %s" % result.nodes)
+        self.assertTrue(result.nodes["noinput"]["runid"] is None,"Node without its inputs was run")
+
+    def testCheckpoints(self):
+        """
+        A resubmitted workflow should only rerun nodes whose command, inputs or
+        upstream runs changed, and reuse the others with their original runids
+        """
+        source = self.path("source.txt")
+        with open(source,"w") as f:
+            f.write("one\n")
+
+        def makeDag(cmd="echo first"):
+            dag = Dag("checkpointed")
+            dag.add("first","%s > %s" % (cmd,self.path("first.txt")),outputs=[self.path("first.txt")])
+            dag.add("second","cat %s %s > %s" % (self.path("first.txt"),source,self.path("second.txt")),inputs=[self.path("first.txt"),source],outputs=[self.path("second.txt")])
+            dag.add("third","echo third",deps=["second"])
+            dag.add("separate","echo separate")
+            return dag
+
+        first = runDag(makeDag(),self.system)
+        self.assertTrue(first.succeeded,"Workflow failed: %s" % first.nodes)
+        again = runDag(makeDag(),self.system)
+        self.assertTrue(again.succeeded,"Resubmitted workflow failed: %s" % again.nodes)
+        self.assertTrue(all(node["state"] == REUSED_STATE for node in again.nodes.values()),"Unchanged nodes were rerun: %s" % again.nodes)
+        self.assertTrue(all(again.nodes[name]["runid"] == first.nodes[name]["runid"] for name in first.nodes),"Reused nodes have new runids")
+        self.assertTrue(self.runlogger.query(parentrunid=again.runid) == [],"Reused nodes were run")
+
+        # A forced rerun runs every node, and its runs are the ones reused next time
+        forced = runDag(makeDag(),self.system,reuse=False)
+        self.assertTrue(all(node["state"] == SUCCESS_STATE for node in forced.nodes.values()),"Nodes reused in a forced rerun: %s" % forced.nodes)
+        again = runDag(makeDag(),self.system)
+        self.assertTrue(all(node["state"] == REUSED_STATE for node in again.nodes.values()),"Nodes rerun after a forced rerun: %s" % again.nodes)
+        self.assertTrue(all(again.nodes[name]["runid"] == forced.nodes[name]["runid"] for name in forced.nodes),"Forced rerun did not replace the checkpoints")
+
+        # A changed command reruns its node and everything downstream of it
+        changed = runDag(makeDag("echo changed"),self.system)
+        states = dict((name,node["state"]) for name, node in changed.nodes.items())
+        expected = {"first" : SUCCESS_STATE, "second" : SUCCESS_STATE, "third" : SUCCESS_STATE, "separate" : REUSED_STATE}
+        self.assertTrue(states == expected,"Incorrect states after a command change: %s" % states)
+
+        # So does a changed input
+        with open(source,"w") as f:
+            f.write("two, changed\n")
+        changed = runDag(makeDag("echo changed"),self.system)
+        states = dict((name,node["state"]) for name, node in changed.nodes.items())
+        expected = {"first" : REUSED_STATE, "second" : SUCCESS_STATE, "third" : SUCCESS_STATE, "separate" : REUSED_STATE}
+        self.assertTrue(states == expected,"Incorrect states after an input change: %s" % states)
+
+        # A node whose outputs have gone is rerun, and checkpoints can be ignored
+        os.remove(self.path("second.txt"))
+        result = runDag(makeDag("echo changed"),self.system)
+        self.assertTrue(result.nodes["second"]["state"] == SUCCESS_STATE and result.nodes["first"]["state"] == REUSED_STATE,"Node without its outputs was reused: %s" % result.nodes)
+        result = runDag(makeDag("echo changed"),self.system,checkpoint=False)
+        self.assertTrue(all(node["state"] == SUCCESS_STATE for node in result.nodes.values()),"Nodes were reused without checkpointing: %s" % result.nodes)
+
+    def testCheckpointedFailure(self):
+        """
+        Resubmitting a failed workflow should rerun the failed and skipped nodes only
+        """
+        flag = self.path("flag")
+        dag = Dag("retry")
+        dag.add("first","echo first")
+        dag.add("flaky","test -e %s" % flag,deps=["first"])
+        dag.add("last","echo last",deps=["flaky"])
+        failed = runDag(dag,self.system)
+        self.assertFalse(failed.succeeded,"Workflow with a failure succeeded")
+
+        with open(flag,"w") as f:
+            f.write("")
+        retried = runDag(dag,self.system)
+        states = dict((name,node["state"]) for name, node in retried.nodes.items())
+        expected = {"first" : REUSED_STATE, "flaky" : SUCCESS_STATE, "last" : SUCCESS_STATE}
+        self.assertTrue(states == expected,"Incorrect states on resubmit: %s" % states)
+        self.assertTrue(retried.succeeded and retried.nodes["first"]["runid"] == failed.nodes["first"]["runid"],"Incorrect reused run")
+        self.assertTrue(self.runlogger.get(retried.runid)["result"] == "SUCCESS","Resubmitted workflow not successful")
+
+    def testNodeCwd(self):
+        """
+        Relative inputs and outputs should be in the node's cwd, for dependencies, checks and checkpoints
+        """
+        work = self.path("work")
+        os.makedirs(work)
+        dag = Dag("cwd")
+        dag.add("write","echo written > out.txt",outputs=["out.txt"],cwd=work)
+        dag.add("read","cat %s" % os.path.join(work,"out.txt"),inputs=[os.path.join(work,"out.txt")])
+        self.assertTrue(dag.getDependencies()["read"] == set(["write"]),"Output in cwd not matched to input")
+
+        result = runDag(dag,self.system)
+        self.assertTrue(result.succeeded,"Workflow with outputs in a cwd failed: %s" % result.nodes)
+        again = runDag(dag,self.system)
+        self.assertTrue(all(node["state"] == REUSED_STATE for node in again.nodes.values()),"Nodes with a cwd not reused: %s" % again.nodes)
+
+    def testLoad(self):
+        """
+        Workflow descriptions should be read from JSON and checked
+        """
+        path = self.path("workflow.json")
+        with open(path,"w") as f:
+            json.dump({"name" : "loaded", "maxjobs" : 2, "nodes" : {"a" : {"cmd" : "true", "outputs" : ["a.txt"]}, "b" : {"cmds" : ["true","true"], "inputs" : ["a.txt"]}}},f)
+        dag = Dag.load(path)
+        self.assertTrue(dag.name == "loaded" and dag.maxjobs == 2,"Incorrect workflow settings")
+        self.assertTrue(dag.getDependencies() == {"a" : set(), "b" : set(["a"])},"Inputs did not create a dependency")
+        self.assertTrue(dag.nodes["b"].cmds == ["true","true"],"Incorrect commands")
+
+        for nodes in [
+            [{"name" : "a", "cmd" : "true", "deps" : ["b"]},{"name" : "b", "cmd" : "true", "deps" : ["a"]}],
+            [{"name" : "a", "cmd" : "true", "deps" : ["missing"]}],
+            [{"name" : "a", "cmd" : "true", "outputs" : ["x"]},{"name" : "b", "cmd" : "true", "outputs" : ["x"]}],
+            [{"name" : "a", "cmd" : "true", "colour" : "blue"}],
+            [{"name" : "a"}],
+        ]:
+            with self.assertRaises(UserException):
+                Dag.fromDict({"nodes" : nodes})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,18 +11,22 @@ Tests for the DefaultRunLogger
 
 """
 import unittest, os
-from hex.runlog import DefaultRunLogger,DEFAULT_RUNLOG_PATH,RunLog
-from datetime import datetime
+from unittest import mock
+from hex.runlog import runindex
+from hex import UserException
+from hex.runlog import DefaultRunLogger,DEFAULT_RUNLOG_PATH,RunLog,RetentionPolicy
+from datetime import datetime, timedelta
 
 
 NON_DEFAULT_RUNLOG_PATH = "/tmp/runlogs"
+OLD_RUNLOG_PATH = "/tmp/oldrunlogs"
 
 
 @unittest.skipIf(os.path.exists(DEFAULT_RUNLOG_PATH) and len(os.listdir(DEFAULT_RUNLOG_PATH)) > 0, "You have runlogs in %s.  Clear these out before running this test." % DEFAULT_RUNLOG_PATH)
 class DefaultRunLoggerTest(unittest.TestCase):
 
     def cleanDirectories(self):
-        for d in [NON_DEFAULT_RUNLOG_PATH,DEFAULT_RUNLOG_PATH]:
+        for d in [NON_DEFAULT_RUNLOG_PATH,OLD_RUNLOG_PATH,DEFAULT_RUNLOG_PATH]:
             if d.strip() == "" or d.strip() == "/":
                 raise Exception("What are you thinking?")
             os.system("rm -rf %s" % d)
@@ -123,3 +127,245 @@ class DefaultRunLoggerTest(unittest.TestCase):
 
         stderr = runlogger.getStdErrPath(runid)
         self.assertTrue(stderr == os.path.join(NON_DEFAULT_RUNLOG_PATH,runid,"%s-%s%s" % (runid,"stderr",".err")), "Incorrect stderr file %s" % stderr)
+
+    def makeRunLogs(self,runlogger):
+        """
+        Save a handful of run logs with different statuses, hosts, and commands
+        """
+        runids = []
+        for i in range(6):
+            runlog = RunLog(
+                jobid=i,
+                hostname="host%d" % (i % 2),
+                scriptfilepath="/path/to/script",
+                interpreter="/bin/bash",
+                starttime=datetime(2017,1,1 + i),
+                system="BashSystem",
+                status="COMPLETED" if i < 4 else "RUNNING",
+                result="FAIL" if i == 1 else "SUCCESS",
+                cmd="sort file%d" % i if i % 3 == 0 else "grep pattern%d" % i,
+            )
+            runids.append(runlogger.save(runlog))
+        return runids
+
+    def testQueryIndex(self):
+        """
+        Find runs by status, start time, hostname, and command prefix with DefaultRunLogger.query
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        runids = self.makeRunLogs(runlogger)
+
+        rows = runlogger.query(status="RUNNING")
+        self.assertTrue([row["runid"] for row in rows] == [runids[5],runids[4]],"Incorrect RUNNING runs: %s" % rows)
+
+        rows = runlogger.query(since=datetime(2017,1,3),hostname="host0")
+        self.assertTrue(set(row["runid"] for row in rows) == set([runids[2],runids[4]]),"Incorrect runs by host and time: %s" % rows)
+
+        rows = runlogger.query(cmdprefix="sort")
+        self.assertTrue(set(row["runid"] for row in rows) == set([runids[0],runids[3]]),"Incorrect runs by command: %s" % rows)
+
+        rows = runlogger.query(status=["COMPLETED"],until=datetime(2017,1,3),limit=1)
+        self.assertTrue(len(rows) == 1 and rows[0]["runid"] == runids[1] and rows[0]["result"] == "FAIL","Incorrect limited query: %s" % rows)
+
+        # Saving again updates the entry in place
+        runlog = runlogger.get(runids[5])
+        runlog["status"] = "COMPLETED"
+        runlogger.save(runlog)
+        rows = runlogger.query(status="RUNNING")
+        self.assertTrue([row["runid"] for row in rows] == [runids[4]],"Index not updated on save: %s" % rows)
+
+    def testStatusMany(self):
+        """
+        Many run logs should be loaded at once, leaving out runs that don't exist
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        runids = self.makeRunLogs(runlogger)
+        runlogs = runlogger.statusMany(runids + ["nosuchrun"])
+        self.assertTrue(set(runlogs.keys()) == set(runids),"Incorrect runs loaded: %s" % runlogs.keys())
+        self.assertTrue([runlogs[runid]["status"] for runid in runids] == ["COMPLETED"] * 4 + ["RUNNING"] * 2,"Incorrect statuses")
+        self.assertTrue(runlogs[runids[0]]["starttime"] == runlogger.get(runids[0])["starttime"],"Run logs not loaded like get()")
+
+    def testRebuildIndex(self):
+        """
+        Rebuild the index of existing run logs that were saved without one
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH,index=False)
+        runids = self.makeRunLogs(runlogger)
+
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        self.assertTrue(runlogger.query() == [],"Index should start out empty")
+        count = runlogger.rebuildIndex()
+        self.assertTrue(count == len(runids),"Incorrect number of runs indexed: %d" % count)
+        rows = runlogger.query()
+        self.assertTrue(set(row["runid"] for row in rows) == set(runids),"Incorrect rebuilt index: %s" % rows)
+
+    def testNetworkFilesystemIndex(self):
+        """
+        The index of run logs on a network filesystem should be kept on local disk and filled with the existing runs when first queried
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH,index=False)
+        runlog = RunLog(jobid=1,hostname="localhost",scriptfilepath="/path/to/script",interpreter="/bin/bash",starttime=datetime(2017,1,1),system="BashSystem",runid=runlogger.newRunId("sort"),status="COMPLETED")
+        runid = runlogger.save(runlog)
+
+        mountspath = os.path.join(NON_DEFAULT_RUNLOG_PATH,".mounts")
+        cachepath = os.path.join(NON_DEFAULT_RUNLOG_PATH + "cache")
+        with open(mountspath,"w") as f:
+            f.write("/dev/sda1 / ext4 rw 0 0\nfiler:/runlogs %s nfs4 rw 0 0\n" % os.path.realpath(NON_DEFAULT_RUNLOG_PATH))
+        try:
+            with mock.patch.object(runindex,"MOUNTS_PATH",mountspath), mock.patch.dict(os.environ,{"XDG_CACHE_HOME" : cachepath}):
+                self.assertTrue(runindex.isNetworkFilesystem(NON_DEFAULT_RUNLOG_PATH) and not runindex.isNetworkFilesystem(cachepath),"Incorrect filesystem types")
+                with mock.patch.object(DefaultRunLogger,"rebuildIndex",side_effect=AssertionError("Index rebuilt")):
+                    runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+                    newrunid = runlogger.save(RunLog(jobid=2,hostname="localhost",scriptfilepath="/path/to/script",interpreter="/bin/bash",starttime=datetime(2017,1,2),system="BashSystem",runid=runlogger.newRunId("uniq"),status="COMPLETED"))
+                self.assertTrue(runlogger.index.path.startswith(os.path.join(cachepath,"hex","runindex","")),"Index not on local disk: %s" % runlogger.index.path)
+                self.assertFalse(os.path.exists(os.path.join(NON_DEFAULT_RUNLOG_PATH,runindex.DEFAULT_INDEX_NAME)),"Index created on the network filesystem")
+
+                # Another process on the same host uses the same index, and the first query fills it
+                runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+                self.assertTrue([row["runid"] for row in runlogger.query()] == [newrunid,runid],"Existing runs not indexed")
+                with mock.patch.object(DefaultRunLogger,"rebuildIndex",side_effect=AssertionError("Index rebuilt")):
+                    self.assertTrue(len(DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH).query()) == 2,"Built index not used")
+        finally:
+            os.system("rm -rf %s" % cachepath)
+
+    def testResourceReport(self):
+        """
+        Resource usage should be totalled, and memory maximized, per host
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        for i in range(4):
+            runlog = RunLog(jobid=i,hostname="host%d" % (i % 2),scriptfilepath="/path/to/script",interpreter="/bin/bash",
+                            starttime=datetime(2017,1,1 + i),system="BashSystem",status="COMPLETED",cmd="sort",
+                            usercpu=1.5,syscpu=0.5,maxrss=1000 * (i + 1))
+            runlogger.save(runlog)
+
+        rows = runlogger.resourceReport()
+        self.assertTrue([row["hostname"] for row in rows] == ["host0","host1"],"Incorrect groups: %s" % rows)
+        self.assertTrue(rows[0]["runs"] == 2 and rows[0]["usercpu"] == 3.0 and rows[0]["maxrss"] == 3000,"Incorrect totals: %s" % rows)
+
+        rows = runlogger.resourceReport(groupby="day",since=datetime(2017,1,4))
+        self.assertTrue(len(rows) == 1 and rows[0]["day"] == "2017-01-04" and rows[0]["syscpu"] == 0.5,"Incorrect daily report: %s" % rows)
+
+    def testPrune(self):
+        """
+        Runs beyond the age, count, or size limits should be deleted, oldest first, only if their status allows it
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        now = datetime.now()
+        runids = []
+        for i in range(6):
+            runlog = RunLog(jobid=i,hostname="host",scriptfilepath="/path/to/script",interpreter="/bin/bash",
+                            starttime=now - timedelta(days=i),system="BashSystem",status="RUNNING" if i == 5 else "COMPLETED")
+            runids.append(runlogger.save(runlog))
+
+        pruned = runlogger.prune(RetentionPolicy(maxage=timedelta(days=3,hours=12)),dryrun=True)
+        self.assertTrue([run["runid"] for run in pruned] == [runids[4]],"Incorrect runs pruned by age: %s" % pruned)
+        self.assertTrue(set(runlogger.getRunIds()) == set(runids),"Dry run deleted runs")
+
+        pruned = runlogger.prune(RetentionPolicy(maxcount=2))
+        self.assertTrue([run["runid"] for run in pruned] == runids[2:5],"Incorrect runs pruned by count: %s" % pruned)
+        self.assertTrue(set(runlogger.getRunIds()) == set([runids[0],runids[1],runids[5]]),"Incorrect runs left: %s" % runlogger.getRunIds())
+        self.assertTrue(set(row["runid"] for row in runlogger.query()) == set([runids[0],runids[1],runids[5]]),"Pruned runs left in the index")
+
+        size = pruned[0]["size"]
+        pruned = runlogger.prune(RetentionPolicy(maxbytes=size + 1))
+        self.assertTrue([run["runid"] for run in pruned] == [runids[1]],"Incorrect runs pruned by size: %s" % pruned)
+
+        pruned = runlogger.prune(RetentionPolicy(maxcount=0,statuses=["RUNNING"]))
+        self.assertTrue([run["runid"] for run in pruned] == [runids[5]],"Incorrect runs pruned by status: %s" % pruned)
+
+    def testShardedLayouts(self):
+        """
+        New runs should be created in hash and date shards, and found again by a logger that does not specify the layout
+        """
+        for layout in ["hash","date"]:
+            self.cleanDirectories()
+            runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH,layout=layout)
+            runid = runlogger.newRunId("sort")
+            shard = runlogger.getShard(runid)
+            self.assertTrue(shard != "","No shard for %s layout" % layout)
+            rundir = os.path.join(NON_DEFAULT_RUNLOG_PATH,shard,runid)
+            self.assertTrue(os.path.isdir(rundir),"Run directory %s not created for %s layout" % (rundir,layout))
+            self.assertTrue(runlogger.getRunLogPath(runid) == os.path.join(rundir,"%s-runlog.json" % runid),"Incorrect run log path %s" % runlogger.getRunLogPath(runid))
+
+            runlog = RunLog(jobid=1,hostname="localhost",scriptfilepath="/path/to/script",interpreter="/bin/bash",starttime=datetime(2017,1,1),system="BashSystem",runid=runid)
+            runlogger.save(runlog)
+
+            reopened = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+            self.assertTrue(reopened.layout == layout,"Layout %s not recorded: %s" % (layout,reopened.layout))
+            self.assertTrue(reopened.get(runid)["jobid"] == 1,"Unable to get run from %s layout" % layout)
+            self.assertTrue(reopened.getRunIds() == [runid],"Incorrect runids from %s layout: %s" % (layout,reopened.getRunIds()))
+
+        # Date layout runids without a date
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH,layout="date")
+        self.assertTrue(runlogger.getShard("howdydoody") == "undated","Incorrect shard for undated runid")
+
+    def testMigrateLayout(self):
+        """
+        Move flat run directories into hash shards.  Runs should still be found and the paths in their run logs updated.
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        runids = []
+        for i in range(5):
+            runid = runlogger.newRunId("cmd%d" % i)
+            stdoutfile = runlogger.getStdOutPath(runid)
+            with open(stdoutfile,"w") as f:
+                f.write("output %d\n" % i)
+            runlog = RunLog(jobid=i,hostname="localhost",scriptfilepath="/path/to/script",interpreter="/bin/bash",starttime=datetime(2017,1,1),system="BashSystem",runid=runid,stdoutfile=stdoutfile)
+            runids.append(runlogger.save(runlog))
+
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH,layout="hash")
+        moved = runlogger.migrateLayout()
+        self.assertTrue(moved == 5,"Incorrect number of runs moved: %d" % moved)
+        for i, runid in enumerate(runids):
+            self.assertFalse(os.path.exists(os.path.join(NON_DEFAULT_RUNLOG_PATH,runid)),"Flat run directory left behind for %s" % runid)
+            runlog = runlogger.get(runid)
+            self.assertTrue(runlog["stdoutfile"] == runlogger.getStdOutPath(runid),"Stdout path not updated: %s" % runlog["stdoutfile"])
+            with open(runlog["stdoutfile"],"r") as f:
+                self.assertTrue(f.read() == "output %d\n" % i,"Incorrect stdout after migration")
+            self.assertTrue(runlog["scriptfilepath"] == "/path/to/script","Path outside the run directory was changed")
+        self.assertTrue(sorted(runlogger.getRunIds()) == sorted(runids),"Incorrect runids after migration")
+
+    def testMigrateLayoutTwice(self):
+        """
+        Migrating again after new runs are created should leave the shard directories alone and only move new flat runs
+        """
+        def saveRun(runlogger,i):
+            runid = runlogger.newRunId("cmd%d" % i)
+            runlog = RunLog(jobid=i,hostname="localhost",scriptfilepath="/path/to/script",interpreter="/bin/bash",starttime=datetime(2017,1,1),system="BashSystem",runid=runid)
+            return runlogger.save(runlog)
+
+        flat = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        runids = [saveRun(flat,i) for i in range(3)]
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH,layout="hash")
+        self.assertTrue(runlogger.migrateLayout("flat") == 3,"Incorrect number of runs moved")
+
+        # A new sharded run, a run written by an older flat logger, and a run that has no run log yet
+        runids.append(saveRun(runlogger,3))
+        runid = saveRun(DefaultRunLogger(pathname=OLD_RUNLOG_PATH,index=False),4)
+        os.rename(os.path.join(OLD_RUNLOG_PATH,runid),os.path.join(NON_DEFAULT_RUNLOG_PATH,runid))
+        runids.append(runid)
+        os.makedirs(os.path.join(NON_DEFAULT_RUNLOG_PATH,"notarun"))
+
+        moved = runlogger.migrateLayout("flat")
+        self.assertTrue(moved == 1,"Incorrect number of runs moved on the second migration: %d" % moved)
+        for i, runid in enumerate(runids):
+            self.assertTrue(runlogger.get(runid)["jobid"] == i,"Run %s lost by migrating twice" % runid)
+        self.assertTrue(os.path.isdir(os.path.join(NON_DEFAULT_RUNLOG_PATH,"notarun")),"Directory without a run log was moved")
+
+    def testLayoutMismatch(self):
+        """
+        A logger asking for a different layout than the recorded one should fail rather than hide the existing runs.  setLayout and migrateLayout switch it.
+        """
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH,layout="hash")
+        runid = runlogger.save(RunLog(jobid=1,hostname="localhost",scriptfilepath="/path/to/script",interpreter="/bin/bash",starttime=datetime(2017,1,1),system="BashSystem",runid=runlogger.newRunId("cmd")))
+        for layout in ["date","flat"]:
+            with self.assertRaises(UserException,msg="No error for %s layout over hash runs" % layout):
+                DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH,layout=layout)
+        self.assertTrue(DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH).layout == "hash","Layout marker overwritten")
+
+        runlogger = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH)
+        runlogger.setLayout("date")
+        self.assertTrue(runlogger.migrateLayout("hash") == 1,"Run not moved to the date layout")
+        reopened = DefaultRunLogger(pathname=NON_DEFAULT_RUNLOG_PATH,layout="date")
+        self.assertTrue(reopened.get(runid)["jobid"] == 1,"Unable to get run after changing layout")
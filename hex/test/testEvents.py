@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+Run lifecycle event tests
+
+@date      : 2026-10-18 22:58:12
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import json
+import base64
+import socket
+import asyncio
+from hex.events import EventBus, getSubscriber, OUTPUT_EVENT, FINISHED_EVENT
+from hex.runlog import DefaultRunLogger
+from hex.system.bashsystem import BashSystem
+from hex.system.asyncbashsystem import AsyncBashSystem
+from hex.system.scheduler import Scheduler
+from hex.test.helpers import BytesSink
+
+EVENTS_PATH = "/tmp/eventsfortesting"
+
+
+class EventsTest(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % EVENTS_PATH)
+        os.makedirs(EVENTS_PATH)
+        self.bus = EventBus()
+        self.runlogger = DefaultRunLogger(pathname=os.path.join(EVENTS_PATH,"runlogs"),events=self.bus)
+
+    def tearDown(self):
+        self.bus.close()
+        os.system("rm -rf %s" % EVENTS_PATH)
+
+    def getOutput(self,events,stream):
+        return b"".join(base64.b64decode(event["data"]) for event in events if event["event"] == OUTPUT_EVENT and event["stream"] == stream)
+
+    def testCallbackEvents(self):
+        """
+        An in-process subscriber should get started, output and finished events from execute()
+        """
+        events = []
+        self.bus.subscribe(events.append)
+        system = BashSystem(runlogger=self.runlogger)
+        stdoutfile = os.path.join(EVENTS_PATH,"out.txt")
+        runid = system.execute("echo hello; echo oops >&2; exit 1",stdoutfile=stdoutfile,sinks=(BytesSink(),BytesSink()))
+
+        kinds = [event["event"] for event in events if event["event"] != OUTPUT_EVENT]
+        self.assertTrue(kinds == ["started","finished"],"Incorrect events: %s" % kinds)
+        self.assertTrue(all(event["runid"] == runid for event in events),"Incorrect runids: %s" % events)
+        self.assertTrue(self.getOutput(events,"stdout") == b"hello\n","Incorrect stdout events: %s" % events)
+        self.assertTrue(self.getOutput(events,"stderr") == b"oops\n","Incorrect stderr events: %s" % events)
+        with open(stdoutfile,"rb") as f:
+            self.assertTrue(f.read() == b"hello\n","Output file not written")
+
+        finished = events[-1]
+        self.assertTrue(finished["result"] == "FAIL" and finished["elapsed"] >= 0,"Incorrect finished event: %s" % finished)
+        self.assertTrue(finished["pid"] == os.getpid() and finished["hostname"],"Missing event source: %s" % finished)
+
+    def testQueuedEvents(self):
+        """
+        Scheduled runs should emit a queued event before they start
+        """
+        events = []
+        self.bus.subscribe(events.append,events=["queued","started","finished"])
+        scheduler = Scheduler(BashSystem(runlogger=self.runlogger),maxjobs=1)
+        runids = [scheduler.submit("sleep 0.2"),scheduler.submit("true")]
+        self.assertTrue(scheduler.wait(timeout=30),"Scheduled runs did not finish")
+        kinds = [event["event"] for event in events if event["runid"] == runids[1]]
+        self.assertTrue(kinds == ["queued","started","finished"],"Incorrect events: %s" % kinds)
+
+    def testAsyncOutputEvents(self):
+        """
+        Output of unmonitored async runs should still be sent as output events
+        """
+        events = []
+        self.bus.subscribe(events.append,events=[OUTPUT_EVENT])
+        system = AsyncBashSystem(runlogger=self.runlogger)
+        runid = asyncio.run(system.execute("echo hello",monitor=False))
+        self.assertTrue(self.getOutput(events,"stdout") == b"hello\n","Incorrect output events: %s" % events)
+        self.assertTrue(all(event["runid"] == runid for event in events),"Incorrect runids: %s" % events)
+
+    def testWants(self):
+        """
+        Output is only piped through hex when something subscribes to output events
+        """
+        self.assertFalse(self.bus.wants(FINISHED_EVENT),"Bus without subscribers wants events")
+        events = []
+        self.bus.subscribe(events.append,events=[FINISHED_EVENT])
+        self.assertTrue(self.bus.wants(FINISHED_EVENT) and not self.bus.wants(OUTPUT_EVENT),"Incorrect event filter")
+        system = BashSystem(runlogger=self.runlogger)
+        self.assertTrue(system.openCaptureWriters("/tmp/x","/tmp/y") == [None,None],"Capturing without output subscribers")
+        system.execute("echo hello",monitor=False)
+        self.assertTrue([event["event"] for event in events] == [FINISHED_EVENT],"Incorrect events: %s" % events)
+
+        self.bus.unsubscribe(events.append)
+        self.assertFalse(self.bus.wants(FINISHED_EVENT),"Unsubscribed events still wanted")
+        with self.assertRaises(Exception):
+            self.bus.subscribe(events.append,events=["nonsense"])
+
+    def testJsonLinesSubscriber(self):
+        """
+        Events should be appended to a JSON lines file
+        """
+        path = os.path.join(EVENTS_PATH,"events.jsonl")
+        self.bus.subscribe(getSubscriber("file:%s" % path))
+        runid = self.runlogger.newRunId()
+        system = BashSystem(runlogger=self.runlogger)
+        system.execute("echo hello",runid=runid,monitor=False)
+        with open(path) as f:
+            events = [json.loads(line) for line in f]
+        kinds = [event["event"] for event in events]
+        self.assertTrue(kinds == ["started","output","finished"],"Incorrect events: %s" % kinds)
+        self.assertTrue(events[-1]["runid"] == runid and events[-1]["result"] == "SUCCESS","Incorrect finished event: %s" % events[-1])
+
+    def testSocketSubscriber(self):
+        """
+        Events should be sent to a listening Unix socket, and dropped when nobody is listening
+        """
+        path = os.path.join(EVENTS_PATH,"events.sock")
+        subscriber = self.bus.subscribe(getSubscriber("socket:%s" % path))
+        self.bus.emit(FINISHED_EVENT,"nobody-listening")
+
+        listener = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(1)
+        listener.settimeout(10)
+        try:
+            subscriber.retryafter = 0
+            self.bus.emit(FINISHED_EVENT,"somebody-listening",result="SUCCESS")
+            conn, addr = listener.accept()
+            with conn, conn.makefile("rb") as f:
+                event = json.loads(f.readline().decode("utf-8"))
+        finally:
+            listener.close()
+        self.assertTrue(event["runid"] == "somebody-listening" and event["result"] == "SUCCESS","Incorrect event: %s" % event)
+
+
+if __name__ == "__main__":
+    unittest.main()
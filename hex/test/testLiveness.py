@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+Run liveness tests
+
+@date      : 2026-10-18 22:18:05
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import socket
+from subprocess import Popen
+from datetime import datetime
+from hex.runlog import DefaultRunLogger, RunLog
+from hex.system.liveness import findLostRuns, reconcileRuns, LOST_STATUS
+
+LIVENESS_PATH = "/tmp/livenessfortesting"
+
+
+class LivenessTest(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % LIVENESS_PATH)
+        self.runlogger = DefaultRunLogger(pathname=LIVENESS_PATH)
+        self.hostname = socket.gethostname().split(".",1)[0]
+
+    def tearDown(self):
+        os.system("rm -rf %s" % LIVENESS_PATH)
+
+    def makeRunLog(self,jobid,hostname=None,starttime=None,status="RUNNING"):
+        runlog = RunLog(jobid=jobid,hostname=hostname or self.hostname,scriptfilepath="/path/to/script",interpreter="/bin/bash",
+                        starttime=starttime or datetime.now(),system="hex.system.bashsystem.BashSystem",status=status)
+        return self.runlogger.get(self.runlogger.save(runlog))
+
+    def testFindLostRuns(self):
+        """
+        Runs whose process has exited, or whose pid now belongs to a later process, should be lost
+        """
+        proc = Popen(["true"])
+        proc.wait()
+        alive = self.makeRunLog(os.getpid())
+        exited = self.makeRunLog(proc.pid)
+        reused = self.makeRunLog(os.getpid(),starttime=datetime(2017,1,1))
+        elsewhere = self.makeRunLog(proc.pid,hostname="someotherhost")
+
+        lost = [runlog["runid"] for runlog in findLostRuns([alive,exited,reused,elsewhere])]
+        self.assertTrue(lost == [exited["runid"],reused["runid"]],"Incorrect lost runs: %s" % lost)
+
+        runlogs = reconcileRuns(self.runlogger,[alive,exited])
+        self.assertTrue([runlog["status"] for runlog in runlogs] == ["RUNNING",LOST_STATUS],"Incorrect reconciled runs: %s" % runlogs)
+        self.assertTrue(self.runlogger.get(exited["runid"])["status"] == LOST_STATUS,"LOST status not saved")
+        self.assertTrue(self.runlogger.query(status="RUNNING")[0]["runid"] != exited["runid"],"Index not updated")
+
+    def testQueuedAndPartialRuns(self):
+        """
+        QUEUED runs whose process has gone should be LOST too, lost runs should FAIL, and saving them should keep their full logs
+        """
+        proc = Popen(["true"])
+        proc.wait()
+        queued = self.makeRunLog(proc.pid,status="QUEUED")
+        running = self.makeRunLog(proc.pid)
+        full = self.runlogger.get(running["runid"])
+        full["stdoutfile"] = "/path/to/stdout"
+        self.runlogger.save(full)
+        # Without stdoutfile, as SQLRunLogger.statusMany returns runs without the fields that are not columns
+        partial = running
+
+        runlogs = reconcileRuns(self.runlogger,[queued,partial])
+        self.assertTrue([(runlog["status"],runlog.get("result")) for runlog in runlogs] == [(LOST_STATUS,"FAIL")] * 2,"Incorrect reconciled runs: %s" % runlogs)
+        saved = self.runlogger.get(running["runid"])
+        self.assertTrue(saved["status"] == LOST_STATUS and saved["result"] == "FAIL","Lost run not saved: %s" % saved)
+        self.assertTrue(saved.get("stdoutfile") == "/path/to/stdout","Full run log overwritten: %s" % saved)
+        self.assertTrue([row["runid"] for row in self.runlogger.query(status=LOST_STATUS) if row["result"] == "FAIL"] != [],"Lost runs not found by result")
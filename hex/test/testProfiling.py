@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""
+Profiling tests
+
+@date      : 2026-10-18 23:58:30
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import json
+import sys
+import subprocess
+import multiprocessing
+from unittest import mock
+import hex
+from hex import UserException
+from hex import profiling
+from hex.profiling import span, enableProfiling, disableProfiling, parseProfileSpec, NULL_SPAN
+from hex.profiling.profiler import Histogram, Profiler, readPrometheus
+from hex.runlog import DefaultRunLogger
+from hex.system.bashsystem import BashSystem
+
+PROFILE_PATH = "/tmp/profilingfortesting"
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(hex.__file__)))
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % PROFILE_PATH)
+        os.makedirs(PROFILE_PATH)
+        disableProfiling()
+
+    def tearDown(self):
+        disableProfiling()
+        os.system("rm -rf %s" % PROFILE_PATH)
+
+    def testOff(self):
+        """
+        Nothing should be measured when profiling is off
+        """
+        self.assertTrue(profiling.getProfiler() is None,"Profiling is on")
+        self.assertTrue(span("bash.popen",runid="x") is NULL_SPAN,"Span created while profiling is off")
+
+    def testHistogram(self):
+        """
+        Bucket counts should be cumulative and end with +Inf
+        """
+        histogram = Histogram([0.1,1.0])
+        for duration in [0.05,0.1,0.5,2.0]:
+            histogram.add(duration)
+        self.assertTrue(histogram.getCumulativeCounts() == [(0.1,2),(1.0,3),(float("inf"),4)],"Incorrect buckets: %s" % histogram.getCumulativeCounts())
+        self.assertTrue(histogram.count == 4 and abs(histogram.sum - 2.65) < 1e-9,"Incorrect count or sum")
+
+    def testExecuteSpans(self):
+        """
+        The phases of execute() should be traced and written as Prometheus histograms
+        """
+        prompath = os.path.join(PROFILE_PATH,"hex.prom")
+        tracepath = os.path.join(PROFILE_PATH,"trace.jsonl")
+        profiler = enableProfiling(prometheuspath=prompath,tracepath=tracepath)
+        system = BashSystem(runlogger=DefaultRunLogger(pathname=os.path.join(PROFILE_PATH,"runlogs")))
+        runids = [system.execute("echo hello",monitor=False) for i in range(2)]
+
+        histograms = profiler.getHistograms()
+        for name in ["bash.execute","bash.compose","bash.makeScriptFile","bash.popen","bash.output","bash.wait","bash.completeRunLog","runlogger.newRunId","runlogger.get"]:
+            self.assertTrue(histograms.get(name,{}).get("count") == 2,"Incorrect %s histogram: %s" % (name,histograms.get(name)))
+        self.assertTrue(histograms["runlogger.save"]["count"] == 4,"Incorrect save count")
+        disableProfiling()
+
+        with open(tracepath) as f:
+            spans = [json.loads(line) for line in f]
+        popens = [record for record in spans if record["span"] == "bash.popen"]
+        self.assertTrue([record["runid"] for record in popens] == runids,"Incorrect traced runids: %s" % popens)
+        self.assertTrue(all(record["duration"] >= 0 and record["pid"] == os.getpid() for record in spans),"Incorrect span records")
+
+        with open(prompath) as f:
+            lines = f.read().splitlines()
+        self.assertTrue('# TYPE hex_span_seconds histogram' in lines,"Missing metric type")
+        self.assertTrue('hex_span_seconds_bucket{span="bash.execute",le="+Inf"} 2' in lines,"Missing +Inf bucket")
+        self.assertTrue('hex_span_seconds_count{span="runlogger.save"} 4' in lines,"Missing count")
+
+        # Another process's spans are added to the same file
+        profiler = enableProfiling(prometheuspath=prompath)
+        system.execute("echo again",monitor=False)
+        disableProfiling()
+        histograms = readPrometheus(prompath)
+        self.assertTrue(histograms["bash.execute"]["count"] == 3 and histograms["bash.execute"]["buckets"][-1] == ["+Inf",3],"Counts not added: %s" % histograms["bash.execute"])
+        self.assertTrue(histograms["runlogger.save"]["count"] == 6,"Incorrect save count after a second write")
+
+    def testConcurrentWrites(self):
+        """
+        Processes writing the Prometheus textfile at once should not lose each other's counts
+        """
+        prompath = os.path.join(PROFILE_PATH,"hex.prom")
+
+        def write(i):
+            profiler = Profiler(prometheuspath=prompath)
+            for j in range(i + 1):
+                profiler.record("shared",0.01)
+            profiler.record("only%d" % i,0.5)
+            profiler.write()
+
+        processes = [multiprocessing.get_context("fork").Process(target=write,args=(i,)) for i in range(8)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        histograms = readPrometheus(prompath)
+        self.assertTrue(histograms["shared"]["count"] == 36 and abs(histograms["shared"]["sum"] - 0.36) < 1e-9,"Counts lost: %s" % histograms["shared"])
+        self.assertTrue(all(histograms["only%d" % i]["count"] == 1 for i in range(8)),"Spans lost: %s" % sorted(histograms))
+
+        # A span with different buckets starts again
+        profiler = Profiler(prometheuspath=prompath,buckets=[1.0])
+        profiler.record("shared",0.01)
+        profiler.write()
+        histograms = readPrometheus(prompath)
+        self.assertTrue(histograms["shared"]["buckets"] == [[1.0,1],["+Inf",1]],"Incorrect rebucketed span: %s" % histograms["shared"])
+        self.assertTrue(histograms["only0"]["count"] == 1,"Other spans lost")
+
+    def testProfileSpec(self):
+        """
+        HEX_PROFILE settings should be parsed into output paths
+        """
+        kwargs = parseProfileSpec("prometheus:/tmp/hex.prom, trace:/tmp/trace.jsonl")
+        self.assertTrue(kwargs == {"prometheuspath" : "/tmp/hex.prom", "tracepath" : "/tmp/trace.jsonl"},"Incorrect spec: %s" % kwargs)
+        with self.assertRaises(UserException):
+            parseProfileSpec("flamegraph:/tmp/x")
+
+    def testConfigure(self):
+        """
+        HEX_PROFILE should only switch profiling on when profiling is configured, not on import
+        """
+        tracepath = os.path.join(PROFILE_PATH,"trace.jsonl")
+        env = dict(os.environ,HEX_PROFILE="trace:%s" % tracepath)
+        code = "import sys, hex.profiling; sys.stdout.write(str(hex.profiling.getProfiler()))"
+        result = subprocess.run([sys.executable,"-c",code],env=env,cwd=PACKAGE_ROOT,
+                                stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+        self.assertTrue(result.returncode == 0 and result.stdout == "None","Profiling switched on by importing it: %s%s" % (result.stdout,result.stderr))
+        with mock.patch.dict(os.environ,{"HEX_PROFILE" : "trace:%s" % tracepath}):
+            profiling.configureProfiling()
+        self.assertTrue(profiling.getProfiler() is not None and profiling.getProfiler().tracepath == tracepath,"Profiling not configured")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+ResultCache tests
+
+@date      : 2026-10-18 16:59:02
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import time
+from unittest import mock
+from hex.runlog import ResultCache
+
+RESULT_CACHE_PATH = "/tmp/resultcachefortesting"
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % RESULT_CACHE_PATH)
+        os.makedirs(os.path.join(RESULT_CACHE_PATH,"runs"))
+
+    def tearDown(self):
+        os.system("rm -rf %s" % RESULT_CACHE_PATH)
+
+    def makeRunLog(self,runid,output):
+        stdoutfile = os.path.join(RESULT_CACHE_PATH,"runs","%s.out" % runid)
+        with open(stdoutfile,"w") as f:
+            f.write(output)
+        return {"runid" : runid, "cmd" : "echo", "result" : "SUCCESS", "stdoutfile" : stdoutfile}
+
+    def testKeyDependsOnInputs(self):
+        """
+        The key should change when the script, the interpreter, or an input file changes
+        """
+        cache = ResultCache(os.path.join(RESULT_CACHE_PATH,"cache"))
+        inputfile = os.path.join(RESULT_CACHE_PATH,"input.txt")
+        with open(inputfile,"w") as f:
+            f.write("one")
+
+        key = cache.getKey("sort input.txt","/bin/bash",[inputfile])
+        self.assertTrue(key == cache.getKey("sort input.txt","/bin/bash",[inputfile]),"Key is not stable")
+        self.assertTrue(key != cache.getKey("sort -r input.txt","/bin/bash",[inputfile]),"Key ignores the script")
+        self.assertTrue(key != cache.getKey("sort input.txt","/bin/sh",[inputfile]),"Key ignores the interpreter")
+
+        hashed = cache.getKey("sort input.txt","/bin/bash",[inputfile],hashinputs=True)
+        with open(inputfile,"w") as f:
+            f.write("two")
+        self.assertTrue(key != cache.getKey("sort input.txt","/bin/bash",[inputfile]),"Key ignores input changes")
+        self.assertTrue(hashed != cache.getKey("sort input.txt","/bin/bash",[inputfile],hashinputs=True),"Hashed key ignores input changes")
+
+    def testGetPutInvalidate(self):
+        """
+        A cached run should be found with its output, which outlives the run, until it is invalidated
+        """
+        cache = ResultCache(os.path.join(RESULT_CACHE_PATH,"cache"))
+        self.assertTrue(cache.get("abc") is None,"Empty cache returned an entry")
+
+        runlog = self.makeRunLog("run1","hello\n")
+        cache.put("abc",runlog)
+        os.remove(runlog["stdoutfile"])
+        entry = cache.get("abc")
+        self.assertTrue(entry["runid"] == "run1","Incorrect entry: %s" % entry)
+        self.assertTrue(open(entry["stdoutfile"]).read() == "hello\n","Incorrect cached stdout")
+        self.assertTrue(open(entry["stderrfile"]).read() == "","Incorrect cached stderr")
+
+        self.assertTrue(cache.invalidate("abc"),"Entry not invalidated")
+        self.assertTrue(cache.get("abc") is None,"Invalidated entry still returned")
+
+    def testEviction(self):
+        """
+        The least recently used entries should be evicted to keep within the entry and size limits
+        """
+        cache = ResultCache(os.path.join(RESULT_CACHE_PATH,"cache"),maxentries=2,maxbytes=25)
+        for i, key in enumerate(["a","b"]):
+            cache.put(key,self.makeRunLog("run%d" % i,"0123456789"))
+            os.utime(os.path.join(cache.getEntryDir(key),"entry.json"),(time.time() - 100 + i,) * 2)
+
+        # Using a makes b the least recently used
+        self.assertTrue(cache.get("a") is not None,"Entry a missing")
+        cache.put("c",self.makeRunLog("run2","0123456789"))
+        self.assertTrue(cache.get("b") is None,"Least recently used entry not evicted")
+        self.assertTrue(cache.get("a") is not None and cache.get("c") is not None,"Recently used entries evicted")
+
+        cache.put("d",self.makeRunLog("run3","01234567890123456789"))
+        keys = [key for key, mtime, size in cache.getEntries()]
+        self.assertTrue(keys == ["d"],"Size limit not applied: %s" % keys)
+        self.assertTrue(cache.clear() == 1,"Incorrect number of entries cleared")
+
+    def testUsageCounts(self):
+        """
+        Puts under the limits should update the usage counts without scanning the cache, which is recounted every recountputs puts
+        """
+        cache = ResultCache(os.path.join(RESULT_CACHE_PATH,"cache"),maxentries=10,maxbytes=1000,recountputs=5)
+        cache.put("a",self.makeRunLog("run0","0123456789"))
+        with mock.patch.object(ResultCache,"getEntries",wraps=cache.getEntries) as getEntries:
+            cache.put("b",self.makeRunLog("run1","0123456789"))
+            cache.put("a",self.makeRunLog("run2","01234"))
+            self.assertTrue(cache.invalidate("b"),"Entry b not invalidated")
+            self.assertTrue(getEntries.call_count == 0,"Cache scanned %d times under the limits" % getEntries.call_count)
+
+            usage = ResultCache(os.path.join(RESULT_CACHE_PATH,"cache")).getUsage()
+            self.assertTrue(usage["entries"] == 1 and usage["bytes"] == 5,"Incorrect usage: %s" % usage)
+
+            # An entry removed behind the cache's back is caught by the recount on the fifth put
+            cache.put("c",self.makeRunLog("run3","0123456789"))
+            os.system("rm -rf %s" % cache.getEntryDir("c"))
+            cache.put("d",self.makeRunLog("run4","0123456789"))
+            self.assertTrue(getEntries.call_count == 1,"Cache not recounted after recountputs puts")
+        usage = cache.getUsage()
+        self.assertTrue(usage["entries"] == 2 and usage["bytes"] == 15,"Incorrect usage after recount: %s" % usage)
@@ -1,44 +1,310 @@
-# # -*- coding: utf-8 -*-
-
-# """
-# Tests for the SQLRunLogger
-
-# @date      : 2017-07-18 12:06:51
-# @author    : Meghan Porter-Mahoney (mportermahoney@g.harvard.edu)
-# @version   : $Id$
-# @copyright : 2017 The Presidents and Fellows of Harvard College. All rights reserved.
-# @license   : GPLv2
-
-# """
-# import unittest, os, json
-# from hex.runlog import SQLRunLogger, RunLog
-# from datetime import datetime
-
-
-# class SQLRunLoggerTest(unittest.TestCase):
-
-#     def testSave(self):
-#         """
-#         test logging to sqllite with sqlrunlogger
-#         """
-#         runlogger = SQLRunLogger()
-#         runlogdata = {
-#             "jobid"             : 10,
-#             "hostname"          : "localhost",
-#             "scriptfilepath"    : "/path/to/script",
-#             "interpreter"       : "/bin/bash",
-#             "starttime"         : datetime(2017,1,1),
-#             "system"            : "BashSystem",
-#             "cmd"               : None,
-#             "endtime"         : datetime(2017,1,1),
-#             "stdoutfile"        : None,
-#             "stderrfile"        : None,
-#             "result"            : None,
-#             "status"            : None
-#         }
-#         runlog = RunLog(**runlogdata)
-#         runlogger.save(runlog)
-#         row = runlogger.get_row(runlog['runid'])
-#         row.pop('id', None) # remove id to compare
-#         self.assertTrue(row == runlog,"Sql row different from runlog ROW: %s RUNLOG: %s" %
-#                 (json.dumps(row), json.dumps(runlog)))
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the SQLRunLogger
+
+@date      : 2017-07-18 12:06:51
+@author    : Meghan Porter-Mahoney (mportermahoney@g.harvard.edu)
+@version   : $Id$
+@copyright : 2017 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import time
+import fcntl
+import threading
+from unittest import mock
+from hex.runlog import SQLRunLogger, RunLog, RetentionPolicy
+from hex.runlog import sqlrunlogger
+from hex.runlog.writebehind import WriteBehindQueue
+from hex.system import BashSystem
+from datetime import datetime
+
+SQL_RUNLOG_PATH = "/tmp/sqlrunlogsfortesting"
+
+
+class SQLRunLoggerTest(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % SQL_RUNLOG_PATH)
+        self.db = "sqlite:///%s/runlog.db" % SQL_RUNLOG_PATH
+        os.makedirs(SQL_RUNLOG_PATH)
+
+    def tearDown(self):
+        engine = sqlrunlogger.ENGINE_CACHE.pop(self.db,(None,None))[0]
+        if engine is not None:
+            engine.dispose()
+        os.system("rm -rf %s" % SQL_RUNLOG_PATH)
+
+    def makeRunLog(self):
+        runlogdata = {
+            "jobid"             : 10,
+            "hostname"          : "localhost",
+            "scriptfilepath"    : "/path/to/script",
+            "interpreter"       : "/bin/bash",
+            "starttime"         : datetime(2017,1,1),
+            "system"            : "BashSystem",
+            "cmd"               : None,
+            "endtime"           : datetime(2017,1,1),
+            "stdoutfile"        : None,
+            "stderrfile"        : None,
+            "result"            : None,
+            "status"            : None
+        }
+        return RunLog(**runlogdata)
+
+    def testSave(self):
+        """
+        test logging to sqllite with sqlrunlogger
+        """
+        runlogger = SQLRunLogger(db="test",pathname=SQL_RUNLOG_PATH)
+        runlog = self.makeRunLog()
+        runlogger.save(runlog)
+        row = runlogger.get_row(runlog['runid'])
+        row.pop('id', None) # remove id to compare
+        self.assertTrue(row["runid"] == runlog["runid"],"Sql row has the wrong runid: %s" % row)
+        self.assertTrue(row["starttime"] == datetime(2017,1,1),"Sql row has the wrong starttime: %s" % row)
+        self.assertTrue(row["jobid"] == "10","Sql row has the wrong jobid: %s" % row)
+
+        runlog = self.makeRunLog()
+        runlog["parentrunid"] = "parent"
+        runlogger.save(runlog)
+        self.assertTrue(runlogger.get_row(runlog['runid'])["parentrunid"] == "parent","Sql row has the wrong parentrunid")
+
+    def testEngineIsShared(self):
+        """
+        The engine should be created, and the schema checked, only once no matter how many loggers and saves use it
+        """
+        with mock.patch.object(sqlrunlogger.Base.metadata,"create_all",wraps=sqlrunlogger.Base.metadata.create_all) as create_all:
+            runloggers = [SQLRunLogger(db=self.db,pathname=SQL_RUNLOG_PATH) for i in range(3)]
+            for runlogger in runloggers:
+                for i in range(3):
+                    runlogger.save(self.makeRunLog())
+            self.assertTrue(create_all.call_count == 1,"Schema created %d times" % create_all.call_count)
+        engines = set(id(runlogger.engine) for runlogger in runloggers)
+        self.assertTrue(len(engines) == 1,"Loggers are not sharing an engine")
+        count = runloggers[0].session.query(sqlrunlogger.SQLRunLog).count()
+        self.assertTrue(count == 9,"Incorrect number of rows: %d" % count)
+
+    def testBatchSaves(self):
+        """
+        Jobs run concurrently by BashSystem.map should all be logged through the shared engine
+        """
+        runlogger = SQLRunLogger(db=self.db,pathname=SQL_RUNLOG_PATH)
+        bash = BashSystem(runlogger=runlogger)
+        runids = bash.map(["echo %d" % i for i in range(8)],concurrency=4)
+        for runid in runids:
+            row = runlogger.get_row(runid)
+            self.assertTrue(row.get("runid") == runid,"Run %s not logged to the db" % runid)
+
+    def testSaveUpdatesInPlace(self):
+        """
+        Saving the same run twice should leave a single, updated row
+        """
+        runlogger = SQLRunLogger(db=self.db,pathname=SQL_RUNLOG_PATH)
+        runlog = self.makeRunLog()
+        runlog["status"] = "RUNNING"
+        runid = runlogger.save(runlog)
+
+        runlog = runlogger.get(runid)
+        runlog["status"] = "COMPLETED"
+        runlog["result"] = "SUCCESS"
+        runlogger.save(runlog)
+
+        session = runlogger.session
+        rows = session.query(sqlrunlogger.SQLRunLog).filter_by(runid=runid).all()
+        self.assertTrue(len(rows) == 1,"Incorrect number of rows for %s: %d" % (runid,len(rows)))
+        self.assertTrue(rows[0].status == "COMPLETED" and rows[0].result == "SUCCESS","Row not updated: %s" % rows[0].status)
+        session.close()
+
+        indexes = set(index["name"] for index in sqlrunlogger.inspect(runlogger.engine).get_indexes("runlog"))
+        for name in ["ix_runlog_runid","ix_runlog_status","ix_runlog_starttime","ix_runlog_hostname"]:
+            self.assertTrue(name in indexes,"Missing index %s: %s" % (name,indexes))
+
+    def testUpgradeSchema(self):
+        """
+        A runlog table from an older version, with several rows per runid and no indexes,
+        should be deduplicated and indexed when it is first used
+        """
+        engine = sqlrunlogger.create_engine(self.db)
+        with engine.begin() as conn:
+            conn.execute(sqlrunlogger.text(
+                "CREATE TABLE runlog (id INTEGER PRIMARY KEY, status VARCHAR(255), result VARCHAR(255), cmd VARCHAR(255), "
+                "stderrfile VARCHAR(255), hostname VARCHAR(100), system VARCHAR(100), jobid INTEGER, scriptfilepath VARCHAR(255), "
+                "runid VARCHAR(100), starttime DATETIME, endtime DATETIME, interpreter VARCHAR(100), stdoutfile VARCHAR(255))"
+            ))
+            for i, (runid, status) in enumerate([("a","RUNNING"),("a","COMPLETED"),("b","RUNNING")]):
+                conn.execute(sqlrunlogger.text("INSERT INTO runlog (id, runid, status) VALUES (%d, '%s', '%s')" % (i + 1,runid,status)))
+            # Rows without a runid are not duplicates of each other
+            for i in range(2):
+                conn.execute(sqlrunlogger.text("INSERT INTO runlog (id, status) VALUES (%d, 'COMPLETED')" % (i + 10)))
+        engine.dispose()
+
+        runlogger = SQLRunLogger(db=self.db,pathname=SQL_RUNLOG_PATH)
+        self.assertTrue(runlogger.get_row("a")["status"] == "COMPLETED","Latest row for a not kept")
+        session = runlogger.session
+        count = session.query(sqlrunlogger.SQLRunLog).count()
+        session.close()
+        self.assertTrue(count == 4,"Duplicate rows not removed, or rows without a runid removed: %d rows" % count)
+        indexes = set(index["name"] for index in sqlrunlogger.inspect(runlogger.engine).get_indexes("runlog"))
+        self.assertTrue("ix_runlog_runid" in indexes,"Unique runid index not added: %s" % indexes)
+        columns = set(column["name"] for column in sqlrunlogger.inspect(runlogger.engine).get_columns("runlog"))
+        self.assertTrue("usercpu" in columns and "peaktreerss" in columns,"Resource columns not added: %s" % columns)
+
+    def testResourceReport(self):
+        """
+        Resource usage should be aggregated in the database
+        """
+        runlogger = SQLRunLogger(db=self.db,pathname=SQL_RUNLOG_PATH)
+        for i in range(3):
+            runlog = self.makeRunLog()
+            runlog.update({"usercpu" : 2.0, "syscpu" : 1.0, "maxrss" : 100 * (i + 1), "nvcsw" : 10})
+            runlogger.save(runlog)
+
+        rows = runlogger.resourceReport(groupby="status")
+        self.assertTrue(len(rows) == 1,"Incorrect groups: %s" % rows)
+        row = rows[0]
+        self.assertTrue(row["runs"] == 3 and row["usercpu"] == 6.0 and row["maxrss"] == 300 and row["nvcsw"] == 30,"Incorrect totals: %s" % row)
+
+    def testStatusMany(self):
+        """
+        Runs in the db should be loaded with a query, and others from their files
+        """
+        runlogger = SQLRunLogger(db=self.db,pathname=SQL_RUNLOG_PATH)
+        runids = []
+        for i in range(3):
+            runlog = self.makeRunLog()
+            runlog["status"] = "RUNNING" if i == 0 else "COMPLETED"
+            runids.append(runlogger.save(runlog))
+        runlogger.removeRuns(runids[2:])
+
+        with mock.patch.object(runlogger,"get",wraps=runlogger.get) as get:
+            runlogs = runlogger.statusMany(runids)
+        self.assertTrue(set(runlogs.keys()) == set(runids),"Incorrect runs loaded: %s" % runlogs.keys())
+        self.assertTrue(runlogs[runids[0]]["status"] == "RUNNING" and runlogs[runids[1]]["status"] == "COMPLETED","Incorrect statuses")
+        self.assertTrue([call[0][0] for call in get.call_args_list] == runids[2:],"Run logs in the db read from files: %s" % get.call_args_list)
+
+    def testPruneRemovesRows(self):
+        """
+        Pruned runs should be removed from the db too
+        """
+        runlogger = SQLRunLogger(db=self.db,pathname=SQL_RUNLOG_PATH)
+        runids = []
+        for i in range(3):
+            runlog = self.makeRunLog()
+            runlog["status"] = "COMPLETED"
+            runlog["starttime"] = datetime(2017,1,1 + i)
+            runids.append(runlogger.save(runlog))
+
+        pruned = runlogger.prune(RetentionPolicy(maxcount=1))
+        self.assertTrue(set(run["runid"] for run in pruned) == set(runids[0:2]),"Incorrect runs pruned: %s" % pruned)
+        for runid in runids[0:2]:
+            self.assertTrue(runlogger.get_row(runid) == {},"Row for pruned run %s left in the db" % runid)
+        self.assertTrue(runlogger.get_row(runids[2]).get("runid") == runids[2],"Row for kept run removed")
+
+    def testMigrateUpdatesRows(self):
+        """
+        Migrating the layout should update the paths stored in the db
+        """
+        runlogger = SQLRunLogger(db=self.db,pathname=SQL_RUNLOG_PATH)
+        runlog = self.makeRunLog()
+        runlog["runid"] = runlogger.newRunId("cmd")
+        runlog["stdoutfile"] = runlogger.getStdOutPath(runlog["runid"])
+        runid = runlogger.save(runlog)
+
+        runlogger.setLayout("hash")
+        self.assertTrue(runlogger.migrateLayout("flat") == 1,"Run not migrated")
+        stdoutfile = runlogger.getStdOutPath(runid)
+        self.assertTrue(stdoutfile != runlog["stdoutfile"],"Stdout path did not change")
+        self.assertTrue(runlogger.get_row(runid)["stdoutfile"] == stdoutfile,"Stdout path not updated in the db: %s" % runlogger.get_row(runid)["stdoutfile"])
+        self.assertTrue(runlogger.get_row(runid)["scriptfilepath"] == "/path/to/script","Path outside the run directory was changed in the db")
+
+    def testWriteBehind(self):
+        """
+        In write-behind mode, saves should return right away and the rows should be in the db after a flush
+        """
+        runlogger = SQLRunLogger(db=self.db,pathname=SQL_RUNLOG_PATH,writebehind=True)
+        runids = [runlogger.save(self.makeRunLog()) for i in range(20)]
+        self.assertTrue(runlogger.flush(10),"Write-behind queue was not flushed")
+        for runid in runids:
+            self.assertTrue(runlogger.get_row(runid).get("runid") == runid,"Run %s not written" % runid)
+        self.assertFalse(os.path.exists(runlogger.journalpath),"Journal written while the db was up")
+
+    def testWriteBehindJournal(self):
+        """
+        Rows saved while the db is unavailable should be journaled and replayed once it is back,
+        without overwriting rows that were completed in the meantime
+        """
+        dbdir = os.path.join(SQL_RUNLOG_PATH,"later")
+        self.db = "sqlite:///%s/runlog.db" % dbdir
+        runlogger = SQLRunLogger(db=self.db,pathname=SQL_RUNLOG_PATH,writebehind=True)
+        # Keep the background thread from retrying on its own during the test
+        runlogger.write_behind_queue.retryinterval = 3600
+
+        runlog = self.makeRunLog()
+        runlog["status"] = "RUNNING"
+        runids = [runlogger.save(runlog)] + [runlogger.save(self.makeRunLog()) for i in range(2)]
+        self.assertTrue(runlogger.flush(10),"Write-behind queue was not flushed")
+        with open(runlogger.journalpath,"r") as f:
+            lines = f.readlines()
+        self.assertTrue(len(lines) == 3,"Incorrect number of journaled rows: %d" % len(lines))
+
+        # The db comes back and the first run has been completed by someone else
+        os.makedirs(dbdir)
+        completed = runlogger.get(runids[0])
+        completed["status"] = "COMPLETED"
+        runlogger.write_rows([runlogger.to_row(completed)])
+
+        replayed = runlogger.replay_journal()
+        self.assertTrue(replayed == 3,"Incorrect number of rows replayed: %d" % replayed)
+        self.assertFalse(os.path.exists(runlogger.journalpath),"Journal not removed after replay")
+        for runid in runids:
+            self.assertTrue(runlogger.get_row(runid).get("runid") == runid,"Run %s not replayed" % runid)
+        self.assertTrue(runlogger.get_row(runids[0])["status"] == "COMPLETED","Journaled row overwrote a completed run")
+
+    def testConcurrentReplays(self):
+        """
+        A background replay and a manual replay in the same process should not lose each other's rows
+        """
+        written = []
+
+        def writer(rows):
+            time.sleep(0.3)
+            written.extend(row["runid"] for row in rows)
+
+        journal = WriteBehindQueue(writer,os.path.join(SQL_RUNLOG_PATH,"journal"))
+        journal.journal([{"runid" : "a"},{"runid" : "b"}])
+        background = threading.Thread(target=journal.replayJournal)
+        background.start()
+        time.sleep(0.1)
+        journal.journal([{"runid" : "c"}])
+        self.assertTrue(journal.replayJournal() == 1,"Manual replay did not write its row")
+        background.join()
+        self.assertTrue(sorted(written) == ["a","b","c"],"Rows lost or repeated: %s" % written)
+        self.assertTrue(os.listdir(SQL_RUNLOG_PATH) == [],"Replay files left behind: %s" % os.listdir(SQL_RUNLOG_PATH))
+
+    def testReplayWaitsForJournalWriter(self):
+        """
+        Rows journaled while a replay renames the journal should end up in the new journal or the replay, not be lost
+        """
+        written = []
+        journal = WriteBehindQueue(lambda rows: written.extend(row["runid"] for row in rows),os.path.join(SQL_RUNLOG_PATH,"journal"))
+        journal.journal([{"runid" : "a"}])
+
+        # Hold the lock, as a journal() call in another process would, while both start
+        locked = open(journal.journalpath,"a")
+        fcntl.flock(locked,fcntl.LOCK_EX)
+        appender = threading.Thread(target=journal.journal,args=([{"runid" : "b"}],))
+        appender.start()
+        time.sleep(0.1)
+        replay = threading.Thread(target=journal.replayJournal)
+        replay.start()
+        time.sleep(0.1)
+        fcntl.flock(locked,fcntl.LOCK_UN)
+        locked.close()
+        appender.join()
+        replay.join()
+
+        journal.replayJournal()
+        self.assertTrue(sorted(written) == ["a","b"],"Rows lost or repeated: %s" % written)
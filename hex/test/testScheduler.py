@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+Scheduler tests
+
+@date      : 2026-10-18 20:48:16
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+from hex import UserException
+from hex.runlog import DefaultRunLogger
+from hex.system import BashSystem
+from hex.system.scheduler import Scheduler
+
+SCHEDULER_PATH = "/tmp/schedulerfortesting"
+ORDER_FILE = os.path.join(SCHEDULER_PATH,"order.txt")
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % SCHEDULER_PATH)
+        self.runlogger = DefaultRunLogger(pathname=os.path.join(SCHEDULER_PATH,"runlogs"))
+        self.system = BashSystem(runlogger=self.runlogger)
+
+    def tearDown(self):
+        os.system("rm -rf %s" % SCHEDULER_PATH)
+
+    def getOrder(self):
+        with open(ORDER_FILE,"r") as f:
+            return f.read().split()
+
+    def testQueuedUntilDispatched(self):
+        """
+        A job that can't start should be logged as QUEUED and run once there is room
+        """
+        scheduler = Scheduler(self.system,maxjobs=1)
+        first = scheduler.submit("sleep 0.5")
+        second = scheduler.submit("echo hi")
+        self.assertTrue(self.runlogger.get(second)["status"] == "QUEUED","Second job not queued: %s" % self.runlogger.get(second)["status"])
+        self.assertTrue(self.runlogger.get(second)["jobid"] == os.getpid(),"Queued job not linked to the scheduler's process")
+        self.assertTrue(scheduler.getStatus()["queued"] == 1,"Incorrect status: %s" % scheduler.getStatus())
+
+        self.assertTrue(scheduler.wait(timeout=30),"Jobs did not finish")
+        for runid in [first,second]:
+            runlog = self.runlogger.get(runid)
+            self.assertTrue(runlog["status"] == "COMPLETED" and runlog["result"] == "SUCCESS","Job %s did not complete: %s" % (runid,runlog))
+        with self.runlogger.get(second).getStdOutHandle() as f:
+            self.assertTrue(f.read() == "hi\n","Incorrect output")
+
+    def testPriorityAndFairShare(self):
+        """
+        Higher priorities should run first, and equal priorities should alternate between users
+        """
+        scheduler = Scheduler(self.system,maxjobs=1)
+        scheduler.submit("sleep 0.5",user="blocker")
+        for user in ["alice","alice","alice","bob"]:
+            scheduler.submit("echo %s >> %s" % (user,ORDER_FILE),user=user)
+        scheduler.submit("echo urgent >> %s" % ORDER_FILE,user="alice",priority=10)
+        self.assertTrue(scheduler.wait(timeout=30),"Jobs did not finish")
+        order = self.getOrder()
+        self.assertTrue(order == ["urgent","alice","bob","alice","alice"],"Incorrect order: %s" % order)
+
+    def testCapsAndResources(self):
+        """
+        Tag caps and declared CPUs should limit what is dispatched
+        """
+        scheduler = Scheduler(self.system,cpus=4,tagcaps={"db" : 1})
+        scheduler.submit("sleep 0.5",tags=["db"])
+        capped = scheduler.submit("true",tags=["db"])
+        untagged = scheduler.submit("sleep 0.5",cpus=2)
+        self.assertTrue(scheduler.isQueued(capped),"Tag cap not applied")
+        self.assertFalse(scheduler.isQueued(untagged),"Job behind a capped job was not dispatched")
+
+        toobig = scheduler.submit("true",cpus=2)
+        self.assertTrue(scheduler.isQueued(toobig),"Job dispatched without enough cpus")
+        status = scheduler.getStatus()
+        self.assertTrue(status["running"] == 2 and status["cpusused"] == 3,"Incorrect status: %s" % status)
+
+        with self.assertRaises(UserException):
+            scheduler.submit("true",cpus=5)
+        with self.assertRaises(UserException):
+            scheduler.submit("true",memory="%dT" % 1024 ** 2)
+        self.assertTrue(scheduler.wait(timeout=30),"Jobs did not finish")
+        self.assertTrue(self.runlogger.get(toobig)["result"] == "SUCCESS","Queued job did not run")
+
+    def testCancel(self):
+        """
+        A cancelled job should never run
+        """
+        scheduler = Scheduler(self.system,maxjobs=1)
+        scheduler.submit("sleep 0.5")
+        runid = scheduler.submit("echo ran >> %s" % ORDER_FILE)
+        self.assertTrue(scheduler.cancel(runid),"Job not cancelled")
+        self.assertFalse(scheduler.cancel(runid),"Job cancelled twice")
+        self.assertTrue(scheduler.wait(timeout=30),"Jobs did not finish")
+        self.assertTrue(self.runlogger.get(runid)["status"] == "CANCELLED","Cancelled job not logged")
+        self.assertFalse(os.path.exists(ORDER_FILE),"Cancelled job ran")
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+SlurmSystem tests, against stub sbatch, squeue and sacct commands that run
+jobs locally
+
+@date      : 2026-10-18 21:26:40
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os, sys
+import time
+from unittest import mock
+from hex import UserException
+from hex.system import getSystem
+from hex.system import bashsystem
+from hex.system.slurmsystem import SlurmSystem
+from hex.runlog import DefaultRunLogger
+from hex.test.helpers import BytesSink
+
+SLURM_PATH = "/tmp/slurmfortesting"
+STUB_PATH = os.path.join(SLURM_PATH,"bin")
+STATE_PATH = os.path.join(SLURM_PATH,"state")
+SCRIPT_PATH = os.path.join(SLURM_PATH,"scripts")
+
+# Each stub logs its arguments to calls.log.  sbatch runs the job (or each
+# array task) in a detached process that records its exit code when done.
+STUB_COMMON = """#!%s
+import os, sys, json
+state = %r
+with open(os.path.join(state,"calls.log"),"a") as f:
+    f.write(json.dumps(sys.argv) + "\\n")
+opts = dict(arg[2:].partition("=")[0::2] for arg in sys.argv[1:] if arg.startswith("--"))
+"""
+
+SBATCH_STUB = """
+script = sys.argv[-1]
+for line in open(script):
+    if line.startswith("#SBATCH --"):
+        key, sep, value = line[len("#SBATCH --"):].strip().partition("=")
+        opts.setdefault(key,value)
+countpath = os.path.join(state,"count")
+jobid = int(open(countpath).read()) + 1 if os.path.exists(countpath) else 1000
+open(countpath,"w").write(str(jobid))
+json.dump(opts,open(os.path.join(state,"%d.opts" % jobid),"w"))
+if "array" in opts:
+    first, last = opts["array"].split("%")[0].split("-")
+    tasks = [("%d_%d" % (jobid,i),str(i)) for i in range(int(first),int(last) + 1)]
+else:
+    tasks = [(str(jobid),None)]
+for taskid, index in tasks:
+    if os.fork() == 0:
+        os.setsid()
+        devnull = os.open(os.devnull,os.O_RDWR)
+        for fd in [0,1,2]:
+            os.dup2(devnull,fd)
+        env = dict(os.environ)
+        if index is not None:
+            env["SLURM_ARRAY_TASK_ID"] = index
+        open(os.path.join(state,taskid + ".running"),"w").close()
+        out = open(opts.get("output","/dev/null"),"a")
+        err = open(opts.get("error","/dev/null"),"a")
+        import subprocess
+        code = subprocess.call(["/bin/bash",script],stdout=out,stderr=err,cwd=opts.get("chdir"),env=env)
+        open(os.path.join(state,taskid + ".exit.tmp"),"w").write(str(code))
+        os.rename(os.path.join(state,taskid + ".exit.tmp"),os.path.join(state,taskid + ".exit"))
+        os._exit(0)
+print("%d;stubcluster" % jobid)
+"""
+
+SQUEUE_STUB = """
+for jobid in opts["jobs"].split(","):
+    if os.path.exists(os.path.join(state,jobid + ".running")) and not os.path.exists(os.path.join(state,jobid + ".exit")):
+        print("%s|RUNNING" % jobid)
+"""
+
+# Like slurmdbd, sacct has no record of a job the first time it is asked
+SACCT_STUB = """
+for jobid in opts["jobs"].split(","):
+    path = os.path.join(state,jobid + ".exit")
+    if os.path.exists(path) and not os.path.exists(path + ".seen"):
+        open(path + ".seen","w").close()
+    elif os.path.exists(path):
+        code = int(open(path).read())
+        print("%s|%s|%d:0" % (jobid,"COMPLETED" if code == 0 else "FAILED",code))
+"""
+
+
+class SlurmSystemTest(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % SLURM_PATH)
+        os.makedirs(STUB_PATH)
+        os.makedirs(STATE_PATH)
+        for name, stub in [("sbatch",SBATCH_STUB),("squeue",SQUEUE_STUB),("sacct",SACCT_STUB)]:
+            path = os.path.join(STUB_PATH,name)
+            with open(path,"w") as f:
+                f.write(STUB_COMMON % (sys.executable,STATE_PATH) + stub)
+            os.chmod(path,0o755)
+        self.path = os.environ["PATH"]
+        os.environ["PATH"] = STUB_PATH + os.pathsep + self.path
+        self.runlogger = DefaultRunLogger(pathname=os.path.join(SLURM_PATH,"runlogs"))
+        # Keep job array drivers out of ~/.hex/bashscripts
+        self.scriptdir = mock.patch.object(bashsystem,"DEFAULT_BASH_SCRIPTDIR",SCRIPT_PATH)
+        self.scriptdir.start()
+
+    def tearDown(self):
+        self.scriptdir.stop()
+        os.environ["PATH"] = self.path
+        os.system("rm -rf %s" % SLURM_PATH)
+
+    def getCalls(self,name):
+        with open(os.path.join(STATE_PATH,"calls.log"),"r") as f:
+            return [line for line in f if '/%s"' % name in line.split(",")[0]]
+
+    def testExecute(self):
+        """
+        execute should submit an sbatch script with the requested resources, follow its output and record the Slurm job id
+        """
+        system = getSystem("slurm",runlogger=self.runlogger,partition="test",timelimit="0:10:00",memory="1G",pollinterval=0.1)
+        self.assertTrue(isinstance(system,SlurmSystem),"Incorrect system")
+        script = system.compose(content="echo hi")
+        self.assertTrue(script.startswith("#!/bin/bash\n"),"No interpreter line:\n%s" % script)
+        self.assertTrue(script.index("#SBATCH --partition=test") < script.index("echo hi"),"Directives missing or misplaced:\n%s" % script)
+
+        outsink, errsink = BytesSink(), BytesSink()
+        runid = system.execute("echo hi; echo err >&2",sinks=(outsink,errsink))
+        runlog = self.runlogger.get(runid)
+        self.assertTrue(runlog["status"] == "COMPLETED" and runlog["result"] == "SUCCESS","Incorrect run log: %s" % runlog)
+        self.assertTrue(runlog["jobid"] == "1000","Slurm job id not recorded: %s" % runlog["jobid"])
+        self.assertTrue(outsink.data == b"hi\n" and errsink.data == b"err\n","Incorrect output: %s %s" % (outsink.data,errsink.data))
+        with open(os.path.join(STATE_PATH,"1000.opts")) as f:
+            opts = f.read()
+        self.assertTrue('"mem": "1G"' in opts and '"job-name": "%s"' % runid in opts,"Incorrect sbatch options: %s" % opts)
+
+        runid = system.execute("exit 2",monitor=False)
+        self.assertTrue(self.runlogger.get(runid)["result"] == "FAIL","Failed job not recorded")
+
+    def testLaunchAndArray(self):
+        """
+        launch should return once submitted, and map should run an array with bulk status polls
+        """
+        system = SlurmSystem(runlogger=self.runlogger,pollinterval=0.1)
+        runid = system.launch("sleep 0.5")
+        self.assertTrue(self.runlogger.get(runid)["status"] == "QUEUED","Launched run not queued")
+
+        runids = system.map(["echo %d" % i for i in range(5)] + ["exit 1"],concurrency=2)
+        runlogs = system.updateRunLogs(runids + [runid])
+        self.assertTrue([runlog["result"] for runlog in runlogs[:6]] == ["SUCCESS"] * 5 + ["FAIL"],"Incorrect results: %s" % runlogs)
+        self.assertTrue(runlogs[2]["jobid"] == "1001_2","Incorrect array task id: %s" % runlogs[2]["jobid"])
+        with runlogs[3].getStdOutHandle() as f:
+            self.assertTrue(f.read() == "3\n","Incorrect array task output")
+        self.assertTrue(len(self.getCalls("sbatch")) == 2,"Array not submitted as one job")
+        polls = [call for call in self.getCalls("squeue") if "1001_" in call]
+        self.assertTrue(polls[0].count("1001_") == 6,"Array tasks not polled together: %s" % polls[0])
+        self.assertTrue('"--array=0-5%2"' in self.getCalls("sbatch")[1],"Array concurrency not set")
+
+    def testSharedScriptArray(self):
+        """
+        An array submitted with sharedscript should run every task from one batch script
+        """
+        system = SlurmSystem(runlogger=self.runlogger,pollinterval=0.1)
+        runids = system.map(["echo %d" % i for i in range(3)],sharedscript=True)
+        runlogs = system.updateRunLogs(runids)
+        self.assertTrue([runlog["result"] for runlog in runlogs] == ["SUCCESS"] * 3,"Incorrect results: %s" % runlogs)
+        self.assertTrue(len(set(runlog["scriptfilepath"] for runlog in runlogs)) == 1,"Tasks did not share a script")
+        with runlogs[2].getStdOutHandle() as f:
+            self.assertTrue(f.read() == "2\n","Incorrect array task output")
+
+        runids = system.map(["echo 0","echo 1\nesac","echo 2"],sharedscript=True)
+        runlogs = system.updateRunLogs(runids)
+        self.assertTrue(len(set(runlog["scriptfilepath"] for runlog in runlogs)) == 3,"Tasks shared a broken script")
+        self.assertTrue([runlog["result"] for runlog in runlogs] == ["SUCCESS","FAIL","SUCCESS"],"Incorrect results with a broken command: %s" % runlogs)
+
+    def testUnknownJob(self):
+        """
+        A job that Slurm has no record of should keep its status until the grace period is over, then be LOST
+        """
+        system = SlurmSystem(runlogger=self.runlogger,pollinterval=0.1,unknowngrace=0.5)
+        runid = self.runlogger.newRunId("true")
+        runid = self.runlogger.save(system.createRunLog("/path/to/script","4242",runid,status="RUNNING"))
+        for i in range(2):
+            runlog = system.updateRunLogs([runid])[0]
+            self.assertTrue(runlog["status"] == "RUNNING" and "result" not in runlog,"Unknown job finished too soon: %s" % runlog)
+        time.sleep(0.5)
+        runlog = system.updateRunLogs([runid])[0]
+        self.assertTrue(runlog["status"] == "LOST" and runlog["result"] == "FAIL","Unknown job not LOST: %s" % runlog)
+
+    def testOutputCaptureRefused(self):
+        """
+        Compressed output is not possible when Slurm writes the files
+        """
+        with self.assertRaises(UserException):
+            SlurmSystem(runlogger=self.runlogger,compression="gzip")
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+Startup tests for the hex command line
+
+@date      : 2026-10-18 18:57:06
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import hex
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(hex.__file__)))
+
+# Seconds that importing hex and parsing a command line may add to interpreter
+# startup.  Wall clock timing is unreliable on loaded or network hosted machines,
+# so the budget is only checked if HEX_TEST_STARTUP_BUDGET is set, to 1 or to
+# the budget to use.  testExecImports checks what startup loads on every run.
+STARTUP_BUDGET = 0.25
+STARTUP_BUDGET_VAR = "HEX_TEST_STARTUP_BUDGET"
+
+# Runs a hex command line and prints the modules that were loaded
+RUN_HEX = """
+import sys, json
+sys.argv = ["hex"] + json.loads(sys.argv[1])
+from hex.cli import main
+status = main()
+sys.stdout.write("\\n" + json.dumps(sorted(sys.modules.keys())))
+sys.exit(status)
+"""
+
+# Modules that hex exec must not load unless it is asked for them
+HEAVY_MODULES = ["sqlalchemy","hex.runlog.sqlrunlogger","hex.system.daemon","hex.system.slurmsystem","hex.profiling.profiler"]
+
+IMPORT_EXEC = """
+import sys, json
+import hex.subcommand.hexexec
+sys.stdout.write(json.dumps(sorted(sys.modules.keys())))
+"""
+
+PARSE_HEX = """
+import sys
+sys.argv = ["hex","--runlogger","default","exec","true"]
+from hex.cli import initArgs
+initArgs()
+"""
+
+
+class StartupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp(prefix="hexstartup")
+        self.env = dict(os.environ)
+        self.env["HOME"] = self.home
+
+    def tearDown(self):
+        os.system("rm -rf %s" % self.home)
+
+    def runPython(self,code,*args):
+        return subprocess.run([sys.executable,"-c",code] + list(args),cwd=PACKAGE_ROOT,env=self.env,
+                              stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+
+    def testExecLoadsOnlyWhatItNeeds(self):
+        """
+        hex exec with the default runlogger should not import SQLAlchemy, asyncio, or other subcommands
+        """
+        result = self.runPython(RUN_HEX,json.dumps(["--runlogger","default","exec","true"]))
+        self.assertTrue(result.returncode == 0,"hex exec failed: %s" % result.stderr)
+        modules = json.loads(result.stdout.strip().splitlines()[-1])
+        for module in HEAVY_MODULES + ["asyncio","hex.system.asyncbashsystem","hex.subcommand.hextail"]:
+            self.assertFalse(module in modules,"%s was imported" % module)
+
+    def testExecImports(self):
+        """
+        Importing the exec subcommand should not load SQLAlchemy, the daemon, Slurm or the profiler
+        """
+        result = self.runPython(IMPORT_EXEC)
+        self.assertTrue(result.returncode == 0,"Import failed: %s" % result.stderr)
+        modules = json.loads(result.stdout)
+        for module in HEAVY_MODULES:
+            self.assertFalse(module in modules,"%s was imported" % module)
+
+    @unittest.skipUnless(os.environ.get(STARTUP_BUDGET_VAR),"Set %s to check startup time" % STARTUP_BUDGET_VAR)
+    def testStartupBudget(self):
+        """
+        Importing hex and parsing an exec command line should take less than STARTUP_BUDGET seconds
+        """
+        budget = float(os.environ[STARTUP_BUDGET_VAR])
+        if os.environ[STARTUP_BUDGET_VAR] == "1":
+            budget = STARTUP_BUDGET
+
+        def best(code):
+            times = []
+            for i in range(5):
+                start = time.time()
+                result = self.runPython(code)
+                times.append(time.time() - start)
+                self.assertTrue(result.returncode == 0,"Failed: %s" % result.stderr)
+            return min(times)
+
+        overhead = best(PARSE_HEX) - best("pass")
+        self.assertTrue(overhead < budget,"hex startup took %.3f seconds, over the %.3f second budget" % (overhead,budget))
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the OutputPump and FileFollower
+
+@date      : 2026-10-18 10:31:08
+@author    : Harvard FAS Informatics
+@version   : $Id$
+@copyright : 2026 The Presidents and Fellows of Harvard College. All rights reserved.
+@license   : GPLv2
+
+"""
+import unittest, os
+import time
+import threading
+from hex.system.streams import OutputPump, FileFollower, Inotify
+from hex.test.helpers import BytesSink
+
+STREAMS_TEST_PATH = "/tmp/hexstreamstesting"
+
+
+class TestStreams(unittest.TestCase):
+
+    def setUp(self):
+        os.system("rm -rf %s" % STREAMS_TEST_PATH)
+        os.makedirs(STREAMS_TEST_PATH)
+
+    def tearDown(self):
+        os.system("rm -rf %s" % STREAMS_TEST_PATH)
+
+    def writeSlowly(self,path,lines,delay=0.05):
+        with open(path,"w") as f:
+            for i in range(lines):
+                f.write("line %d\n" % i)
+                f.flush()
+                time.sleep(delay)
+
+    def followFile(self,useinotify):
+        path = os.path.join(STREAMS_TEST_PATH,"followed.out")
+        open(path,"w").close()
+        writer = threading.Thread(target=self.writeSlowly,args=(path,20))
+        writer.start()
+
+        sink = BytesSink()
+        follower = FileFollower(useinotify=useinotify)
+        follower.add(path,sink)
+        follower.follow(lambda: not writer.is_alive())
+        writer.join()
+
+        lines = sink.data.decode().splitlines()
+        self.assertTrue(lines == ["line %d" % i for i in range(20)],"Incorrect followed output: %s" % lines)
+
+    def testFollowPolling(self):
+        """
+        Follow a growing file using backoff polling
+        """
+        self.followFile(False)
+
+    @unittest.skipIf(not Inotify.available(),"inotify is not available")
+    def testFollowInotify(self):
+        """
+        Follow a growing file using inotify
+        """
+        self.followFile(True)
+
+    def testPumpDrainsAfterWriterCloses(self):
+        """
+        OutputPump should copy everything written to two pipes, including data written after the other pipe is closed
+        """
+        outr, outw = os.pipe()
+        errr, errw = os.pipe()
+        outsink = BytesSink()
+        errsink = BytesSink()
+        pump = OutputPump(chunksize=1024)
+        pump.register(outr,outsink)
+        pump.register(errr,errsink)
+
+        def write():
+            os.write(outw,b"out" * 10000)
+            os.close(outw)
+            os.write(errw,b"err" * 10000)
+            os.close(errw)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        pump.run()
+        writer.join()
+        os.close(outr)
+        os.close(errr)
+        self.assertTrue(outsink.data == b"out" * 10000,"Incorrect stdout length %d" % len(outsink.data))
+        self.assertTrue(errsink.data == b"err" * 10000,"Incorrect stderr length %d" % len(errsink.data))
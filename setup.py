@@ -38,6 +38,9 @@ setup(
     install_requires=[
         'sqlalchemy'
     ],
+    extras_require={
+        'zstd': ['zstandard'],
+    },
     entry_points={
         'console_scripts': [
             'hex=hex.cli:main',